@@ -1,37 +1,268 @@
 
 # agents/planner/main.py
-from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import JSONResponse
+import io, json, logging, os, threading, time
+from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional
+from zoneinfo import ZoneInfo
+import requests
+from fastapi import FastAPI, Query, HTTPException, Body, Header
+import numpy as np
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from pydantic import BaseModel, Field
 from shared.agentfacts import agentfacts_default
-from Capstone.server.app import _normalize_stop_local, _bfs_find, _compress_into_legs, render_legs_human
-from Capstone.packages.mbta.mcp_server import plan_direct_route
+from Capstone.server.app import (_normalize_stop_local, _find_route, _k_routes, _pareto_routes, _compress_into_legs,
+                                 render_legs_human, build_graph, load_tables, load_timetable,
+                                 current_overlay, set_disruptions, graph_version, ALERTS_AGENT_URL,
+                                 start_network_watcher, admin_reload, _weights, od_matrix, reachable,
+                                 plan_direct as plan_direct_multimodal)
+from Capstone.server.batch import group_by_origin, plan_batch as run_batch
+from Capstone.server.plancache import PlanCache
+from Capstone.server.routing import Weights
+from Capstone.server.csa import earliest_arrival
 
 app = FastAPI(title="planner-agent", version="1.0.0")
+log = logging.getLogger("planner")
+_TZ = ZoneInfo("America/New_York")
+ALERTS_POLL_SECONDS = float(os.getenv("PLANNER_ALERTS_POLL_SECONDS", "0"))
+# same switch as the orchestrator's AgentPool: with the alerts agent in this process, poll it directly
+ALERTS_LOCAL = os.getenv("ALERTS_AGENT_MODE", os.getenv("A2A_MODE", "remote")).lower() == "local"
+_poller: Optional[threading.Thread] = None
+BATCH_MAX_PAIRS = int(os.getenv("PLANNER_BATCH_MAX_PAIRS", "100000"))
+PLAN_CACHE = PlanCache()
+
+@app.on_event("startup")
+def warm_network():
+    # build the graph, map the precomputed tables and load the GTFS cache before the first rider hits /plan
+    global _poller
+    build_graph(); load_tables(); load_timetable(); start_network_watcher()
+    # once per process: the orchestrator runs this hook again when its agent pool restarts
+    if ALERTS_POLL_SECONDS > 0 and _poller is None:
+        _poller = threading.Thread(target=_poll_alerts, name="alerts-poller", daemon=True); _poller.start()
+
+def _fetch_alerts() -> Dict[str, Any]:
+    if ALERTS_LOCAL:
+        from importlib import import_module
+        return import_module(__name__.rsplit(".", 2)[0] + ".alerts.main").alerts(None, True)
+    r = requests.get(f"{ALERTS_AGENT_URL}/alerts", timeout=10); r.raise_for_status()
+    return r.json()
+
+def _poll_alerts():
+    while True:
+        try:
+            data = _fetch_alerts()
+            before = current_overlay().version
+            ov = set_disruptions(((data.get("raw") or {}).get("data")) or [])
+            if ov.version != before: log.warning("disruptions updated: graph %s", graph_version(ov))
+        except Exception as e:
+            log.warning("alerts poll failed: %s", e)
+        time.sleep(ALERTS_POLL_SECONDS)
+
+def _network(ov) -> Dict[str, Any]:
+    return {"graph_version": graph_version(ov), "disruptions": ov.to_json()}
 
 @app.get("/healthz")
-def healthz(): return {"ok": True}
+def healthz(): return {"ok": True, "graph_version": graph_version()}
+
+@app.post("/admin/reload")
+def reload(force: bool = False, x_admin_token: str | None = Header(default=None)):
+    return admin_reload(force, x_admin_token)
 
 @app.get("/.well-known/agentfacts.json")
 def agentfacts():
     return JSONResponse(agentfacts_default(["mbta.routes.plan"]))
 
 @app.get("/plan")
-def plan(origin: str = Query(...), destination: str = Query(...)):
+def plan(origin: str = Query(...), destination: str = Query(...),
+         transfer_penalty: float | None = Query(default=None, ge=0),
+         walk_penalty: float | None = Query(default=None, ge=0),
+         prefer: Literal["fewest_transfers", "fewest_stops"] | None = Query(default=None),
+         alternatives: int = Query(default=1, ge=1, le=10)):
     try:
         o, d = _normalize_stop_local(origin), _normalize_stop_local(destination)
-        res = _bfs_find(o, d)
-        if not res:
-            return {"ok": False, "origin": o, "destination": d, "legs": []}
-        names, routes = res
-        legs = _compress_into_legs(names, routes)
-        return {"ok": True, "origin": o, "destination": d, "legs": legs, "text": render_legs_human(legs)}
+        ov = current_overlay()
+        key = (o.lower(), d.lower(), transfer_penalty, walk_penalty, prefer, alternatives)
+        out = PLAN_CACHE.get(ov, key)
+        if out is not None: return out
+        if prefer:
+            out = {**plan_pareto(o, d, prefer, ov), **_network(ov)}
+        elif alternatives > 1:
+            out = {**plan_alternatives(o, d, alternatives, transfer_penalty, walk_penalty, ov), **_network(ov)}
+        else:
+            res = _find_route(o, d, transfer_penalty, walk_penalty, ov)
+            if not res:
+                out = {"ok": False, "origin": o, "destination": d, "legs": [], **_network(ov)}
+            else:
+                names, routes, minutes = res
+                legs = _compress_into_legs(names, routes)
+                out = {"ok": True, "origin": o, "destination": d, "legs": legs, "minutes": minutes,
+                       "text": render_legs_human(legs), **_network(ov)}
+        PLAN_CACHE.put(ov, key, out)
+        return out
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"plan error: {e}")
 
+@app.get("/plan/cache/stats")
+def plan_cache_stats():
+    ov = current_overlay()
+    return {"ok": True, "graph_version": graph_version(ov), **PLAN_CACHE.stats(ov)}
+
+@app.get("/disruptions")
+def disruptions():
+    return _network(current_overlay())
+
+@app.post("/disruptions")
+def update_disruptions(alerts: List[Dict[str, Any]] | Dict[str, Any] = Body(...)):
+    """Replace the active disruptions with MBTA /alerts items (or {"data": [...]}) or
+    flat {"effect", "route", "stops"} entries; an empty list clears them."""
+    t0 = time.perf_counter()
+    try:
+        ov = set_disruptions(alerts.get("data", []) if isinstance(alerts, dict) else alerts)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"disruption error: {e}")
+    patched = len(ov.tables.patch) if ov.tables is not None else 0
+    return {"ok": True, **_network(ov), "patched_columns": patched,
+            "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+class ODPair(BaseModel):
+    origin: str
+    destination: str
+
+class BatchRequest(BaseModel):
+    pairs: List[ODPair]
+    transfer_penalty: Optional[float] = Field(default=None, ge=0)
+    walk_penalty: Optional[float] = Field(default=None, ge=0)
+
+@app.post("/plan/batch")
+def plan_batch(req: BatchRequest):
+    """Plan many OD pairs in one call; streams one NDJSON row per pair (tagged with its
+    input index `i`) grouped by origin, then a trailer row with "done": true."""
+    if len(req.pairs) > BATCH_MAX_PAIRS:
+        raise HTTPException(status_code=413, detail=f"at most {BATCH_MAX_PAIRS} pairs per batch")
+    ov = current_overlay(); g = ov.graph
+    w = _weights(req.transfer_penalty, req.walk_penalty)
+    tables = ov.tables if w == Weights() else None
+    names = [(_normalize_stop_local(p.origin), _normalize_stop_local(p.destination)) for p in req.pairs]
+    known, unknown = [], []
+    for i, (o, d) in enumerate(names):
+        oi, di = g.lookup(o), g.lookup(d)
+        if oi is None or di is None: unknown.append(i)
+        else: known.append((i, oi, di))
+    groups = group_by_origin(known)
+
+    def rows():
+        t0 = time.perf_counter()
+        for i in unknown:
+            yield json.dumps({"i": i, "origin": names[i][0], "destination": names[i][1], "ok": False,
+                              "error": "unknown stop", "legs": []}) + "\n"
+        for row in run_batch(g, groups, w, tables):
+            o, d = names[row["i"]]
+            yield json.dumps({"i": row["i"], "origin": o, "destination": d, **row}) + "\n"
+        yield json.dumps({"done": True, "pairs": len(names), "origins": len(groups), **_network(ov),
+                          "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1)}) + "\n"
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+@app.get("/reachable")
+def reachable_stops(origin: str = Query(...), max_stops: int = Query(default=8, ge=0, le=200),
+                    max_transfers: int = Query(default=1, ge=0, le=10)):
+    """Every stop reachable from `origin` within `max_stops` stops and `max_transfers` transfers."""
+    o = _normalize_stop_local(origin); ov = current_overlay()
+    try:
+        out = reachable(o, max_stops, max_transfers, ov)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"reachability error: {e}")
+    if out is None:
+        return {"ok": False, "origin": o, "reachable": [], **_network(ov)}
+    return {"ok": True, "origin": o, "max_stops": max_stops, "max_transfers": max_transfers,
+            "count": len(out), "reachable": out, **_network(ov)}
+
+class MatrixRequest(BaseModel):
+    origins: Optional[List[str]] = None
+    destinations: Optional[List[str]] = None
+    format: Literal["json", "npy"] = "json"
+
+@app.get("/matrix")
+def matrix(origins: List[str] | None = Query(default=None), destinations: List[str] | None = Query(default=None),
+           format: Literal["json", "npy"] = Query(default="json")):
+    """Fewest-stops and fewest-transfers matrices; all stops when origins/destinations are omitted."""
+    return matrix_response(origins, destinations, format)
+
+@app.post("/matrix")
+def matrix_post(req: MatrixRequest):
+    return matrix_response(req.origins, req.destinations, req.format)
+
+def matrix_response(origins, destinations, fmt: str):
+    ov = current_overlay(); g = ov.graph
+    ids = {}
+    for key, names in (("origins", origins), ("destinations", destinations)):
+        names = [_normalize_stop_local(n) for n in names] if names else g.stop_names
+        found = [g.lookup(n) for n in names]
+        missing = [n for n, i in zip(names, found) if i is None]
+        if missing: raise HTTPException(status_code=404, detail=f"unknown {key}: {missing}")
+        ids[key] = ([g.stop_names[i] for i in found], np.array(found, dtype=np.intp))
+    stops, transfers = od_matrix(ov)
+    (o_names, o), (d_names, d) = ids["origins"], ids["destinations"]
+    stops, transfers = stops[np.ix_(o, d)], transfers[np.ix_(o, d)]
+    if fmt == "npy":
+        # shape (2, origins, destinations): [0] = stops, [1] = transfers; rows/columns follow
+        # the request order, or graph stop order (see format=json) when omitted
+        buf = io.BytesIO(); np.save(buf, np.stack([stops, transfers]))
+        return Response(buf.getvalue(), media_type="application/octet-stream",
+                        headers={"Content-Disposition": 'attachment; filename="od_matrix.npy"',
+                                 "X-Graph-Version": graph_version(ov)})
+    return {"ok": True, "origins": o_names, "destinations": d_names, "unreachable": -1,
+            "stops": stops.tolist(), "transfers": transfers.tolist(), **_network(ov)}
+
+def plan_alternatives(o: str, d: str, k: int, transfer_penalty, walk_penalty, ov=None):
+    alts = []
+    for names, routes, minutes in _k_routes(o, d, k, transfer_penalty, walk_penalty, ov):
+        legs = _compress_into_legs(names, routes)
+        alts.append({"minutes": minutes, "legs": legs, "text": render_legs_human(legs)})
+    if not alts:
+        return {"ok": False, "origin": o, "destination": d, "legs": [], "alternatives": []}
+    return {"ok": True, "origin": o, "destination": d, "legs": alts[0]["legs"], "minutes": alts[0]["minutes"],
+            "text": alts[0]["text"], "alternatives": alts}
+
+def plan_pareto(o: str, d: str, prefer: str, ov=None):
+    options = []
+    for opt in _pareto_routes(o, d, ov):
+        legs = _compress_into_legs(opt["names"], opt["routes"])
+        options.append({"transfers": opt["transfers"], "stops": opt["stops"],
+                        "legs": legs, "text": render_legs_human(legs)})
+    if not options:
+        return {"ok": False, "origin": o, "destination": d, "legs": [], "options": []}
+    # options run from fewest transfers to fewest stops
+    chosen = options[0] if prefer == "fewest_transfers" else options[-1]
+    return {"ok": True, "origin": o, "destination": d, "prefer": prefer, "legs": chosen["legs"],
+            "text": chosen["text"], "options": options}
+
+@app.get("/plan-timetable")
+def plan_timetable(origin: str = Query(...), destination: str = Query(...),
+                   depart: str | None = Query(default=None, pattern=r"^\d{1,2}:\d{2}$"),
+                   date: str | None = Query(default=None, pattern=r"^\d{8}$")):
+    tt = load_timetable()
+    if tt is None:
+        raise HTTPException(status_code=503, detail="GTFS feed not available (set GTFS_PATH)")
+    o, d = _normalize_stop_local(origin), _normalize_stop_local(destination)
+    now = datetime.now(_TZ)
+    h, m = map(int, (depart or now.strftime("%H:%M")).split(":"))
+    service_date = int(date or now.strftime("%Y%m%d"))
+    try:
+        res = earliest_arrival(tt, tt.stops_named(o), tt.stops_named(d), h * 3600 + m * 60, service_date)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"timetable error: {e}")
+    if not res:
+        return {"ok": False, "origin": o, "destination": d, "legs": []}
+    text = "\n".join(
+        f"Walk: {l['from']} → {l['to']} (~{l['minutes']} min)" if l["mode"] == "walk" else
+        f"{l['depart']} Take **{l['route_id']}**: {l['from']} → {l['to']}, arrive {l['arrive']}"
+        for l in res["legs"])
+    return {"ok": True, "origin": o, "destination": d, "date": service_date, **res, "text": text}
+
 @app.get("/plan-direct")
 def plan_direct(origin_lat: float = Query(...), origin_lng: float = Query(...),
-                dest_lat: float = Query(...), dest_lng: float = Query(...)):
-    out = plan_direct_route(origin_lat, origin_lng, dest_lat, dest_lng)
+                dest_lat: float = Query(...), dest_lng: float = Query(...),
+                radius_m: float = Query(default=600, gt=0, le=2000)):
+    out = plan_direct_multimodal(origin_lat, origin_lng, dest_lat, dest_lng, radius_m)
     if not out.get("ok"):
         raise HTTPException(status_code=502, detail=out.get("error", "planner error"))
     return out
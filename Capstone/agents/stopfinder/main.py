@@ -1,34 +1,54 @@
 
 # agents/stopfinder/main.py
-from fastapi import FastAPI, Query, HTTPException
+from fastapi import FastAPI, Query, HTTPException, Header
 from fastapi.responses import JSONResponse
 from shared.agentfacts import agentfacts_default
-from Capstone.server.app import _normalize_stop_local, _bfs_find, _compress_into_legs
+from Capstone.server.app import (_normalize_stop_local, _find_route, _compress_into_legs, build_graph, load_tables,
+                                 start_network_watcher, admin_reload, graph_version, stop_candidates,
+                                 suggest_stops, nearest_stops)
 
 app = FastAPI(title="stopfinder-agent", version="1.0.0")
 
+@app.on_event("startup")
+def warm_network():
+    build_graph(); load_tables(); start_network_watcher()
+
 @app.get("/healthz")
-def healthz(): return {"ok": True}
+def healthz(): return {"ok": True, "graph_version": graph_version()}
+
+@app.post("/admin/reload")
+def reload(force: bool = False, x_admin_token: str | None = Header(default=None)):
+    return admin_reload(force, x_admin_token)
 
 @app.get("/.well-known/agentfacts.json")
 def agentfacts():
     return JSONResponse(agentfacts_default(["mbta.stops.normalize"]))
 
 @app.get("/normalize")
-def normalize(name: str = Query(...)):
+def normalize(name: str = Query(...), limit: int = Query(default=5, ge=1, le=20)):
     try:
-        return {"ok": True, "input": name, "normalized": _normalize_stop_local(name)}
+        return {"ok": True, "input": name, "normalized": _normalize_stop_local(name),
+                "candidates": stop_candidates(name, limit)}
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"normalize error: {e}")
 
+@app.get("/stops/suggest")
+def suggest(prefix: str = Query(..., max_length=64), limit: int = Query(default=8, ge=1, le=20)):
+    return {"ok": True, "prefix": prefix, "suggestions": suggest_stops(prefix, limit)}
+
+@app.get("/stops/nearest")
+def nearest(lat: float = Query(..., ge=-90, le=90), lng: float = Query(..., ge=-180, le=180),
+            radius_m: float = Query(default=600, gt=0, le=5000), k: int = Query(default=5, ge=1, le=50)):
+    return {"ok": True, "lat": lat, "lng": lng, "radius_m": radius_m, "stops": nearest_stops(lat, lng, radius_m, k)}
+
 @app.get("/route-between-stops")
 def route_between_stops(origin: str = Query(...), destination: str = Query(...)):
     try:
         o, d = _normalize_stop_local(origin), _normalize_stop_local(destination)
-        res = _bfs_find(o, d)
+        res = _find_route(o, d)
         if not res: return {"ok": False, "origin": o, "destination": d, "legs": []}
-        names, routes = res
+        names, routes, minutes = res
         legs = _compress_into_legs(names, routes)
-        return {"ok": True, "origin": o, "destination": d, "legs": legs}
+        return {"ok": True, "origin": o, "destination": d, "legs": legs, "minutes": minutes}
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"route error: {e}")
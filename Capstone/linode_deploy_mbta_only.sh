@@ -174,6 +174,12 @@ sudo -u ubuntu bash -c "source .venv/bin/activate && pip install --upgrade pip &
 # Fix Capstone imports
 sed -i 's/from Capstone\./from /g' /home/ubuntu/mbta-agent/agents/*/main.py
 
+# Smoke-check the flat layout: every service must import before supervisor starts it
+sudo -u ubuntu bash -c "cd /home/ubuntu/mbta-agent && PYTHONPATH=/home/ubuntu/mbta-agent MBTA_API_KEY='$MBTA_API_KEY' .venv/bin/python -c 'import server.app, agents.planner.main, agents.stopfinder.main, agents.alerts.main'"
+
+# Precompute planner routing tables (memory-mapped by the planner/stopfinder workers)
+sudo -u ubuntu bash -c "cd /home/ubuntu/mbta-agent && .venv/bin/python -m server.tables"
+
 # Clone NANDA NEST
 cd /home/ubuntu
 sudo -u ubuntu git clone -b nov-5-demo https://github.com/DataWorksAI-com/NEST.git nanda-nest
@@ -0,0 +1,121 @@
+# Capstone/packages/mbta/geodist.py
+"""
+Vectorized great-circle distances.
+
+Coordinates are held as float32 columns together with their radians and the
+cosine of the latitude, so a one-to-many query (the stop grid's radius
+search) is a handful of array operations, a many-to-many matrix is the same
+thing broadcast, and all close pairs of a point set (walking transfers in
+gtfsnet) are found cell by cell with the same kernel.
+float32 keeps about half a metre of resolution at Boston's latitude, which is
+plenty for walking distances.
+
+    python -m Capstone.packages.mbta.geodist    # benchmark against the scalar formula
+"""
+from __future__ import annotations
+
+import math
+from typing import Iterable, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+class Points:
+    """Float32 coordinate columns with their radian and cos(latitude) columns precomputed."""
+
+    def __init__(self, lat: Iterable[float], lng: Iterable[float]):
+        self.lat = np.asarray(lat, dtype=np.float32)
+        self.lng = np.asarray(lng, dtype=np.float32)
+        self.rlat = np.radians(self.lat)
+        self.rlng = np.radians(self.lng)
+        self.cos = np.cos(self.rlat)
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def take(self, idx) -> "Points":
+        p = Points.__new__(Points)
+        p.lat, p.lng, p.rlat, p.rlng, p.cos = (a[idx] for a in (self.lat, self.lng, self.rlat, self.rlng, self.cos))
+        return p
+
+
+def _haversine(rlat1, rlng1, cos1, rlat2, rlng2, cos2) -> np.ndarray:
+    a = np.sin((rlat2 - rlat1) * 0.5) ** 2 + cos1 * cos2 * np.sin((rlng2 - rlng1) * 0.5) ** 2
+    return (2 * EARTH_RADIUS_KM) * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Single pair in float64 with the math module; cheaper than the kernels below a few dozen points."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) * 0.5) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lng2 - lng1) * 0.5) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def one_to_many(lat: float, lng: float, pts: Points) -> np.ndarray:
+    """Kilometres from one point to every point of `pts` (float32)."""
+    r = np.float32(math.radians(lat))
+    return _haversine(r, np.float32(math.radians(lng)), np.float32(math.cos(r)), pts.rlat, pts.rlng, pts.cos)
+
+
+def many_to_many(a: Points, b: Points) -> np.ndarray:
+    """len(a) x len(b) kilometre matrix (float32)."""
+    return _haversine(a.rlat[:, None], a.rlng[:, None], a.cos[:, None], b.rlat[None, :], b.rlng[None, :], b.cos[None, :])
+
+
+def pairs_near(pts: Points, km: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(i, j, km) arrays with i < j for every pair of `pts` closer than `km`. Points are sorted
+    into km-sized cells and joined only with their own and neighbouring cells, all as array ops."""
+    n = len(pts)
+    if n == 0: return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32)
+    deg_lat = km / (math.pi * EARTH_RADIUS_KM / 180)
+    deg_lng = deg_lat / max(math.cos(math.radians(float(np.nanmean(pts.lat)))), 1e-6)
+    cx = np.floor(pts.lng / deg_lng).astype(np.int64); cy = np.floor(pts.lat / deg_lat).astype(np.int64)
+    span = int(cy.max() - cy.min()) + 3
+    cell = (cx - cx.min()) * span + (cy - cy.min() + 1)
+    order = np.argsort(cell, kind="stable"); sc = cell[order]
+    out_i, out_j, out_d = [], [], []
+    # own cell plus the four "later" neighbours, so each pair comes up once
+    for off in (0, 1, span - 1, span, span + 1):
+        lo = np.searchsorted(sc, sc + off, "left"); cnt = np.searchsorted(sc, sc + off, "right") - lo
+        src = np.repeat(np.arange(n), cnt)
+        dst = np.repeat(lo, cnt) + (np.arange(len(src)) - np.repeat(np.cumsum(cnt) - cnt, cnt))
+        if off == 0:
+            keep = dst > src; src, dst = src[keep], dst[keep]
+        u, v = order[src], order[dst]
+        d = _haversine(pts.rlat[u], pts.rlng[u], pts.cos[u], pts.rlat[v], pts.rlng[v], pts.cos[v])
+        near = d <= km
+        out_i.append(np.minimum(u, v)[near]); out_j.append(np.maximum(u, v)[near]); out_d.append(d[near])
+    return np.concatenate(out_i), np.concatenate(out_j), np.concatenate(out_d)
+
+
+def _bench(n: int = 8000, m: int = 2000) -> None:
+    import time
+    scalar = haversine_km
+    rng = np.random.default_rng(0)
+    lat = 42.2 + rng.random(n) * 0.25; lng = -71.25 + rng.random(n) * 0.3
+    pts = Points(lat, lng); qlat, qlng = float(lat[0]), float(lng[0])
+
+    def best(f, reps=5):
+        out = []
+        for _ in range(reps):
+            t = time.perf_counter(); f(); out.append(time.perf_counter() - t)
+        return min(out)
+
+    t_s = best(lambda: [scalar(qlat, qlng, a, b) for a, b in zip(lat.tolist(), lng.tolist())])
+    t_v = best(lambda: one_to_many(qlat, qlng, pts))
+    print(f"one-to-{n}:       scalar {t_s * 1e3:8.2f} ms   vectorized {t_v * 1e3:7.3f} ms   x{t_s / t_v:.0f}")
+    a = pts.take(slice(0, m)); la, lo_ = lat[:m].tolist(), lng[:m].tolist(); km = 0.4
+    t_s = best(lambda: [[scalar(x, y, u, v) for u, v in zip(la, lo_)] for x, y in zip(la, lo_)], reps=1)
+    t_v = best(lambda: many_to_many(a, a))
+    print(f"{m}x{m} matrix:  scalar {t_s * 1e3:8.0f} ms   vectorized {t_v * 1e3:7.1f} ms   x{t_s / t_v:.0f}")
+    t_s = best(lambda: [(i, j) for i in range(m) for j in range(i + 1, m) if scalar(la[i], lo_[i], la[j], lo_[j]) <= km], reps=1)
+    t_v = best(lambda: pairs_near(a, km))
+    print(f"pairs of {m} < {km} km: scalar {t_s * 1e3:6.0f} ms   vectorized {t_v * 1e3:7.1f} ms   x{t_s / t_v:.0f}")
+    err = np.abs(one_to_many(qlat, qlng, pts) - [scalar(qlat, qlng, a, b) for a, b in zip(lat, lng)]).max()
+    print(f"max float32 error vs scalar: {err * 1000:.2f} m")
+
+
+if __name__ == "__main__":
+    _bench()
@@ -3,15 +3,9 @@
 from __future__ import annotations
 from dataclasses import dataclass, asdict
 from typing import Dict, Any
-import math, time
+import time
 
-def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371.0
-    p1, p2 = math.radians(lat1), math.radians(lat2)
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat/2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlon/2) ** 2
-    return 2 * R * math.asin(math.sqrt(a))
+from .geodist import haversine_km as _haversine_km
 
 def _fmt_km(km: float) -> str:
     if km < 1.0: return f"{int(km*1000)} m"
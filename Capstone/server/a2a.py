@@ -0,0 +1,175 @@
+# Capstone/server/a2a.py
+"""
+Calls from the orchestrator to the agents, remote or co-located.
+
+Each agent is dispatched per {NAME}_AGENT_MODE (default A2A_MODE, "remote"):
+
+  - remote: async HTTP on one shared httpx.AsyncClient. Its pool keeps
+    connections to each agent alive between chats, so a hop costs a round
+    trip instead of a new TCP connection.
+  - local: the agent's FastAPI app is imported into the orchestrator and its
+    GET endpoints are called as plain functions, with the same defaults they
+    get over HTTP. No serialization, no socket; sync endpoints run in the
+    threadpool as FastAPI would run them. The pool runs each local app's
+    lifespan (its startup hooks: the planner's warm-up and alerts poller) when
+    it starts and its shutdown when it closes. Meant for small deployments
+    that run everything in one process.
+
+Either way each agent has its own cap on in-flight calls and its own timeout
+({NAME}_AGENT_MAX_CONNECTIONS, {NAME}_AGENT_TIMEOUT), so a slow stopfinder
+cannot hold every pooled connection while the planner waits, and failures
+come back as AgentError. The app opens the pool in its lifespan and closes
+it at shutdown.
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import inspect
+import json
+import logging
+import os
+from contextlib import AsyncExitStack
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+from fastapi.params import Param
+from fastapi.routing import APIRoute
+from pydantic_core import PydanticUndefined
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+A2A_TIMEOUT = float(os.getenv("A2A_TIMEOUT", "6"))
+A2A_CONNECT_TIMEOUT = float(os.getenv("A2A_CONNECT_TIMEOUT", "2"))
+A2A_MAX_CONNECTIONS = int(os.getenv("A2A_MAX_CONNECTIONS", "256"))
+A2A_MAX_KEEPALIVE = int(os.getenv("A2A_MAX_KEEPALIVE", "64"))
+A2A_AGENT_MAX_CONNECTIONS = int(os.getenv("A2A_AGENT_MAX_CONNECTIONS", "100"))
+A2A_MODE = os.getenv("A2A_MODE", "remote").lower()
+
+
+log = logging.getLogger("a2a")
+
+
+class AgentError(Exception):
+    """A call to an agent failed: connection, timeout, HTTP status or a non-JSON body."""
+
+
+class LocalAgent:
+    """An agent's FastAPI app in this process; GET routes are called as functions."""
+
+    def __init__(self, module: str):
+        self.module = module
+        self._routes: Optional[Dict[str, Tuple[Callable, Dict[str, Any]]]] = None
+
+    async def start(self, stack: AsyncExitStack) -> None:
+        """Run the app's startup (on_event hooks or lifespan); its shutdown runs when `stack` closes."""
+        app = importlib.import_module(self.module).app
+        await stack.enter_async_context(app.router.lifespan_context(app))
+
+    def _load(self) -> Dict[str, Tuple[Callable, Dict[str, Any]]]:
+        if self._routes is None:
+            routes = {}
+            for r in importlib.import_module(self.module).app.routes:
+                if isinstance(r, APIRoute) and "GET" in r.methods:
+                    defaults = {}
+                    for name, p in inspect.signature(r.endpoint).parameters.items():
+                        d = p.default.default if isinstance(p.default, Param) else p.default
+                        if d not in (inspect.Parameter.empty, ..., PydanticUndefined):
+                            defaults[name] = d
+                    routes[r.path] = (r.endpoint, defaults)
+            self._routes = routes
+        return self._routes
+
+    async def get(self, path: str, params: Dict[str, Any]) -> Any:
+        try:
+            fn, defaults = self._load()[path]
+        except KeyError:
+            raise AgentError(f"A2A error calling local:{self.module}{path}: no such GET route") from None
+        except Exception as e:   # the agent module failed to import (e.g. missing config)
+            raise AgentError(f"A2A error loading local:{self.module}: {e!r}") from e
+        kwargs = {**defaults, **params}
+        try:
+            out = await fn(**kwargs) if inspect.iscoroutinefunction(fn) else await run_in_threadpool(fn, **kwargs)
+        except HTTPException as e:
+            raise AgentError(f"A2A error calling local:{self.module}{path}: {e.status_code} {e.detail}") from e
+        except TypeError as e:
+            raise AgentError(f"A2A error calling local:{self.module}{path}: {e}") from e
+        return json.loads(out.body) if isinstance(out, Response) else out
+
+
+class AgentPool:
+    """Per-agent dispatch (HTTP on a shared keep-alive client, or in-process) with a
+    concurrency cap and timeout for each agent."""
+
+    def __init__(self, agents: Dict[str, str], modules: Optional[Dict[str, str]] = None):
+        self.urls = {name: url.rstrip("/") for name, url in agents.items()}
+        env = lambda name, key, default: os.getenv(f"{name.upper()}_AGENT_{key}", default)
+        self.limits = {n: int(env(n, "MAX_CONNECTIONS", A2A_AGENT_MAX_CONNECTIONS)) for n in self.urls}
+        self.timeouts = {n: float(env(n, "TIMEOUT", A2A_TIMEOUT)) for n in self.urls}
+        modules = modules or {}
+        self.modes = {n: env(n, "MODE", A2A_MODE).lower() for n in self.urls}
+        for n, mode in self.modes.items():
+            if mode not in ("local", "remote"): raise ValueError(f"{n.upper()}_AGENT_MODE must be local or remote")
+            if mode == "local" and n not in modules: raise ValueError(f"agent {n} has no module to run locally")
+        self.local = {n: LocalAgent(modules[n]) for n, mode in self.modes.items() if mode == "local"}
+        self.client: Optional[httpx.AsyncClient] = None
+        self._sems: Dict[str, asyncio.Semaphore] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._apps: Optional[AsyncExitStack] = None
+
+    async def start(self) -> None:
+        """Open the HTTP client and start the local agents' apps."""
+        await self._open()
+        if self._apps is None:
+            self._apps = AsyncExitStack()
+            for n, agent in self.local.items():
+                try:
+                    await agent.start(self._apps)
+                except Exception as e:   # e.g. the alerts agent without MBTA_API_KEY; its calls report it
+                    log.warning("local agent %s did not start: %r", n, e)
+
+    async def _open(self) -> None:
+        # the client and semaphores belong to the running loop; a client from another loop is closed first
+        await self._close_client()
+        self._loop = asyncio.get_running_loop()
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=A2A_MAX_CONNECTIONS, max_keepalive_connections=A2A_MAX_KEEPALIVE),
+            timeout=httpx.Timeout(A2A_TIMEOUT, connect=A2A_CONNECT_TIMEOUT))
+        self._sems = {n: asyncio.Semaphore(self.limits[n]) for n in self.urls}
+
+    async def _close_client(self) -> None:
+        client, self.client = self.client, None
+        if client is None: return
+        try:
+            await client.aclose()
+        except Exception as e:   # its connections belonged to a loop that is gone
+            log.debug("closing the previous agent client: %r", e)
+
+    async def close(self) -> None:
+        """Close the HTTP client and run the local agents' shutdown."""
+        await self._close_client()
+        apps, self._apps = self._apps, None
+        if apps is not None: await apps.aclose()
+
+    async def get(self, agent: str, path: str, params: Optional[Dict[str, Any]] = None,
+                  timeout: Optional[float] = None) -> Any:
+        """GET {agent url}{path} (or the same route in-process) and return the decoded JSON body."""
+        # outside the lifespan (scripts, a bare TestClient) open the pool on first use
+        if self.client is None or self._loop is not asyncio.get_running_loop():
+            await (self._open() if self._apps is not None else self.start())
+        if agent in self.local:
+            try:
+                async with self._sems[agent]:
+                    return await asyncio.wait_for(self.local[agent].get(path, params or {}),
+                                                  timeout or self.timeouts[agent])
+            except asyncio.TimeoutError as e:
+                raise AgentError(f"A2A error calling local:{agent}{path}: timed out") from e
+        url = f"{self.urls[agent]}{path}"
+        try:
+            async with self._sems[agent]:
+                r = await self.client.get(url, params=params or {}, timeout=timeout or self.timeouts[agent])
+            r.raise_for_status()
+            return r.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise AgentError(f"A2A error calling {url}: {e!r}") from e
@@ -1,17 +1,34 @@
 
 # Capstone/server/app.py (ORCHESTRATOR)
-import os, re, json
-from typing import List, Literal, Optional, Dict, Tuple
+import os, json, math, time, asyncio, logging, threading
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, List, Literal, Optional, Dict, Tuple
 from pathlib import Path
 from functools import lru_cache
+from dataclasses import asdict
+from collections import OrderedDict
 
-from fastapi import FastAPI, HTTPException, Response, Query
+from fastapi import FastAPI, HTTPException, Response, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, RedirectResponse, JSONResponse
+from fastapi.responses import FileResponse, RedirectResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, ValidationError
+from pydantic import BaseModel, Field, ValidationError
 from dotenv import load_dotenv
-import requests
+
+from .routing import (Graph, Weights, shortest_path, shortest_path_between, k_shortest_paths, path_to_stops,
+                      display, _path_cost, DEFAULT_TRANSFER_PENALTY, DEFAULT_WALK_PENALTY)
+from .tables import RoutingTables
+from .raptor import Raptor
+from .lineindex import LineIndex
+from .gtfs import Timetable
+from .disruptions import Overlay, parse_alerts
+from .network import NetworkSnapshot, data_stamp
+from .a2a import AgentPool, AgentError
+from .intents import IntentMatcher
+try:
+    from ..packages.mbta.mcp_server import Leg, plan_direct_route, _fmt_km
+except ImportError:   # deployed flat, server/ and packages/ side by side (linode_deploy_mbta_only.sh)
+    from packages.mbta.mcp_server import Leg, plan_direct_route, _fmt_km
 
 load_dotenv()
 
@@ -25,8 +42,29 @@ WEB_DIR = BASE_DIR / "web"
 INDEX_FILE = WEB_DIR / "index.html"
 FAVICON_FILE = WEB_DIR / "favicon.ico"
 DATA_DIR = BASE_DIR / "data"
-
-app = FastAPI(title="MBTA Orchestrator UI", version="1.0.0")
+TABLES_DIR = Path(os.getenv("PLANNER_TABLES_DIR", str(DATA_DIR / "compiled" / "routing")))
+SNAPSHOT_PATH = Path(os.getenv("PLANNER_SNAPSHOT", str(DATA_DIR / "compiled" / "network.npz")))
+GTFS_PATH = Path(os.getenv("GTFS_PATH", str(DATA_DIR / "gtfs" / "MBTA_GTFS.zip")))
+GTFS_CACHE = Path(os.getenv("GTFS_CACHE", str(DATA_DIR / "compiled" / "gtfs.npz")))
+# "lines" plans on data/lines; "gtfs" builds every route of the deployed feed (bus, commuter rail, ferry)
+NETWORK_SOURCE = os.getenv("PLANNER_NETWORK_SOURCE", "lines").lower()
+
+# {NAME}_AGENT_MODE=local runs that agent's app inside the orchestrator instead of calling its URL
+# the agents sit next to server/ wherever it is deployed: Capstone.agents.* here, agents.* in the flat tree
+_ROOT = __package__.rpartition(".")[0]
+AGENTS = AgentPool({"alerts": ALERTS_AGENT_URL, "planner": PLANNER_AGENT_URL, "stopfinder": STOPFINDER_AGENT_URL},
+                   modules={n: f"{_ROOT + '.' if _ROOT else ''}agents.{n}.main" for n in ("alerts", "planner", "stopfinder")})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # map the compiled snapshot now rather than on the first rider's request
+    current_overlay(); intent_matcher(); start_network_watcher()
+    await AGENTS.start()
+    try: yield
+    finally: await AGENTS.close()
+
+app = FastAPI(title="MBTA Orchestrator UI", version="1.0.0", lifespan=lifespan)
+log = logging.getLogger("orchestrator")
 
 app.add_middleware(
     CORSMiddleware,
@@ -56,71 +94,240 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     messages: List[ChatMessage]
 
-def _load_json(path: Path):
-    with open(path, "r", encoding="utf-8") as f: return json.load(f)
+_overlay: Optional[Overlay] = None
+_active_alerts: List[Dict] = []
+_overlay_lock = threading.RLock()   # serializes writers; readers just take the reference
+_reload_lock = threading.Lock()
+
+def current_overlay() -> Overlay:
+    """The network view requests should route on: current snapshot plus active disruptions."""
+    global _overlay
+    if _overlay is None:
+        with _overlay_lock:
+            if _overlay is None: _overlay = Overlay(_load_snapshot())
+    return _overlay
+
+def _load_snapshot() -> NetworkSnapshot:
+    tt = None
+    if NETWORK_SOURCE == "gtfs":
+        tt = load_timetable()
+        if tt is None: log.warning("PLANNER_NETWORK_SOURCE=gtfs but no feed at %s; using data/lines", GTFS_PATH)
+    return NetworkSnapshot.load(DATA_DIR, TABLES_DIR, SNAPSHOT_PATH, tt)
+
+def current_snapshot() -> NetworkSnapshot:
+    return current_overlay().snapshot
+
+def load_aliases() -> Dict[str, str]: return current_snapshot().aliases
+def load_transfers() -> Dict: return current_snapshot().transfers
+def load_lines() -> Dict[str, Dict]: return current_snapshot().lines
+def build_graph() -> Graph: return current_snapshot().graph
+def load_tables() -> Optional[RoutingTables]: return current_snapshot().tables
+
+def network_fingerprint() -> str:
+    """Hash of the network sources and default weights; keys the precomputed tables."""
+    return current_snapshot().fingerprint
+
+def set_disruptions(alerts: List[Dict]) -> Overlay:
+    """Replace the active alert set; only state the change can affect is recomputed."""
+    global _overlay, _active_alerts
+    with _overlay_lock:
+        ov = current_overlay(); _active_alerts = list(alerts)
+        _overlay = ov.apply(parse_alerts(alerts, ov.base, ov.lines, lambda s: _resolve_alert_stop(s, ov.base)))
+        return _overlay
+
+def reload_network(force: bool = False) -> Tuple[Overlay, bool]:
+    """Rebuild the snapshot from DATA_DIR off to the side, then swap it in with the active
+    disruptions re-applied. Requests already running finish on the snapshot they hold."""
+    global _overlay
+    with _reload_lock:
+        if NETWORK_SOURCE == "gtfs": load_timetable.cache_clear(); _gtfs_station_names.cache_clear()
+        snap = _load_snapshot()
+        if not force and snap.version == current_snapshot().version: return current_overlay(), False
+        snap.ensure_tables(TABLES_DIR)
+        with _overlay_lock:
+            ov = Overlay(snap)
+            _overlay = ov.apply(parse_alerts(_active_alerts, ov.base, ov.lines,
+                                             lambda s: _resolve_alert_stop(s, ov.base)))
+        return _overlay, True
+
+def graph_version(ov: Optional[Overlay] = None) -> str:
+    ov = ov or current_overlay()
+    return f"{ov.snapshot.version}.{ov.version}"
+
+NETWORK_WATCH_SECONDS = float(os.getenv("NETWORK_WATCH_SECONDS", "0"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+_watcher: Optional[threading.Thread] = None
+
+def start_network_watcher(interval: float = NETWORK_WATCH_SECONDS) -> None:
+    """Poll the data directory and hot-swap the snapshot when a source file changes."""
+    global _watcher
+    if interval <= 0 or _watcher is not None: return
+    def stamp_now():
+        stamp = data_stamp(DATA_DIR)
+        if NETWORK_SOURCE == "gtfs" and GTFS_PATH.exists():
+            st = GTFS_PATH.stat(); stamp += ((GTFS_PATH.name, st.st_mtime_ns, st.st_size),)
+        return stamp
+    def watch():
+        stamp = stamp_now()
+        while True:
+            time.sleep(interval)
+            cur = stamp_now()
+            if cur == stamp: continue
+            stamp = cur
+            try:
+                ov, changed = reload_network()
+                if changed: log.warning("network reloaded: graph %s", graph_version(ov))
+            except Exception as e:
+                log.warning("network reload failed, keeping %s: %s", graph_version(), e)
+    _watcher = threading.Thread(target=watch, name="network-watcher", daemon=True); _watcher.start()
+
+def admin_reload(force: bool, token: Optional[str]) -> Dict:
+    """Body of the /admin/reload endpoints the orchestrator and agents expose."""
+    if ADMIN_TOKEN and token != ADMIN_TOKEN: raise HTTPException(status_code=403, detail="bad admin token")
+    t0 = time.perf_counter()
+    try:
+        ov, changed = reload_network(force)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"reload failed, still serving {graph_version()}: {e}")
+    return {"ok": True, "reloaded": changed, "graph_version": graph_version(ov), "stops": ov.base.n_stops,
+            "tables": ov.tables is not None, "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1)}
 
 @lru_cache(maxsize=1)
-def load_aliases() -> Dict[str, str]:
-    p = DATA_DIR / "aliases.json"
-    return {k.lower(): v for k, v in (_load_json(p) if p.exists() else {}).items()}
+def _gtfs_station_names() -> Dict[str, str]:
+    tt = load_timetable()
+    if tt is None: return {}
+    return dict(zip(tt.stop_ids.tolist(), tt.stop_names[tt.stop_parent].tolist()))
+
+def _resolve_alert_stop(stop: str, graph: Graph) -> Optional[int]:
+    """Graph stop id for an alert's stop: a stop name, or an MBTA stop id via the GTFS feed."""
+    s = graph.lookup(_normalize_stop_local(stop))
+    if s is None and stop in _gtfs_station_names():
+        s = graph.lookup(_normalize_stop_local(_gtfs_station_names()[stop]))
+    return s
 
-@lru_cache(maxsize=1)
-def load_transfers() -> Dict:
-    p = DATA_DIR / "transfers.json"
-    return _load_json(p) if p.exists() else {"default_walk_minutes": 3, "pairs": []}
+def _normalize_stop_local(name: str) -> str:
+    """Alias or exact stop name first, then the fuzzy resolver; unresolved input is returned as is."""
+    if not name: return ""
+    snap = current_snapshot(); key = name.strip().lower()
+    if key in snap.aliases: return snap.aliases[key]
+    if snap.graph.lookup(key) is not None: return snap.graph.stop_names[snap.graph.lookup(key)]
+    return snap.resolver.resolve(name) or name.strip()
+
+def suggest_stops(prefix: str, limit: int = 8) -> List[str]:
+    return current_snapshot().suggest.suggest(prefix, limit)
+
+def nearest_stops(lat: float, lng: float, radius_m: float = 600, k: int = 5) -> List[Dict]:
+    grid = current_snapshot().grid
+    return [{"name": n, "lat": grid.coords(n)[0], "lng": grid.coords(n)[1], "distance_m": d}
+            for n, d in grid.nearest(lat, lng, radius_m, k)]
+
+def stop_candidates(name: str, limit: int = 5) -> List[Dict]:
+    return [{"stop": s, "score": round(sc, 3)} for s, sc in current_snapshot().resolver.candidates(name, limit)]
+
+def _weights(transfer_penalty: Optional[float], walk_penalty: Optional[float]) -> Weights:
+    return Weights(DEFAULT_TRANSFER_PENALTY if transfer_penalty is None else transfer_penalty,
+                   DEFAULT_WALK_PENALTY if walk_penalty is None else walk_penalty)
+
+def _find_route(origin: str, dest: str, transfer_penalty: Optional[float] = None,
+                walk_penalty: Optional[float] = None, overlay: Optional[Overlay] = None):
+    """Cheapest itinerary by minutes; returns (names, routes, minutes) or None."""
+    ov = overlay or current_overlay()
+    graph = ov.graph; o, d = graph.lookup(origin), graph.lookup(dest)
+    if o is None or d is None: return None
+    w = _weights(transfer_penalty, walk_penalty)
+    tables = ov.tables if w == Weights() else None
+    if tables:
+        fast = _same_line(ov, tables, o, d)
+        if fast: return fast
+    res = tables.route(graph, o, d) if tables else shortest_path(graph, o, d, w)
+    if not res: return None
+    path, minutes = res
+    names, routes = display(graph, *path_to_stops(graph, path))
+    return names, routes, round(minutes, 1)
+
+def line_index(overlay: Optional[Overlay] = None) -> LineIndex:
+    ov = overlay or current_overlay()
+    if "lines" not in ov.cache: ov.cache["lines"] = LineIndex(ov.graph, ov.lines)
+    return ov.cache["lines"]
+
+def _same_line(ov: Overlay, tables: RoutingTables, o: int, d: int):
+    """A one-line ride read off the line index, when the tables say nothing beats it."""
+    idx = line_index(ov); ride = idx.ride(o, d)
+    if ride is None: return None
+    k, i, j, minutes = ride
+    g = ov.graph; p, q = g.platform(o, idx.routes[k]), g.platform(d, idx.routes[k])
+    # a closure at either end leaves the line's ride minutes intact but shuts its BOARD/ALIGHT edge
+    if p not in g.boardable(o) or not math.isfinite(g.minutes[g.edge(q, d)]): return None
+    col = tables.column(d)[0]
+    best = min(float(col[v]) for v in [o] + g.boardable(o))
+    if not math.isfinite(best) or minutes > best + 1e-6: return None
+    stops = idx.segment(k, i, j)
+    return [ov.graph.stop_names[s] for s in stops], [idx.routes[k]] * (len(stops) - 1), round(minutes, 1)
+
+def _k_routes(origin: str, dest: str, k: int, transfer_penalty: Optional[float] = None,
+              walk_penalty: Optional[float] = None,
+              overlay: Optional[Overlay] = None) -> List[Tuple[List[str], List[str], float]]:
+    """Up to k loop-free itineraries ranked by minutes, as (names, routes, minutes)."""
+    ov = overlay or current_overlay()
+    graph = ov.graph; o, d = graph.lookup(origin), graph.lookup(dest)
+    if o is None or d is None: return []
+    w = _weights(transfer_penalty, walk_penalty)
+    tables = ov.tables if w == Weights() else None
+    # the precomputed distance column doubles as the exact A* heuristic
+    h = tables.column(d)[0].tolist() if tables else None
+    out = []
+    for path, minutes in k_shortest_paths(graph, o, d, k, w, h):
+        names, routes = display(graph, *path_to_stops(graph, path))
+        out.append((names, routes, round(minutes, 1)))
+    return out
 
-@lru_cache(maxsize=1)
-def load_lines() -> Dict[str, Dict]:
-    lines_dir = DATA_DIR / "lines"; out = {}
-    if lines_dir.exists():
-        for f in lines_dir.iterdir():
-            if f.suffix == ".json":
-                obj = _load_json(f); out[obj["route_id"]] = obj
+def build_raptor(overlay: Optional[Overlay] = None) -> Raptor:
+    ov = overlay or current_overlay()
+    if "raptor" not in ov.cache: ov.cache["raptor"] = Raptor(ov.graph, ov.lines, ov.snapshot.transfers)
+    return ov.cache["raptor"]
+
+def od_matrix(overlay: Optional[Overlay] = None):
+    """(stops, transfers) int16 matrices over all stops, -1 = unreachable; cached per graph version."""
+    ov = overlay or current_overlay()
+    if "matrix" not in ov.cache: ov.cache["matrix"] = build_raptor(ov).matrix(range(ov.graph.n_stops))
+    return ov.cache["matrix"]
+
+REACH_CACHE_SIZE = int(os.getenv("PLANNER_REACH_CACHE", "1024"))
+
+def reachable(origin: str, max_stops: int, max_transfers: int,
+              overlay: Optional[Overlay] = None) -> Optional[List[Dict]]:
+    """Stops reachable within the bounds, with stop and transfer counts; None for an unknown
+    origin. Memoized on the overlay, so answers never outlive the graph version."""
+    ov = overlay or current_overlay()
+    o = ov.graph.lookup(origin)
+    if o is None: return None
+    cache = ov.cache.setdefault("reach", OrderedDict()); key = (o, max_stops, max_transfers)
+    if key in cache:
+        cache.move_to_end(key); return cache[key]
+    g = ov.graph
+    out = [{"stop": g.stop_names[s], "stops": n, "transfers": t}
+           for s, n, t in build_raptor(ov).reachable(o, max_stops, max_transfers)]
+    out.sort(key=lambda r: (r["stops"], r["transfers"], r["stop"]))
+    cache[key] = out
+    if len(cache) > REACH_CACHE_SIZE: cache.popitem(last=False)
     return out
 
-@lru_cache(maxsize=1)
-def build_graph() -> Dict[str, List[Tuple[str, str]]]:
-    graph: Dict[str, List[Tuple[str, str]]] = {}
-    lines = load_lines()
-    for line in lines.values():
-        stops = [s.strip() for s in line["stops"]]
-        for i in range(len(stops)-1):
-            a, b = stops[i].lower(), stops[i+1].lower()
-            graph.setdefault(a, []).append((stops[i+1], line["route_id"]))
-            graph.setdefault(b, []).append((stops[i], line["route_id"]))
-    for a, b in load_transfers().get("pairs", []):
-        graph.setdefault(a.strip().lower(), []).append((b, "walk"))
-        graph.setdefault(b.strip().lower(), []).append((a, "walk"))
-    return graph
+def _pareto_routes(origin: str, dest: str, overlay: Optional[Overlay] = None) -> List[Dict]:
+    """Pareto set of (transfers, stops) itineraries, fewest transfers first."""
+    ov = overlay or current_overlay()
+    graph = ov.graph; o, d = graph.lookup(origin), graph.lookup(dest)
+    if o is None or d is None: return []
+    return build_raptor(ov).pareto(o, d)
 
-def _normalize_stop_local(name: str) -> str:
-    if not name: return ""
-    alias_map = load_aliases()
-    return alias_map.get(name.strip().lower(), name.strip())
+@lru_cache(maxsize=1)
+def load_timetable() -> Optional[Timetable]:
+    """GTFS static feed as columnar arrays; None when no feed is deployed."""
+    return Timetable.load(GTFS_PATH, GTFS_CACHE) if GTFS_PATH.exists() else None
 
 def _bfs_find(origin: str, dest: str):
-    graph = build_graph(); o_key, d_key = origin.lower(), dest.lower()
-    if o_key not in graph or d_key not in graph: return None
-    from collections import deque
-    parent: Dict[str, Tuple[str, str]] = {o_key: ("", "")}
-    q = deque([o_key])
-    while q:
-        node = q.popleft()
-        if node == d_key: break
-        for neigh_name, route_id in graph[node]:
-            k = neigh_name.lower()
-            if k not in parent:
-                parent[k] = (node, route_id)
-                q.append(k)
-    if d_key not in parent: return None
-    names_rev, routes_rev, cur = [], [], d_key
-    while cur:
-        p, r = parent[cur]; names_rev.append(cur)
-        if r: routes_rev.append(r)
-        cur = p
-    names = [n for n in reversed(names_rev)]
-    routes = list(reversed(routes_rev))
-    return names, routes
+    """Kept for older callers; now backed by the weighted planner."""
+    res = _find_route(origin, dest)
+    return (res[0], res[1]) if res else None
 
 def _compress_into_legs(names: List[str], routes: List[str]) -> List[Dict]:
     if not names or not routes: return []
@@ -140,31 +347,77 @@ def render_legs_human(legs: List[Dict]) -> str:
     for leg in legs:
         r = leg["route_id"]
         if r == "walk":
-            out.append(f"Walk: {leg['from']} → {leg['to']} (~3 min)")
+            walk = load_transfers().get("default_walk_minutes", 3)
+            out.append(f"Walk: {leg['from']} → {leg['to']} (~{walk} min)")
         else:
             out.append(f"Take **{r}**: {leg['from']} → {leg['to']} (~{leg['stops_count']} stops)")
     return "\\n".join(out)
 
-def a2a_call(base, path, params=None, timeout=6):
+DIRECT_CANDIDATES = int(os.getenv("PLANNER_DIRECT_CANDIDATES", "8"))
+
+def _walk_minutes(m: float) -> int:
+    # the pace plan_direct_route uses: 12 min per km
+    return max(1, int(round(m / 1000 * 12)))
+
+def plan_direct(origin_lat: float, origin_lng: float, dest_lat: float, dest_lng: float,
+                radius_m: float = 600, overlay: Optional[Overlay] = None) -> Dict:
+    """Walk + transit + walk between two points, or the plain walk when transit is no faster.
+    Stops within radius_m of either end are snapped with the grid index and every
+    origin/destination stop pair is tried in a single search."""
+    walk = plan_direct_route(origin_lat, origin_lng, dest_lat, dest_lng, radius_m)
+    if not walk.get("ok"): return walk
+    walk["mode"] = "walk"
+    ov = overlay or current_overlay(); g, grid = ov.graph, ov.snapshot.grid
+    near_o = dict(grid.nearest(origin_lat, origin_lng, radius_m, DIRECT_CANDIDATES))
+    near_d = dict(grid.nearest(dest_lat, dest_lng, radius_m, DIRECT_CANDIDATES))
+    access = {g.lookup(n): _walk_minutes(m) for n, m in near_o.items()}
+    egress = {g.lookup(n): _walk_minutes(m) for n, m in near_d.items()}
+    res = shortest_path_between(g, access, egress) if access and egress else None
+    if res is None or res[1] >= walk["legs"][0]["est_minutes"]: return walk
+    path = res[0]
+    stops, hops = path_to_stops(g, path)
+    # the penalized cost only ranks the options; report travel minutes, penalties left out
+    acc = _path_cost(g, path, Weights(0.0, 0.0).extra()); pos = {v: i for i, v in enumerate(path)}
+    at = [0.0] + [acc[pos[v]] for v in hops]   # ride minutes on arrival at each stop
+    names, routes = display(g, stops, hops)
+    o_name, d_name = names[0], names[-1]
+    legs = [Leg("walk", f"{origin_lat:.5f},{origin_lng:.5f}", o_name, _fmt_km(near_o[o_name] / 1000), access[stops[0]])]
+    i = 0
+    for l in _compress_into_legs(names, routes):
+        n = l["stops_count"]; mins = max(1, int(round(at[i + n] - at[i]))); i += n
+        if l["route_id"] == "walk": legs.append(Leg("walk", l["from"], l["to"], "transfer", mins))
+        else: legs.append(Leg(l["route_id"], l["from"], l["to"], f"{n} stop{'s' if n != 1 else ''}", mins))
+    legs.append(Leg("walk", d_name, f"{dest_lat:.5f},{dest_lng:.5f}", _fmt_km(near_d[d_name] / 1000), egress[stops[-1]]))
+    total = int(round(access[stops[0]] + acc[-1] + egress[stops[-1]]))
+    rides = ", ".join(f"take {l.mode} to {l.to_point}" if l.mode != "walk" else f"walk to {l.to_point}"
+                      for l in legs[1:-1])
+    return {
+        "ok": True, "mode": "transit",
+        "summary": f"Walk {legs[0].distance} to {o_name}, {rides}, then walk {legs[-1].distance} (~{total} min).",
+        "legs": [asdict(l) for l in legs],
+        "metrics": {**walk["metrics"], "minutes": total, "walk_only_minutes": walk["legs"][0]["est_minutes"]},
+    }
+
+async def a2a_call(agent: str, path: str, params=None, timeout: Optional[float] = None):
     try:
-        r = requests.get(f"{base}{path}", params=params or {}, timeout=timeout)
-        r.raise_for_status()
-        return r.json()
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"A2A error calling {base}{path}: {e}")
+        return await AGENTS.get(agent, path, params, timeout)
+    except AgentError as e:
+        raise HTTPException(status_code=502, detail=str(e))
 
-def ask_alerts(route: Optional[str]):
-    return a2a_call(ALERTS_AGENT_URL, "/alerts", {"route": route} if route else {})
+async def ask_alerts(route: Optional[str]):
+    return await a2a_call("alerts", "/alerts", {"route": route} if route else {})
 
-def ask_plan(origin: str, destination: str):
-    return a2a_call(PLANNER_AGENT_URL, "/plan", {"origin": origin, "destination": destination})
+async def ask_plan(origin: str, destination: str, alternatives: int = 1):
+    params = {"origin": origin, "destination": destination}
+    if alternatives > 1: params["alternatives"] = alternatives
+    return await a2a_call("planner", "/plan", params)
 
-def ask_plan_direct(origin_lat: float, origin_lng: float, dest_lat: float, dest_lng: float):
-    return a2a_call(PLANNER_AGENT_URL, "/plan-direct",
-                    {"origin_lat": origin_lat, "origin_lng": origin_lng, "dest_lat": dest_lat, "dest_lng": dest_lng})
+async def ask_plan_direct(origin_lat: float, origin_lng: float, dest_lat: float, dest_lng: float):
+    return await a2a_call("planner", "/plan-direct",
+                          {"origin_lat": origin_lat, "origin_lng": origin_lng, "dest_lat": dest_lat, "dest_lng": dest_lng})
 
-def ask_normalize(name: str):
-    return a2a_call(STOPFINDER_AGENT_URL, "/normalize", {"name": name})
+async def ask_normalize(name: str):
+    return await a2a_call("stopfinder", "/normalize", {"name": name})
 
 class ChatMessage(BaseModel):
     role: Literal["user","assistant","tool"]
@@ -172,42 +425,193 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     messages: List[ChatMessage]
     intent: Optional[str] = None
+    alternatives: int = Field(1, ge=1, le=10)   # same bound as the planner's /plan
 class ChatResponse(BaseModel):
     messages: List[ChatMessage]
+    timings: Optional[Dict[str, Any]] = None
+
+def _plan_text(plan: Dict) -> str:
+    alts = plan.get("alternatives") or []
+    if len(alts) < 2: return plan.get("text") or "No route."
+    # leg text is joined with a literal "\\n" (render_legs_human); keep one separator throughout
+    return "\\n\\n".join(f"Option {i} (~{a['minutes']} min):\\n{a['text']}" for i, a in enumerate(alts, 1))
+
+_intents: Tuple[str, Optional[IntentMatcher]] = ("", None)
+
+def intent_matcher() -> IntentMatcher:
+    """The /chat intent and entity matcher compiled for the current snapshot's stop names."""
+    global _intents
+    snap = current_snapshot()
+    if _intents[0] != snap.version: _intents = (snap.version, IntentMatcher(snap.graph.stop_names, snap.aliases))
+    return _intents[1]
+
+# the planner resolves names itself, so a plan on the raw names is usually already the answer
+CHAT_SPECULATIVE_PLAN = os.getenv("CHAT_SPECULATIVE_PLAN", "1").lower() not in ("0", "false", "no")
+
+def _ms_since(t: float) -> float:
+    return round((time.perf_counter() - t) * 1000, 1)
+
+async def _normalized(name: str) -> str:
+    try:
+        return (await ask_normalize(name)).get("normalized", name)
+    except HTTPException:
+        return name
+
+async def plan_directions(origin: str, dest: str, alternatives: int = 1,
+                          events: Optional[asyncio.Queue] = None) -> Tuple[Dict, Dict[str, Any]]:
+    """Both ends are normalized at once while a speculative plan on the raw names runs. The
+    first plan that finds a route wins and the other call is cancelled; without one, the plan
+    on the normalized names is returned. Also returns per-stage timings in milliseconds.
+    With `events`, each normalized stop is put there as ("stop", {...}) as soon as it is known;
+    ends still unresolved when a plan wins are reported as the plan resolved them."""
+    t0 = time.perf_counter(); timings: Dict[str, Any] = {}; sent = set()
+
+    async def norm(end: str, name: str) -> str:
+        n = await _normalized(name)
+        if events is not None: events.put_nowait(("stop", {"end": end, "input": name, "normalized": n})); sent.add(end)
+        return n
+
+    async def speculative():
+        t = time.perf_counter(); r = await ask_plan(origin, dest, alternatives)
+        timings["speculative_plan_ms"] = _ms_since(t); return r
+
+    async def normalized():
+        t = time.perf_counter()
+        o, d = await asyncio.gather(norm("origin", origin), norm("destination", dest))
+        timings["normalize_ms"] = _ms_since(t)
+        if CHAT_SPECULATIVE_PLAN and (o, d) == (origin, dest): return None   # the speculative plan is this plan
+        t = time.perf_counter(); r = await ask_plan(o, d, alternatives)
+        timings["plan_ms"] = _ms_since(t); return r
+
+    tasks = {asyncio.create_task(normalized()): "normalized"}
+    if CHAT_SPECULATIVE_PLAN: tasks[asyncio.create_task(speculative())] = "speculative"
+    pending, results, error, winner = set(tasks), {}, None, None
+    try:
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                try: r = t.result()
+                except HTTPException as e: error = e; continue
+                if r is None: continue
+                results[tasks[t]] = r
+                if r.get("ok") and winner is None: winner = tasks[t]
+    finally:
+        for t in pending: t.cancel()
+    timings.update(total_ms=_ms_since(t0), winner=winner, cancelled=sorted(tasks[t] for t in pending))
+    plan = results.get(winner) or results.get("normalized") or results.get("speculative")
+    if plan is None: raise error or HTTPException(status_code=502, detail="no plan from the planner agent")
+    if events is not None:
+        for end, name in (("origin", origin), ("destination", dest)):
+            if end not in sent: events.put_nowait(("stop", {"end": end, "input": name, "normalized": plan.get(end) or name}))
+    return plan, timings
+
+def _alert_routes(legs: List[Dict]) -> List[str]:
+    """MBTA API route ids of the lines an itinerary rides, for its alerts."""
+    out: List[str] = []
+    for leg in legs:
+        r = leg.get("route_id")
+        if not r or r == "walk": continue
+        # "Red-Line-Main", "Green-B", "SL1" read as route names; GTFS ids ("39", "39-2") are MBTA ids
+        head, _, tail = r.rpartition("-")
+        rid = intent_matcher().parse(r.replace("-", " ")).route or (head if head and tail.isdigit() else r)
+        out += [x for x in rid.split(",") if x not in out]
+    return out
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-_FROM_TO_RE = re.compile(r"\bfrom\s+(?P<orig>.+?)\s+to\s+(?P<dest>.+)$", re.I)
+async def _chat_events(req: ChatRequest) -> AsyncIterator[str]:
+    """/chat as server-sent events: `intent` at once, then each agent's answer as it lands
+    (`stop` per normalized end, `plan`, `alerts` for the plan's routes), then `done` with the
+    same messages and timings /chat returns. A failed agent call ends the stream with `error`."""
+    t0 = time.perf_counter(); history = list(req.messages)
+    usr = next((m for m in reversed(req.messages) if m.role == "user"), None)
+    text = (usr.content or "").strip() if usr else ""
+    p = intent_matcher().parse(text)
+    intent = "alerts" if "alerts" in (req.intent, p.intent) else (
+        "directions" if "directions" in (req.intent, p.intent) else p.intent)
+    yield _sse("intent", {"intent": intent, "origin": p.origin, "destination": p.dest, "route": p.route,
+                          "entities": [asdict(e) for e in p.entities]})
+
+    def reply(content: str, timings: Optional[Dict] = None) -> str:
+        history.append(ChatMessage(role="assistant", content=content))
+        return _sse("done", {"messages": [m.model_dump() for m in history],
+                             "timings": {**(timings or {}), "stream_ms": _ms_since(t0)}})
+
+    if usr is None:
+        yield reply("Say something to begin."); return
+    try:
+        if intent == "alerts":
+            out = await ask_alerts(p.route)
+            yield _sse("alerts", {"routes": p.route.split(",") if p.route else [], "count": out.get("count"),
+                                  "text": out.get("text") or "No alerts."})
+            yield reply(out.get("text") or "No alerts."); return
+
+        if intent == "directions":
+            if p.origin is None:
+                yield reply("Please ask like: ‘directions from X to Y’."); return
+            q: asyncio.Queue = asyncio.Queue()
+            task = asyncio.create_task(plan_directions(p.origin, p.dest, req.alternatives, q))
+            try:
+                while not task.done():
+                    getter = asyncio.ensure_future(q.get())
+                    await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                    if getter.done(): yield _sse(*getter.result())
+                    else: getter.cancel()
+                while not q.empty(): yield _sse(*q.get_nowait())
+                plan, timings = task.result()
+            finally:
+                task.cancel()   # the client went away mid-plan
+            log.info("directions %r -> %r: %s", p.origin, p.dest, timings)
+            yield _sse("plan", {k: plan.get(k) for k in ("ok", "origin", "destination", "legs", "minutes",
+                                                         "text", "alternatives") if k in plan})
+            content = _plan_text(plan); routes = _alert_routes(plan.get("legs") or [])
+            if routes:
+                t = time.perf_counter()
+                try:
+                    out = await ask_alerts(",".join(routes))
+                    yield _sse("alerts", {"routes": routes, "count": out.get("count"), "text": out.get("text") or "No alerts."})
+                except HTTPException as e:   # the plan stands without them
+                    yield _sse("alerts", {"routes": routes, "error": e.detail})
+                timings["alerts_ms"] = _ms_since(t)
+            yield reply(content, timings); return
+
+        if intent == "predictions":
+            yield reply("Give me a stop id like place-kencl and I’ll fetch predictions."); return
+        yield reply("Try: ‘alerts for Green-D’, ‘routes’, ‘predictions for Kendall’, or ‘directions from Northeastern University to Government Center’.")
+    except HTTPException as e:
+        yield _sse("error", {"status": e.status_code, "detail": e.detail})
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """Server-sent events variant of /chat (see _chat_events); POST, so read it with fetch."""
+    return StreamingResponse(_chat_events(req), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
+async def chat(req: ChatRequest):
     usr = next((m for m in reversed(req.messages) if m.role == "user"), None)
     if not usr:
         return ChatResponse(messages=[ChatMessage(role="assistant", content="Say something to begin.")])
-    text = (usr.content or "").strip(); low = text.lower(); history = list(req.messages)
+    text = (usr.content or "").strip(); history = list(req.messages)
+    p = intent_matcher().parse(text)
 
-    if req.intent == "alerts" or "alert" in low:
-        route = None
-        for t in ["green-b","green-c","green-d","green-e","red","orange","blue"]:
-            if t in low: route = t.title() if "-" in t else t.capitalize(); break
-        out = ask_alerts(route)
+    if req.intent == "alerts" or p.intent == "alerts":
+        out = await ask_alerts(p.route)
         history.append(ChatMessage(role="assistant", content=out.get("text") or "No alerts."))
         return ChatResponse(messages=history)
 
-    if req.intent == "directions" or _FROM_TO_RE.search(text):
-        m = _FROM_TO_RE.search(text)
-        if not m:
+    if req.intent == "directions" or p.intent == "directions":
+        if p.origin is None:
             history.append(ChatMessage(role="assistant", content="Please ask like: ‘directions from X to Y’."))
             return ChatResponse(messages=history)
-        origin, dest = m.group("orig").strip(), m.group("dest").strip()
-        try:
-            norm_o = ask_normalize(origin).get("normalized", origin)
-            norm_d = ask_normalize(dest).get("normalized", dest)
-        except Exception:
-            norm_o, norm_d = origin, dest
-        plan = ask_plan(norm_o, norm_d)
-        history.append(ChatMessage(role="assistant", content=plan.get("text") or "No route."))
-        return ChatResponse(messages=history)
+        origin, dest = p.origin, p.dest
+        plan, timings = await plan_directions(origin, dest, req.alternatives)
+        log.info("directions %r -> %r: %s", origin, dest, timings)
+        history.append(ChatMessage(role="assistant", content=_plan_text(plan)))
+        return ChatResponse(messages=history, timings=timings)
 
-    if "prediction" in low or "arrival" in low or "when is the next" in low:
+    if p.intent == "predictions":
         history.append(ChatMessage(role="assistant", content="Give me a stop id like place-kencl and I’ll fetch predictions."))
         return ChatResponse(messages=history)
 
@@ -249,6 +653,10 @@ def get_agentfacts():
 
 
 
+@app.post("/admin/reload")
+def reload(force: bool = False, x_admin_token: Optional[str] = Header(default=None)):
+    return admin_reload(force, x_admin_token)
+
 @app.get("/healthz")
 def healthz():
-    return {"ok": True, "frontend": INDEX_FILE.exists()}
+    return {"ok": True, "frontend": INDEX_FILE.exists(), "agents": AGENTS.modes}
@@ -0,0 +1,82 @@
+# Capstone/server/batch.py
+"""
+Batch planning for many origin/destination pairs.
+
+Pairs are grouped by origin so each unique origin costs one search: a lookup
+per pair in the precomputed tables when they apply, otherwise a single
+one-to-all Dijkstra tree that every destination of the group reads its path
+from. Tree searches for large batches are spread over a process pool whose
+workers receive the (overlay) graph once at start-up. Results are yielded
+group by group with a bounded number of groups in flight, so callers can
+stream them without holding the whole batch.
+"""
+from __future__ import annotations
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .routing import Graph, Weights, shortest_tree, tree_path, path_to_stops, display
+from .tables import RoutingTables
+
+BATCH_WORKERS = int(os.getenv("PLANNER_BATCH_WORKERS", str(min(4, os.cpu_count() or 1))))
+POOL_MIN_ORIGINS = int(os.getenv("PLANNER_BATCH_POOL_MIN_ORIGINS", "16"))
+
+# (origin stop, [(input index, destination stop)])
+Group = Tuple[int, List[Tuple[int, int]]]
+
+
+def group_by_origin(pairs: Iterable[Tuple[int, int, int]]) -> List[Group]:
+    """[(index, origin, dest)] -> [(origin, [(index, dest)])] in first-seen order."""
+    groups: Dict[int, List[Tuple[int, int]]] = {}
+    for i, o, d in pairs: groups.setdefault(o, []).append((i, d))
+    return list(groups.items())
+
+
+def _row(g: Graph, i: int, path: Optional[List[int]], minutes: float) -> Dict:
+    from .app import _compress_into_legs
+    if path is None: return {"i": i, "ok": False, "legs": []}
+    legs = _compress_into_legs(*display(g, *path_to_stops(g, path)))
+    return {"i": i, "ok": True, "minutes": round(minutes, 1), "legs": legs}
+
+
+def plan_group(g: Graph, group: Group, weights: Weights,
+               tables: Optional[RoutingTables] = None) -> List[Dict]:
+    origin, dests = group
+    if tables is not None:
+        out = []
+        for i, d in dests:
+            res = tables.route(g, origin, d)
+            out.append(_row(g, i, *(res or (None, 0.0))))
+        return out
+    dist, parent = shortest_tree(g, origin, weights)
+    return [_row(g, i, tree_path(parent, d), dist[d]) if d in dist else _row(g, i, None, 0.0)
+            for i, d in dests]
+
+
+_worker: Dict = {}
+
+def _init_worker(g: Graph, weights: Weights) -> None:
+    _worker["g"], _worker["w"] = g, weights
+
+def _plan_group_worker(group: Group) -> List[Dict]:
+    return plan_group(_worker["g"], group, _worker["w"])
+
+
+def plan_batch(g: Graph, groups: List[Group], weights: Weights = Weights(),
+               tables: Optional[RoutingTables] = None, workers: int = BATCH_WORKERS) -> Iterator[Dict]:
+    """Yield one result row per pair, group by group."""
+    if tables is not None or workers <= 1 or len(groups) < POOL_MIN_ORIGINS:
+        for group in groups: yield from plan_group(g, group, weights, tables)
+        return
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(g, weights)) as pool:
+        pending: deque = deque()
+        try:
+            for group in groups:
+                pending.append(pool.submit(_plan_group_worker, group))
+                if len(pending) >= 2 * workers: yield from pending.popleft().result()
+            while pending: yield from pending.popleft().result()
+        finally:
+            # the client went away mid-stream: drop what has not started yet
+            for f in pending: f.cancel()
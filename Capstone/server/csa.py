@@ -0,0 +1,115 @@
+# Capstone/server/csa.py
+"""
+Connection Scan Algorithm (earliest arrival) over a gtfs.Timetable.
+
+Connections are scanned in departure order, as in classic CSA, but a block
+of CHUNK connections at a time is evaluated with NumPy instead of one
+connection per Python iteration. Within a block the two CSA invariants --
+earliest arrival per stop and earliest boarding position per trip -- are
+iterated to a fixpoint:
+
+    boardable  = earliest[dep_stop] <= dep_time
+    board[t]   = min seq of a boardable connection of trip t
+    usable     = seq >= board[trip]
+    earliest   = min(earliest, arr_time of usable connections), then footpaths
+
+A block needs another pass only when it produced an arrival early enough to
+board something later in the same block, so most blocks take a single pass.
+The scan stops at the first block departing after the best target arrival.
+"""
+from __future__ import annotations
+
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .gtfs import Timetable
+
+HORIZON_SECS = int(os.getenv("CSA_HORIZON_MINUTES", "240")) * 60
+CHUNK = 16384
+MAX_PASSES = 32
+UNREACHED = np.iinfo(np.int32).max
+
+
+def _relax(earliest: np.ndarray, stops: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """Lower earliest[stops] to times in place; returns positions that set a new minimum."""
+    new = earliest.copy()
+    np.minimum.at(new, stops, times)
+    hit = np.nonzero((times == new[stops]) & (new[stops] < earliest[stops]))[0]
+    earliest[stops[hit]] = times[hit]
+    return hit
+
+
+def _hhmm(secs: int) -> str:
+    return f"{secs // 3600:02d}:{secs % 3600 // 60:02d}"
+
+
+def earliest_arrival(tt: Timetable, origins: np.ndarray, targets: np.ndarray,
+                     depart: int, date: Optional[int] = None,
+                     horizon: int = HORIZON_SECS) -> Optional[Dict]:
+    """Earliest-arrival journey from any of `origins` to any of `targets`, leaving at `depart`."""
+    if len(origins) == 0 or len(targets) == 0: return None
+    lo, hi = np.searchsorted(tt.conn_dep, np.array([depart, depart + horizon], dtype=tt.conn_dep.dtype))
+    active = tt.active_trips(date) if date is not None else None
+
+    earliest = np.full(tt.n_stops, UNREACHED, dtype=np.int32)
+    earliest[origins] = depart
+    board = np.full(len(tt.trip_ids), np.iinfo(np.int32).max, dtype=np.int32)
+    via_conn = np.full(tt.n_stops, -1, dtype=np.int64)   # global connection index
+    via_fp = np.full(tt.n_stops, -1, dtype=np.int64)     # index into fp_* arrays
+
+    def walk() -> np.ndarray:
+        if len(tt.fp_from) == 0: return np.empty(0, dtype=np.int32)
+        fp_idx = np.nonzero(earliest[tt.fp_from] < UNREACHED)[0]
+        hit = fp_idx[_relax(earliest, tt.fp_to[fp_idx], earliest[tt.fp_from[fp_idx]] + tt.fp_secs[fp_idx])]
+        via_fp[tt.fp_to[hit]] = hit; via_conn[tt.fp_to[hit]] = -1
+        return earliest[tt.fp_to[hit]]
+
+    walk()
+    start = int(lo)
+    while start < hi and tt.conn_dep[start] <= earliest[targets].min():
+        end = min(int(hi), start + CHUNK)
+        idx = np.arange(start, end)
+        if active is not None: idx = idx[active[tt.conn_trip[start:end]]]
+        cd, ca, tdep, tarr = tt.conn_dep_stop[idx], tt.conn_arr_stop[idx], tt.conn_dep[idx], tt.conn_arr[idx]
+        trip, seq = tt.conn_trip[idx], tt.conn_seq[idx]
+        last_dep = tt.conn_dep[end - 1]
+        for _ in range(MAX_PASSES):
+            boardable = earliest[cd] <= tdep
+            np.minimum.at(board, trip[boardable], seq[boardable])
+            usable = np.nonzero(seq >= board[trip])[0]
+            hit = usable[_relax(earliest, ca[usable], tarr[usable])]
+            via_conn[ca[hit]] = idx[hit]; via_fp[ca[hit]] = -1
+            walked = walk()
+            # another pass only helps if something new can still be boarded in this block
+            if not ((tarr[hit] <= last_dep).any() or (walked <= last_dep).any()): break
+        start = end
+
+    reached = targets[earliest[targets] < UNREACHED]
+    if len(reached) == 0: return None
+    dest = int(reached[np.argmin(earliest[reached])])
+
+    legs: List[Dict] = []; stop = dest
+    while len(legs) <= 2 * MAX_PASSES:
+        if via_conn[stop] >= 0:
+            c = int(via_conn[stop]); t = int(tt.conn_trip[c])
+            span = slice(int(lo), c + 1)
+            b = int(lo) + int(np.nonzero((tt.conn_trip[span] == t) & (tt.conn_seq[span] == board[t]))[0][0])
+            legs.append({"mode": "transit", "route_id": str(tt.route_ids[tt.trip_route[t]]),
+                         "trip_id": str(tt.trip_ids[t]),
+                         "from": str(tt.stop_names[tt.conn_dep_stop[b]]), "to": str(tt.stop_names[tt.conn_arr_stop[c]]),
+                         "depart": _hhmm(int(tt.conn_dep[b])), "arrive": _hhmm(int(tt.conn_arr[c])),
+                         "stops_count": int(tt.conn_seq[c] - tt.conn_seq[b] + 1)})
+            stop = int(tt.conn_dep_stop[b])
+        elif via_fp[stop] >= 0:
+            f = int(via_fp[stop])
+            legs.append({"mode": "walk", "route_id": "walk",
+                         "from": str(tt.stop_names[tt.fp_from[f]]), "to": str(tt.stop_names[stop]),
+                         "minutes": int(tt.fp_secs[f]) // 60})
+            stop = int(tt.fp_from[f])
+        else:
+            break
+    legs.reverse()
+    return {"depart": _hhmm(depart), "arrive": _hhmm(int(earliest[dest])),
+            "duration_minutes": (int(earliest[dest]) - depart) // 60, "legs": legs}
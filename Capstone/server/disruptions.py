@@ -0,0 +1,163 @@
+# Capstone/server/disruptions.py
+"""
+Disruption overlay on top of the immutable network graph.
+
+Active service alerts (MBTA v3 /alerts items, or the flat form accepted by
+the planner's POST /disruptions) are mapped onto CSR edges:
+
+  - SUSPENSION                      ride edges of the segment are removed
+  - SHUTTLE                         ride edges of the segment are slowed down
+  - STATION_CLOSURE / STOP_CLOSURE  boarding and alighting at the stop are removed
+
+Removing an edge is just setting its minutes to inf, so the overlaid graph
+shares the topology arrays with the base graph. When the alert set changes,
+only the precomputed table columns whose answer can change are recomputed:
+a slower edge matters to target t only if it lies on t's next-hop tree, and a
+faster one only if it undercuts the stored distance. Those columns are kept
+as a patch over the memory-mapped tables; every other target keeps reading
+the shared base matrices.
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .routing import Graph, Weights
+from .tables import RoutingTables
+from .network import NetworkSnapshot
+
+INF = float("inf")
+SHUTTLE_FACTOR = float(os.getenv("PLANNER_SHUTTLE_FACTOR", "2.5"))
+SEGMENT_EFFECTS = ("SUSPENSION", "SHUTTLE")
+CLOSURE_EFFECTS = ("STATION_CLOSURE", "STOP_CLOSURE")
+# MBTA API route ids for the Silver Line branches in data/lines
+SILVER_ROUTES = {"741": "SL1", "742": "SL2", "743": "SL3", "751": "SL4", "749": "SL5"}
+
+
+@dataclass(frozen=True)
+class Disruption:
+    alert_id: str
+    effect: str
+    route_id: str
+    stops: Tuple[int, ...]   # graph stop ids on route_id; empty = whole line
+
+    def to_json(self, g: Graph) -> Dict:
+        return {"id": self.alert_id, "effect": self.effect, "route_id": self.route_id,
+                "stops": [g.stop_names[s] for s in self.stops]}
+
+
+def _line_routes(route: str, lines: Dict[str, Dict]) -> List[str]:
+    """Our route ids for an MBTA route id ("Red" -> Red-Line-Main, Red-Line-Ashmont, ...)."""
+    if route in SILVER_ROUTES: return [SILVER_ROUTES[route]]
+    return [r for r in lines if r == route or r.startswith(route + "-")]
+
+
+def parse_alerts(items: Iterable[Dict], g: Graph, lines: Dict[str, Dict],
+                 resolve_stop: Callable[[str], Optional[int]]) -> List[Disruption]:
+    """Disruptions for every alert with a routing effect; unknown routes and stops are skipped."""
+    out: Dict[Tuple, Disruption] = {}
+    for item in items:
+        if "attributes" in item:    # MBTA v3 alert resource
+            attrs = item["attributes"]; effect = attrs.get("effect", "")
+            entities = [(e.get("route"), e.get("stop")) for e in attrs.get("informed_entity") or []]
+        else:                       # {"id", "effect", "route", "stops": [...]}
+            effect = item.get("effect", "")
+            entities = [(item.get("route"), s) for s in item.get("stops") or [None]]
+        if effect not in SEGMENT_EFFECTS + CLOSURE_EFFECTS: continue
+        by_route: Dict[str, set] = {}
+        for route, stop in entities:
+            if not route: continue
+            s = resolve_stop(stop) if stop else None
+            for r in _line_routes(route, lines):
+                stops = by_route.setdefault(r, set())
+                if s is not None and s in {g.lookup(n) for n in lines[r]["stops"]}: stops.add(s)
+        # an alert that names stops never takes down a branch none of them are on
+        named = any(stop for _, stop in entities)
+        for r, stops in by_route.items():
+            if not stops and (named or effect in CLOSURE_EFFECTS): continue
+            d = Disruption(str(item.get("id", "")), effect, r, tuple(sorted(stops)))
+            out[(d.effect, d.route_id, d.stops)] = d
+    return sorted(out.values(), key=lambda d: (d.route_id, d.effect, d.stops))
+
+
+def edge_minutes(g: Graph, lines: Dict[str, Dict], disruptions: Iterable[Disruption]) -> Dict[int, float]:
+    """Edge index -> overlaid minutes for the given disruptions (inf = removed)."""
+    out: Dict[int, float] = {}
+
+    def put(e: Optional[int], mins: float):
+        if e is not None: out[e] = max(out.get(e, mins), mins)
+
+    for d in disruptions:
+        line = [g.lookup(n) for n in lines[d.route_id]["stops"]]
+        plats = [g.platform(s, d.route_id) for s in line]
+        if d.effect in CLOSURE_EFFECTS or len(d.stops) == 1:
+            for s in d.stops:
+                p = g.platform(s, d.route_id)
+                put(g.edge(s, p), INF); put(g.edge(p, s), INF)
+            continue
+        # the listed stops span the segment; no stops means the whole line
+        pos = [i for i, s in enumerate(line) if s in d.stops]
+        lo, hi = (min(pos), max(pos)) if pos else (0, len(line) - 1)
+        for i in range(lo, hi):
+            for u, v in ((plats[i], plats[i + 1]), (plats[i + 1], plats[i])):
+                e = g.edge(u, v)
+                if e is None: continue
+                put(e, INF if d.effect == "SUSPENSION" else g.minutes[e] * SHUTTLE_FACTOR)
+    return out
+
+
+class Overlay:
+    """One immutable view of the network with a set of disruptions applied."""
+
+    def __init__(self, snapshot: NetworkSnapshot, version: int = 0, disruptions: Tuple[Disruption, ...] = (),
+                 changes: Optional[Dict[int, float]] = None, graph: Optional[Graph] = None,
+                 tables: Optional[RoutingTables] = None):
+        self.snapshot, self.base, self.lines = snapshot, snapshot.graph, snapshot.lines
+        self.version, self.disruptions = version, disruptions
+        self.changes = changes or {}
+        self.graph = graph or self.base
+        self.tables = tables if graph is not None else snapshot.tables
+        self.cache: Dict[str, object] = {}   # structures derived from this view (e.g. RAPTOR)
+
+    def apply(self, disruptions: Iterable[Disruption]) -> "Overlay":
+        """Next overlay for a new active set; returns self when nothing changed."""
+        disruptions = tuple(disruptions)
+        if disruptions == self.disruptions: return self
+        changes = edge_minutes(self.base, self.lines, disruptions)
+        touched = set(changes) | set(self.changes)
+        graph = self.base.with_minutes(changes) if changes else self.base
+        diff = {e: (self.graph.minutes[e], graph.minutes[e]) for e in touched
+                if self.graph.minutes[e] != graph.minutes[e]}
+        tables = self._update_tables(graph, diff) if self.tables is not None else None
+        return Overlay(self.snapshot, self.version + 1, disruptions, changes, graph, tables)
+
+    def _update_tables(self, graph: Graph, diff: Dict[int, Tuple[float, float]]) -> RoutingTables:
+        """Recompute just the target columns whose shortest paths `diff` can change."""
+        tables = self.tables
+        # with no disruption left the base matrices are exact again
+        if graph is self.base: return RoutingTables(tables.dist, tables.next_hop, tables.fingerprint)
+        extra = Weights().extra(); patch = tables.patch
+        affected = set()
+        for e, (old, new) in diff.items():
+            u = int(np.searchsorted(self.base.indptr, e, side="right")) - 1
+            v = self.base.indices[e]
+            w_old, w_new = old + extra[self.base.kinds[e]], new + extra[self.base.kinds[e]]
+            dist_u, dist_v, nxt_u = (np.array(tables.dist[u]), np.array(tables.dist[v]),
+                                     np.array(tables.next_hop[u]))
+            for t, (dc, nc) in patch.items():
+                dist_u[t], dist_v[t], nxt_u[t] = dc[u], dc[v], nc[u]
+            if w_new > w_old:   # slower or removed: targets routing through u -> v
+                hit = np.nonzero(nxt_u == v)[0]
+            else:               # faster or restored: targets the edge now undercuts
+                hit = np.nonzero(dist_u > w_new + dist_v + 1e-4)[0]
+            affected.update(hit.tolist())
+        columns = dict(patch)
+        for t in affected:
+            columns[t] = RoutingTables.solve_column(graph, t, hop_dtype=tables.next_hop.dtype)
+        return tables.patched(columns)
+
+    def to_json(self) -> List[Dict]:
+        return [d.to_json(self.base) for d in self.disruptions]
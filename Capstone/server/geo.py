@@ -0,0 +1,85 @@
+# Capstone/server/geo.py
+"""
+Nearest-stop lookups over stop coordinates.
+
+Stops are bucketed into a uniform grid of GRID_CELL_M-metre cells on a local
+equirectangular projection and stored sorted by cell, row after row, so the
+cells of one grid row are a contiguous slice. A radius query finds the slice
+of each row its bounding square crosses by bisection, and measures
+every stop in them with a single call to the one-to-many haversine kernel of
+packages/mbta/geodist. Its cost depends on how many stops are near the point,
+not on the size of the network.
+"""
+from __future__ import annotations
+
+import math
+import os
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+try:
+    from ..packages.mbta.geodist import Points, one_to_many
+except ImportError:   # deployed flat, server/ and packages/ side by side (linode_deploy_mbta_only.sh)
+    from packages.mbta.geodist import Points, one_to_many
+
+EARTH_RADIUS_M = 6371000.0
+GRID_CELL_M = float(os.getenv("PLANNER_GRID_CELL_M", "250"))
+MAX_RADIUS_M = 5000
+
+
+class StopGrid:
+    """Grid index over (name, lat, lng); built once per network snapshot."""
+
+    def __init__(self, coords: Dict[str, Tuple[float, float]], cell_m: float = GRID_CELL_M):
+        self.names: List[str] = list(coords)
+        self.pos: Dict[str, int] = {n: i for i, n in enumerate(self.names)}
+        self.lat: List[float] = [coords[n][0] for n in self.names]
+        self.lng: List[float] = [coords[n][1] for n in self.names]
+        self.cell = cell_m
+        lat0 = sum(self.lat) / len(self.lat) if self.lat else 0.0
+        self.my = math.pi * EARTH_RADIUS_M / 180                  # metres per degree of latitude
+        self.mx = self.my * math.cos(math.radians(lat0))          # ... and of longitude
+        cx = np.floor(np.array(self.lng) * self.mx / cell_m).astype(np.int64)
+        cy = np.floor(np.array(self.lat) * self.my / cell_m).astype(np.int64)
+        self.x0, self.y0 = (int(cx.min()), int(cy.min())) if self.names else (0, 0)
+        self.width = int(cx.max()) - self.x0 + 1 if self.names else 1
+        self.height = int(cy.max()) - self.y0 + 1 if self.names else 0
+        key = (cy - self.y0) * self.width + (cx - self.x0)
+        self.order = np.argsort(key, kind="stable").astype(np.int32)   # sorted position -> stop
+        self.key_list: List[int] = key[self.order].tolist()
+        self.pts = Points(np.array(self.lat)[self.order], np.array(self.lng)[self.order])
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _key(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(math.floor(lng * self.mx / self.cell)), int(math.floor(lat * self.my / self.cell))
+
+    def coords(self, name: str) -> Tuple[float, float]:
+        i = self.pos[name]
+        return self.lat[i], self.lng[i]
+
+    def _candidates(self, lat: float, lng: float, radius_m: float) -> np.ndarray:
+        """Sorted positions of every stop in the cells the radius' bounding square touches."""
+        cx, cy = self._key(lat, lng); r = int(math.ceil(radius_m / self.cell))
+        x_lo, x_hi = max(cx - r - self.x0, 0), min(cx + r - self.x0, self.width - 1)
+        rows = np.arange(max(cy - r - self.y0, 0), min(cy + r - self.y0, self.height - 1) + 1)
+        if x_lo > x_hi or not len(rows): return np.empty(0, dtype=np.intp)
+        keys, pos = self.key_list, []
+        for row0 in (rows * self.width).tolist():
+            pos.extend(range(bisect_left(keys, row0 + x_lo), bisect_right(keys, row0 + x_hi)))
+        return np.array(pos, dtype=np.intp)
+
+    def nearest(self, lat: float, lng: float, radius_m: float = 600, k: int = 5) -> List[Tuple[str, float]]:
+        """Up to k (stop name, metres) within radius_m of the point, closest first."""
+        radius_m = min(radius_m, MAX_RADIUS_M)
+        pos = self._candidates(lat, lng, radius_m)
+        if not len(pos): return []
+        m = one_to_many(lat, lng, self.pts.take(pos)) * 1000
+        near = np.flatnonzero(m <= radius_m)
+        if len(near) > k: near = near[np.argpartition(m[near], k - 1)[:k]]
+        stops = self.order[pos[near]]; m = m[near]
+        by = np.lexsort((stops, m))   # ties go to the earlier stop, as they always have
+        return [(self.names[i], round(x, 1)) for i, x in zip(stops[by].tolist(), m[by].tolist())]
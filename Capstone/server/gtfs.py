@@ -0,0 +1,217 @@
+# Capstone/server/gtfs.py
+"""
+GTFS static feed loader.
+
+Turns a GTFS zip (stops, trips, stop_times, transfers, and calendar files
+when present) into columnar NumPy arrays. Elementary connections (one vehicle
+hop between two consecutive stop_times of a trip) are sorted by departure
+time, which is the layout the connection-scan engine in csa.py expects.
+
+Parsing the full MBTA feed (~2M stop_times) takes several seconds, so the
+arrays are cached next to the other compiled data as an uncompressed .npz
+keyed by the feed's SHA-256; restarts load that cache instead.
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import os
+import uuid
+import zipfile
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+GTFS_CACHE_FORMAT = 1
+
+
+def _seconds(t: str) -> int:
+    """'HH:MM:SS' (hours may exceed 24) -> seconds after service-day midnight; -1 if empty."""
+    t = t.strip()
+    if not t: return -1
+    h, m, s = t.split(":")
+    return int(h) * 3600 + int(m) * 60 + int(s)
+
+
+def _rows(zf: zipfile.ZipFile, name: str) -> Iterator[Dict[str, str]]:
+    if name not in zf.namelist(): return iter(())
+    return csv.DictReader(io.TextIOWrapper(zf.open(name), encoding="utf-8-sig", newline=""))
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""): h.update(chunk)
+    return h.hexdigest()
+
+
+class Timetable:
+    """Columnar view of one GTFS feed; every *_id column holds interned ints."""
+
+    ARRAYS = ("stop_ids", "stop_names", "stop_parent", "stop_lat", "stop_lon",
+              "trip_ids", "trip_route", "trip_service", "route_ids", "service_ids",
+              "conn_dep_stop", "conn_arr_stop", "conn_dep", "conn_arr", "conn_trip", "conn_seq",
+              "fp_from", "fp_to", "fp_secs",
+              "cal_service", "cal_days", "cal_start", "cal_end",
+              "ex_service", "ex_date", "ex_type")
+
+    def __init__(self, source_sha: str = "", **arrays: np.ndarray):
+        self.source_sha = source_sha
+        for k in self.ARRAYS: setattr(self, k, arrays[k])
+        self._by_name: Optional[Dict[str, np.ndarray]] = None
+        self._active: Tuple[int, Optional[np.ndarray]] = (0, None)
+
+    @property
+    def n_stops(self) -> int:
+        return len(self.stop_ids)
+
+    @property
+    def n_connections(self) -> int:
+        return len(self.conn_dep)
+
+    # -- loading -----------------------------------------------------------
+
+    @classmethod
+    def from_zip(cls, path: Path) -> "Timetable":
+        with zipfile.ZipFile(path) as zf:
+            stop_ids: List[str] = []; stop_names: List[str] = []; parents: List[str] = []
+            lat, lon = array("f"), array("f")
+            for r in _rows(zf, "stops.txt"):
+                stop_ids.append(r["stop_id"]); stop_names.append(r.get("stop_name", "").strip())
+                parents.append(r.get("parent_station", "") or "")
+                lat.append(float(r.get("stop_lat") or "nan")); lon.append(float(r.get("stop_lon") or "nan"))
+            stop_idx = {s: i for i, s in enumerate(stop_ids)}
+            stop_parent = np.array([stop_idx.get(p, i) for i, p in enumerate(parents)], dtype=np.int32)
+
+            route_idx: Dict[str, int] = {}; service_idx: Dict[str, int] = {}
+            trip_ids: List[str] = []; trip_route, trip_service = array("i"), array("i")
+            for r in _rows(zf, "trips.txt"):
+                trip_ids.append(r["trip_id"])
+                trip_route.append(route_idx.setdefault(r["route_id"], len(route_idx)))
+                trip_service.append(service_idx.setdefault(r["service_id"], len(service_idx)))
+            trip_idx = {t: i for i, t in enumerate(trip_ids)}
+
+            st_trip, st_seq, st_stop, st_arr, st_dep = (array("i") for _ in range(5))
+            for r in _rows(zf, "stop_times.txt"):
+                t = trip_idx.get(r["trip_id"]); s = stop_idx.get(r["stop_id"])
+                if t is None or s is None: continue
+                st_trip.append(t); st_seq.append(int(r["stop_sequence"])); st_stop.append(s)
+                st_arr.append(_seconds(r["arrival_time"])); st_dep.append(_seconds(r["departure_time"]))
+
+            fp_from, fp_to, fp_secs = array("i"), array("i"), array("i")
+            for r in _rows(zf, "transfers.txt"):
+                a, b = stop_idx.get(r.get("from_stop_id", "")), stop_idx.get(r.get("to_stop_id", ""))
+                if a is None or b is None or a == b or r.get("transfer_type", "0") == "3": continue
+                fp_from.append(a); fp_to.append(b); fp_secs.append(int(r.get("min_transfer_time") or 0))
+
+            cal_service, cal_days, cal_start, cal_end = (array("i") for _ in range(4))
+            days = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+            for r in _rows(zf, "calendar.txt"):
+                cal_service.append(service_idx.setdefault(r["service_id"], len(service_idx)))
+                cal_days.append(sum(1 << i for i, d in enumerate(days) if r.get(d) == "1"))
+                cal_start.append(int(r["start_date"])); cal_end.append(int(r["end_date"]))
+            ex_service, ex_date, ex_type = (array("i") for _ in range(3))
+            for r in _rows(zf, "calendar_dates.txt"):
+                ex_service.append(service_idx.setdefault(r["service_id"], len(service_idx)))
+                ex_date.append(int(r["date"])); ex_type.append(int(r["exception_type"]))
+
+        conns = cls._connections(*(np.frombuffer(a, dtype=np.int32) for a in (st_trip, st_seq, st_stop, st_arr, st_dep)))
+        return cls(
+            source_sha=file_sha256(path),
+            stop_ids=np.array(stop_ids), stop_names=np.array(stop_names), stop_parent=stop_parent,
+            stop_lat=np.frombuffer(lat, dtype=np.float32), stop_lon=np.frombuffer(lon, dtype=np.float32),
+            trip_ids=np.array(trip_ids), trip_route=np.frombuffer(trip_route, dtype=np.int32),
+            trip_service=np.frombuffer(trip_service, dtype=np.int32),
+            route_ids=np.array(list(route_idx)), service_ids=np.array(list(service_idx)),
+            fp_from=np.frombuffer(fp_from, dtype=np.int32), fp_to=np.frombuffer(fp_to, dtype=np.int32),
+            fp_secs=np.frombuffer(fp_secs, dtype=np.int32),
+            cal_service=np.frombuffer(cal_service, dtype=np.int32), cal_days=np.frombuffer(cal_days, dtype=np.int32),
+            cal_start=np.frombuffer(cal_start, dtype=np.int32), cal_end=np.frombuffer(cal_end, dtype=np.int32),
+            ex_service=np.frombuffer(ex_service, dtype=np.int32), ex_date=np.frombuffer(ex_date, dtype=np.int32),
+            ex_type=np.frombuffer(ex_type, dtype=np.int32),
+            **conns)
+
+    @staticmethod
+    def _connections(trip, seq, stop, arr, dep) -> Dict[str, np.ndarray]:
+        """Pair consecutive stop_times of each trip into connections sorted by departure."""
+        order = np.lexsort((seq, trip))
+        trip, stop, arr, dep = trip[order], stop[order], arr[order], dep[order]
+        same = trip[1:] == trip[:-1]
+        a = np.nonzero(same)[0]; b = a + 1
+        # position of the hop within its trip; boarding later on a trip means a larger seq
+        first = np.r_[True, ~same]
+        run_start = np.maximum.accumulate(np.where(first, np.arange(len(trip)), 0))
+        keep = (dep[a] >= 0) & (arr[b] >= 0)
+        a, b = a[keep], b[keep]
+        by_dep = np.lexsort((arr[b], dep[a]))
+        a, b = a[by_dep], b[by_dep]
+        return {"conn_dep_stop": stop[a], "conn_arr_stop": stop[b], "conn_dep": dep[a],
+                "conn_arr": arr[b], "conn_trip": trip[a],
+                "conn_seq": (a - run_start[a]).astype(np.int32)}
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # unique per writer, then one rename: readers never see a partial file, and agents
+        # starting together don't trip over each other's temp file
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                np.savez(f, _format=np.array(GTFS_CACHE_FORMAT), _source_sha=np.array(self.source_sha),
+                         **{k: getattr(self, k) for k in self.ARRAYS})
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    @classmethod
+    def load_cached(cls, path: Path, source_sha: str) -> Optional["Timetable"]:
+        try:
+            with np.load(path) as z:
+                if int(z["_format"]) != GTFS_CACHE_FORMAT or str(z["_source_sha"]) != source_sha:
+                    return None
+                return cls(source_sha, **{k: z[k] for k in cls.ARRAYS})
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):   # missing, stale or truncated
+            return None
+
+    @classmethod
+    def load(cls, feed: Path, cache: Path) -> "Timetable":
+        """Cached arrays when they match the feed, otherwise parse the zip and refresh the cache."""
+        tt = cls.load_cached(cache, file_sha256(feed))
+        if tt is None:
+            tt = cls.from_zip(feed); tt.save(cache)
+        return tt
+
+    # -- lookups -----------------------------------------------------------
+
+    def stops_named(self, name: str) -> np.ndarray:
+        """Every stop (station and child platforms) whose station carries `name`."""
+        if self._by_name is None:
+            station_names = np.char.lower(self.stop_names[self.stop_parent].astype(str))
+            order = np.argsort(station_names, kind="stable")
+            keys, starts = np.unique(station_names[order], return_index=True)
+            groups = np.split(order.astype(np.int32), starts[1:])
+            self._by_name = dict(zip(keys.tolist(), groups))
+        return self._by_name.get(name.strip().lower(), np.empty(0, dtype=np.int32))
+
+    def active_trips(self, date: int) -> np.ndarray:
+        """Boolean mask over trips running on `date` (YYYYMMDD); the last date is memoized."""
+        if self._active[0] == date: return self._active[1]
+        mask = self._service_mask(date)[self.trip_service]
+        self._active = (date, mask)
+        return mask
+
+    def _service_mask(self, date: int) -> np.ndarray:
+        n = len(self.service_ids)
+        if len(self.cal_service) == 0 and len(self.ex_service) == 0:
+            return np.ones(n, dtype=bool)
+        from datetime import date as _date
+        weekday = _date(date // 10000, date // 100 % 100, date % 100).weekday()
+        active = np.zeros(n, dtype=bool)
+        on = (self.cal_start <= date) & (self.cal_end >= date) & ((self.cal_days >> weekday) & 1).astype(bool)
+        active[self.cal_service[on]] = True
+        today = self.ex_date == date
+        active[self.ex_service[today & (self.ex_type == 1)]] = True
+        active[self.ex_service[today & (self.ex_type == 2)]] = False
+        return active
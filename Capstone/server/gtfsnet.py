@@ -0,0 +1,226 @@
+# Capstone/server/gtfsnet.py
+"""
+Planner network built from the GTFS feed instead of data/lines.
+
+Every route type in the feed (subway, bus, commuter rail, ferry) goes in.
+Stops are rolled up to their parent station; namesakes farther apart than
+MERGE_M keep their GTFS stop id in the name so the planner never teleports
+between two "Washington St @ Main St". The trips of a route are reduced to
+their distinct stop patterns; a pattern whose reverse also runs becomes one
+two-way line, the rest stay one-way ("directed": true), and short-turn
+patterns whose hops are already covered are dropped. Ride minutes are the
+mean over the pattern's trips. Walking transfers are the feed's
+transfers.txt plus every pair of stations within WALK_RADIUS_M, found with
+the grid join in packages/mbta/geodist.
+
+The output is the same (lines, transfers, coords) the JSON sources give, so
+the graph, tables, overlay and indexes downstream are unchanged. The work is
+array-based and keeps one entry per distinct pattern, so memory tracks the
+network rather than the number of trips.
+
+    python -m Capstone.server.gtfsnet bench [1000 10000 50000]
+"""
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .gtfs import Timetable
+try:
+    from ..packages.mbta.geodist import Points, haversine_km, pairs_near
+except ImportError:   # deployed flat, server/ and packages/ side by side (linode_deploy_mbta_only.sh)
+    from packages.mbta.geodist import Points, haversine_km, pairs_near
+
+MERGE_M = float(os.getenv("PLANNER_GTFS_MERGE_M", "300"))
+WALK_RADIUS_M = float(os.getenv("PLANNER_GTFS_WALK_M", "250"))
+WALK_MIN_PER_KM = 12.0
+
+
+def network_sha(tt: Timetable) -> str:
+    """The feed hash together with the knobs that shape the network built from it."""
+    return hashlib.sha256(f"{tt.source_sha}|{MERGE_M}|{WALK_RADIUS_M}|{WALK_MIN_PER_KM}".encode()).hexdigest()
+
+
+def _stations(tt: Timetable) -> Tuple[np.ndarray, List[str], List[Tuple[float, float]]]:
+    """Node id of every GTFS stop (-1 if never served), plus node names and coordinates."""
+    station = tt.stop_parent
+    served = np.unique(station[np.r_[tt.conn_dep_stop, tt.conn_arr_stop]])
+    node_of = np.full(tt.n_stops, -1, dtype=np.int32)
+    names: List[str] = []; coords: List[Tuple[float, float]] = []
+    anchors: Dict[str, List[int]] = {}   # lowercased name -> nodes carrying it
+    stop_names, stop_ids = tt.stop_names.tolist(), tt.stop_ids.tolist()
+    lat, lon = tt.stop_lat.tolist(), tt.stop_lon.tolist()
+    for s in served.tolist():
+        name = stop_names[s] or stop_ids[s]; here = (lat[s], lon[s])
+        node = next((k for k in anchors.get(name.lower(), ())
+                     if haversine_km(*coords[k], *here) * 1000 <= MERGE_M), None)
+        if node is None:
+            node = len(names)
+            names.append(name if name.lower() not in anchors else f"{name} ({stop_ids[s]})")
+            coords.append(here); anchors.setdefault(name.lower(), []).append(node)
+        node_of[s] = node
+    return node_of[station], names, coords
+
+
+def _patterns(tt: Timetable, node_of: np.ndarray) -> Dict[Tuple[int, bytes], List]:
+    """(route, node sequence bytes) -> [trips, summed hop minutes] over all trips."""
+    order = np.lexsort((tt.conn_seq, tt.conn_trip))
+    trip = tt.conn_trip[order]
+    dep_s, arr_s = node_of[tt.conn_dep_stop[order]], node_of[tt.conn_arr_stop[order]]
+    dep_t, arr_t = tt.conn_dep[order].astype(np.float64), tt.conn_arr[order].astype(np.float64)
+    bounds = np.flatnonzero(np.r_[True, trip[1:] != trip[:-1], True])
+    out: Dict[Tuple[int, bytes], List] = {}
+    for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        seq = np.r_[dep_s[lo], arr_s[lo:hi]]; t = np.r_[dep_t[lo], arr_t[lo:hi]]
+        keep = np.r_[True, seq[1:] != seq[:-1]]   # child platforms of one station in a row
+        seq, t = seq[keep], t[keep]
+        if len(seq) < 2: continue
+        key = (int(tt.trip_route[trip[lo]]), seq.astype(np.int32).tobytes())
+        acc = out.get(key)
+        if acc is None: out[key] = [1, np.diff(t) / 60.0]
+        else: acc[0] += 1; acc[1] += np.diff(t) / 60.0
+    return out
+
+
+def network_from_timetable(tt: Timetable) -> Tuple[Dict[str, Dict], Dict, Dict[str, List[float]]]:
+    """(lines, transfers, coords) in the data/lines JSON shapes, from every route in the feed."""
+    node_of, names, coords = _stations(tt)
+    by_route: Dict[int, List[Tuple[int, np.ndarray, np.ndarray]]] = {}
+    for (route, raw), (trips, minutes) in _patterns(tt, node_of).items():
+        by_route.setdefault(route, []).append((trips, np.frombuffer(raw, dtype=np.int32), minutes / trips))
+
+    lines: Dict[str, Dict] = {}
+    for route, pats in by_route.items():
+        pats.sort(key=lambda p: (-p[0], -len(p[1])))
+        rid = str(tt.route_ids[route]); hops: set = set(); k = 0
+        index = {p[1].tobytes(): p for p in pats}
+        for trips, seq, minutes in pats:
+            fwd = set(zip(seq[:-1].tolist(), seq[1:].tolist()))
+            if fwd <= hops: continue   # a short turn or the reverse of a line already added
+            back = index.get(seq[::-1].tobytes())
+            two_way = back is not None
+            mins = (minutes + back[2][::-1]) / 2 if two_way else minutes
+            hops |= fwd
+            if two_way: hops |= {(b, a) for a, b in fwd}
+            k += 1
+            lines[rid if k == 1 else f"{rid}-{k}"] = {
+                "route_id": rid if k == 1 else f"{rid}-{k}", "stops": [names[s] for s in seq.tolist()],
+                "minutes": [round(max(float(m), 0.0), 2) for m in mins], "directed": not two_way}
+
+    pairs: Dict[Tuple[int, int], float] = {}
+    fa, fb = node_of[tt.fp_from], node_of[tt.fp_to]
+    for a, b, secs in zip(fa.tolist(), fb.tolist(), tt.fp_secs.tolist()):
+        if a >= 0 and b >= 0 and a != b: pairs[(min(a, b), max(a, b))] = max(1.0, secs / 60.0)
+    pts = Points([c[0] for c in coords], [c[1] for c in coords])
+    for a, b, km in zip(*(x.tolist() for x in pairs_near(pts, WALK_RADIUS_M / 1000))):
+        pairs.setdefault((a, b), float(max(1, math.ceil(km * WALK_MIN_PER_KM))))
+    transfers = {"default_walk_minutes": 3, "pairs": [[names[a], names[b], m] for (a, b), m in pairs.items()]}
+    return lines, transfers, {n: [round(la, 6), round(lo, 6)] for n, (la, lo) in zip(names, coords)}
+
+
+# -- scaling benchmark -------------------------------------------------------
+
+def synthetic_timetable(n_stops: int, seed: int = 0) -> Timetable:
+    """A city-shaped feed: stops jittered on a grid ~350 m apart, bus-like routes of ~25 stops
+    walking across it, three trips per direction. Only what the loader reads is filled in."""
+    rng = np.random.default_rng(seed)
+    side = int(math.ceil(math.sqrt(n_stops))); step = 0.0032
+    gx, gy = np.divmod(np.arange(n_stops), side)
+    lat = (42.36 - side * step / 2 + gy * step + rng.normal(0, step / 5, n_stops)).astype(np.float32)
+    lon = (-71.06 - side * step * 0.67 + gx * step * 1.35 + rng.normal(0, step / 5, n_stops)).astype(np.float32)
+    at = {(int(x), int(y)): i for i, (x, y) in enumerate(zip(gx, gy))}
+    n_routes = max(4, n_stops // 6)
+    trip, seq, stop, t_arr = [], [], [], []
+    trip_route = []
+    for r in range(n_routes):
+        x, y = int(rng.integers(0, side)), int(rng.integers(0, side)); dx, dy = ((1, 0), (0, 1))[r % 2]
+        path = []
+        for _ in range(25):
+            if (x, y) in at and at[(x, y)] not in path: path.append(at[(x, y)])
+            if rng.random() < 0.2: dx, dy = dy, dx
+            x, y = x + dx, y + dy
+        if len(path) < 2: continue
+        hop = rng.uniform(1.0, 3.0, len(path) - 1) * 60
+        for direction in (path, path[::-1]):
+            for k in range(3):
+                tid = len(trip_route); trip_route.append(r)
+                times = 6 * 3600 + k * 1200 + np.r_[0, np.cumsum(hop)]
+                trip += [tid] * len(direction); seq += list(range(len(direction))); stop += direction
+                t_arr += times.astype(int).tolist()
+    i32 = lambda a: np.asarray(a, dtype=np.int32)
+    conns = Timetable._connections(i32(trip), i32(seq), i32(stop), i32(t_arr), i32(t_arr))
+    empty = np.empty(0, dtype=np.int32)
+    names = np.array([f"Stop {i} St @ {chr(65 + i % 26)}{i % 97} Ave" for i in range(n_stops)])
+    return Timetable(
+        f"synthetic-{n_stops}-{seed}", stop_ids=np.array([str(i) for i in range(n_stops)]), stop_names=names,
+        stop_parent=np.arange(n_stops, dtype=np.int32), stop_lat=lat, stop_lon=lon,
+        trip_ids=np.array([str(i) for i in range(len(trip_route))]), trip_route=i32(trip_route),
+        trip_service=np.zeros(len(trip_route), dtype=np.int32),
+        route_ids=np.array([f"R{r}" for r in range(n_routes)]), service_ids=np.array(["all"]),
+        fp_from=empty, fp_to=empty, fp_secs=empty, cal_service=empty, cal_days=empty, cal_start=empty,
+        cal_end=empty, ex_service=empty, ex_date=empty, ex_type=empty, **conns)
+
+
+def _rss_mb() -> float:
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _bench_one(n_stops: int, queries: int = 200) -> Dict:
+    import tempfile, time
+    from pathlib import Path
+    from .network import NetworkSnapshot
+    from .disruptions import Overlay
+    from . import app as A
+    pct = lambda xs, q: round(float(np.percentile(xs, q)) * 1000, 2)
+
+    def timed(f, args):
+        lat = []
+        for a in args:
+            t = time.perf_counter(); f(*a); lat.append(time.perf_counter() - t)
+        return {"p50_ms": pct(lat, 50), "p99_ms": pct(lat, 99)}
+
+    rss0 = _rss_mb(); tt = synthetic_timetable(n_stops)
+    t0 = time.perf_counter(); lines, transfers, coords = network_from_timetable(tt)
+    t1 = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        snap = NetworkSnapshot.from_network({}, lines, transfers, coords, network_sha(tt), Path(tmp))
+        t2 = time.perf_counter(); snap.ensure_tables(Path(tmp)); t3 = time.perf_counter()
+        ov = Overlay(snap); g = ov.graph
+        rng = np.random.default_rng(1); names = g.stop_names
+        od = [(names[a], names[b]) for a, b in rng.integers(0, g.n_stops, (queries, 2)) if a != b]
+        pts = [tuple(coords[names[i]]) for i in rng.integers(0, g.n_stops, 2 * queries)]
+        res = {
+            "stops": g.n_stops, "lines": len(lines), "walk_pairs": len(transfers["pairs"]),
+            "vertices": g.n_vertices, "edges": len(g.indices), "tables": snap.tables is not None,
+            "build_s": {"gtfs": round(t1 - t0, 2), "snapshot": round(t2 - t1, 2), "tables": round(t3 - t2, 2)},
+            "rss_mb": round(_rss_mb() - rss0, 1),
+            "plan": timed(lambda o, d: A._find_route(o, d, overlay=ov), od),
+            "plan_direct": timed(lambda a, b: A.plan_direct(*a, *b, radius_m=600, overlay=ov),
+                                 list(zip(pts[::2], pts[1::2]))[:queries // 4]),
+            "reachable": timed(lambda o, _: A.reachable(o, 10, 1, ov), od[:queries // 4]),
+            "suggest": timed(lambda o, _: snap.suggest.suggest(o[5:8]), od),
+            "nearest": timed(lambda p: snap.grid.nearest(p[0], p[1], 600, 5), [(p,) for p in pts]),
+        }
+    return res
+
+
+def main(argv: List[str]) -> None:
+    import json, subprocess, sys
+    if argv[:1] == ["_one"]:
+        print(json.dumps(_bench_one(int(argv[1])))); return
+    if argv[:1] != ["bench"]: raise SystemExit("usage: python -m Capstone.server.gtfsnet bench [sizes...]")
+    # one process per size, so the RSS numbers do not include the previous size
+    for n in [int(a) for a in argv[1:]] or [1000, 10000, 50000]:
+        out = subprocess.run([sys.executable, "-m", __package__ + ".gtfsnet", "_one", str(n)],
+                             capture_output=True, text=True, check=True).stdout
+        print(out.strip().splitlines()[-1], flush=True)
+
+
+if __name__ == "__main__":
+    import sys
+    main(sys.argv[1:])
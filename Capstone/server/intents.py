@@ -0,0 +1,227 @@
+# Capstone/server/intents.py
+"""
+Intent and entity extraction for /chat in one regex pass.
+
+Every surface form the orchestrator cares about (stop names, aliases, route
+names, "from"/"to" markers) goes into one character trie, and the trie is
+written out as a single nested alternation. Python's regex engine then walks
+it in C: at each position it follows one branch per character instead of
+trying thousands of names in turn, and the greedy optional suffixes make the
+longest name win ("green street" is a stop, not the Green Line). Bus routes
+("bus 39", "route 47") and the intent keywords, which match anywhere in a
+word as the old substring tests did, are extra branches of the same pattern.
+One finditer over the message yields every entity with its span; the
+directions split and the alerts route come from those spans.
+
+    python -m Capstone.server.intents check    # replay data/chat_corpus.jsonl
+    python -m Capstone.server.intents bench    # against the substring/loop/regex chain
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .disruptions import SILVER_ROUTES
+
+# surface forms -> MBTA API route id(s), as the alerts agent filters by them
+GREEN = "Green-B,Green-C,Green-D,Green-E"
+ROUTES: Dict[str, Tuple[str, ...]] = {
+    "Red": ("red", "red line"), "Orange": ("orange", "orange line"), "Blue": ("blue", "blue line"),
+    "Mattapan": ("mattapan line", "mattapan trolley"), GREEN: ("green", "green line"),
+    **{f"Green-{b}": (f"green-{b.lower()}", f"green {b.lower()}", f"green line {b.lower()}", f"green-{b.lower()} line",
+                      f"{b.lower()} branch", f"{b.lower()} line") for b in "BCDE"},
+    **{rid: (sl.lower(), f"silver line {sl[2:]}", f"silver line {sl.lower()}") for rid, sl in SILVER_ROUTES.items()},
+    ",".join(SILVER_ROUTES): ("silver", "silver line"),
+}
+# substrings, like the tests they replace: "alerts" and "alerting" are alerts
+KEYWORDS: Dict[str, str] = {"alert": "alerts", "prediction": "predictions", "arrival": "predictions",
+                            "when is the next": "predictions"}
+INTENT_ORDER = ("alerts", "directions", "predictions")
+
+
+@dataclass
+class Entity:
+    kind: str     # stop | route | bus | from | to | keyword
+    value: str    # canonical stop name, route id(s), bus number, or the intent a keyword signals
+    start: int
+    end: int
+
+
+@dataclass
+class Parse:
+    intent: Optional[str] = None
+    entities: List[Entity] = field(default_factory=list)
+    origin: Optional[str] = None
+    dest: Optional[str] = None
+    route: Optional[str] = None
+
+    def of(self, kind: str) -> List[Entity]:
+        return [e for e in self.entities if e.kind == kind]
+
+
+def _key(s: str) -> str:
+    return " ".join(s.lower().split())
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Nested alternation equivalent to `a|b|c...` whose branches share prefixes."""
+    trie: Dict = {}
+    for w in words:
+        node = trie
+        for ch in w: node = node.setdefault(ch, {})
+        node[""] = True
+
+    def emit(node: Dict) -> str:
+        end = node.get("", False)
+        alts = [(r"\s+" if ch == " " else re.escape(ch)) + emit(child)
+                for ch, child in sorted((k, v) for k, v in node.items() if k)]
+        if not alts: return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if end: return "(?:" + body + ")?" if len(alts) == 1 and len(body) > 1 else body + "?"
+        return body
+    return emit(trie)
+
+
+class IntentMatcher:
+    """Compiled matcher over one network's stop names and aliases; build once per snapshot."""
+
+    def __init__(self, stop_names: Iterable[str], aliases: Dict[str, str]):
+        # normalized surface -> (kind, value); a route name wins over a stop spelled the same
+        # ("Red Line" is also a stop in the Silver Line data)
+        self.vocab: Dict[str, Tuple[str, str]] = {"from": ("from", "from"), "to": ("to", "to")}
+        for rid, forms in ROUTES.items():
+            for f in forms: self.vocab.setdefault(_key(f), ("route", rid))
+        for name in stop_names: self.vocab.setdefault(_key(name), ("stop", name))
+        for alias, name in aliases.items(): self.vocab.setdefault(_key(alias), ("stop", name))
+        src = (r"(?<!\w)(?:(?P<bus>(?:bus|route)\s+#?(?P<num>\d{1,3}[a-z]?))|(?P<e>" + _trie_pattern(self.vocab) +
+               r"))(?!\w)|(?P<kw>" + "|".join(re.escape(k) for k in sorted(KEYWORDS, key=len, reverse=True)) + ")")
+        # matched against the lowercased text, which is about twice as fast as re.I; the
+        # case-insensitive twin is for the rare text whose lowercase changes length
+        self.source = src; self.pattern = re.compile(src); self._pattern_i: Optional[re.Pattern] = None
+
+    def entities(self, text: str) -> List[Entity]:
+        return self.parse(text).entities
+
+    def parse(self, text: str) -> Parse:
+        """Intent (alerts > directions > predictions, as /chat ranks them), entities, the
+        directions split and the first route mentioned, from one scan of the text."""
+        low = text.lower()
+        if len(low) == len(text): it = self.pattern.finditer(low)
+        else:
+            if self._pattern_i is None: self._pattern_i = re.compile(self.source, re.I)
+            it = self._pattern_i.finditer(text)
+        vocab = self.vocab; p = Parse(); ents = p.entities; found = set(); marks = []
+        for m in it:
+            g, s, start, end = m.lastgroup, m[0], m.start(), m.end()   # lookarounds are empty: m[0] is the group
+            if g == "e":
+                kind, value = vocab.get(s) or vocab[_key(s)]
+                if kind == "from" or kind == "to": marks.append((kind, start, end))
+                elif kind == "route" and p.route is None: p.route = value
+            elif g == "bus":
+                kind, value = "bus", m["num"].upper()
+                if p.route is None: p.route = value
+            else:
+                kind, value = "keyword", KEYWORDS[s.lower()]; found.add(value)
+            ents.append(Entity(kind, value, start, end))
+        if marks:
+            p.origin, p.dest = self._from_to(text, marks)
+            if p.origin is not None: found.add("directions")
+        p.intent = next((i for i in INTENT_ORDER if i in found), None)
+        return p
+
+    @staticmethod
+    def _from_to(text: str, marks: List[Tuple[str, int, int]]) -> Tuple[Optional[str], Optional[str]]:
+        # same split as r"\bfrom\s+(?P<orig>.+?)\s+to\s+(?P<dest>.+)$": the first "from", the
+        # first whitespace-delimited "to" after it, neither part spanning a line break; unlike
+        # the regex, a part that is only whitespace is no split at all
+        n = len(text) - text.endswith("\n")
+        ws = lambda i: i < len(text) and text[i].isspace()
+        for kind, _, f_end in marks:
+            if kind != "from" or not ws(f_end): continue
+            for kind, t_start, t_end in marks:
+                if kind != "to" or t_start <= f_end or not ws(t_start - 1) or not ws(t_end): continue
+                orig, dest = text[f_end:t_start].strip(), text[t_end:n].lstrip()
+                if "\n" in orig: break
+                if orig and dest.strip() and "\n" not in dest: return orig, dest.strip()
+        return None, None
+
+
+# -- corpus and benchmark ----------------------------------------------------
+
+_LEGACY_FROM_TO = re.compile(r"\bfrom\s+(?P<orig>.+?)\s+to\s+(?P<dest>.+)$", re.I)
+
+def _legacy(text: str) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
+    """The substring chain /chat used before this module, for the benchmark."""
+    low = text.lower(); from_to = _LEGACY_FROM_TO
+    if "alert" in low:
+        route = None
+        for t in ["green-b", "green-c", "green-d", "green-e", "red", "orange", "blue"]:
+            if t in low: route = t.title() if "-" in t else t.capitalize(); break
+        return "alerts", route, None, None
+    if from_to.search(text):
+        m = from_to.search(text)
+        return "directions", None, m.group("orig").strip(), m.group("dest").strip()
+    if "prediction" in low or "arrival" in low or "when is the next" in low: return "predictions", None, None, None
+    return None, None, None, None
+
+
+def _corpus_path():
+    from pathlib import Path
+    return Path(__file__).resolve().parent.parent / "data" / "chat_corpus.jsonl"
+
+
+def _matcher() -> IntentMatcher:
+    from .app import intent_matcher
+    return intent_matcher()
+
+
+def check(path=None) -> int:
+    """Replay the labelled corpus; prints each disagreement and returns their count."""
+    import json
+    m = _matcher(); bad = 0; rows = 0
+    for line in open(path or _corpus_path(), encoding="utf-8"):
+        row = json.loads(line); rows += 1
+        p = m.parse(row["text"])
+        got = {"intent": p.intent, "route": p.route, "origin": p.origin, "dest": p.dest,
+               "stops": [e.value for e in p.of("stop")]}
+        diff = {k: (got[k], v) for k, v in row.items() if k != "text" and got.get(k) != v}
+        if diff: bad += 1; print(json.dumps({"text": row["text"], "got_vs_want": diff}))
+    print(f"{rows - bad}/{rows} corpus messages match")
+    return bad
+
+
+def bench(reps: int = 5) -> None:
+    import json, time
+    texts = [json.loads(l)["text"] for l in open(_corpus_path(), encoding="utf-8")]
+    from .app import current_snapshot
+    snap = current_snapshot()
+    t = time.perf_counter(); m = IntentMatcher(snap.graph.stop_names, snap.aliases); build = time.perf_counter() - t
+
+    def best(f):
+        out = []
+        for _ in range(reps):
+            t = time.perf_counter()
+            for s in texts: f(s)
+            out.append(time.perf_counter() - t)
+        return min(out) / len(texts) * 1e6
+    def scan(vocab):   # what finding the same entities takes without the automaton
+        forms = list(vocab)
+        def f(s):
+            low = _key(s); return _legacy(s), [w for w in forms if w in low]
+        return f
+    print(f"{len(texts)} messages, {len(m.vocab)} surface forms (built in {build * 1e3:.1f} ms)")
+    print(f"  substring chain          {best(_legacy):8.2f} us/msg (intent + route + from/to only)")
+    print(f"  chain + substring scan   {best(scan(m.vocab)):8.2f} us/msg (plus every surface form)")
+    print(f"  compiled parse           {best(m.parse):8.2f} us/msg (every stop, route and keyword span)")
+    names = [f"{w} {k} street" for w in ("north", "south", "east", "west", "old", "new") for k in range(1400)]
+    t = time.perf_counter(); big = IntentMatcher(names, {}); build = time.perf_counter() - t
+    print(f"{len(big.vocab)} surface forms (built in {build * 1e3:.0f} ms)")
+    print(f"  chain + substring scan   {best(scan(big.vocab)):8.2f} us/msg")
+    print(f"  compiled parse           {best(big.parse):8.2f} us/msg")
+
+
+if __name__ == "__main__":
+    import sys
+    if sys.argv[1:2] == ["bench"]: bench()
+    else: raise SystemExit(1 if check() else 0)
@@ -0,0 +1,61 @@
+# Capstone/server/lineindex.py
+"""
+Position of every stop on every line, for same-line answers without a search.
+
+For each line the stop ids are kept in order together with prefix sums of
+the ride minutes in both directions (and prefix counts of removed segments,
+so a suspension shows up as "no ride" instead of inf arithmetic). A ride
+between two stops of one line is then two lookups and a subtraction, and its
+stop list is a slice of the line.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple
+
+from .routing import Graph
+
+INF = float("inf")
+
+
+class LineIndex:
+    """(stop, line) -> position, with cumulative ride minutes; built per overlay graph."""
+
+    def __init__(self, g: Graph, lines: Dict[str, Dict]):
+        self.routes: List[str] = []
+        self.stops: List[List[int]] = []
+        self.fwd: List[Tuple[List[float], List[int]]] = []   # (minutes, removed) prefixes, position order
+        self.bwd: List[Tuple[List[float], List[int]]] = []   # ... against position order
+        self.at: Dict[int, List[Tuple[int, int]]] = {}       # stop -> [(line, position)]
+        for route, line in lines.items():
+            stops = [g.lookup(n) for n in line["stops"]]
+            plats = [g.platform(s, route) for s in stops]
+            k = len(self.routes); self.routes.append(route); self.stops.append(stops)
+            for direction, out in ((1, self.fwd), (-1, self.bwd)):
+                mins, removed = [0.0], [0]
+                for i in range(len(plats) - 1):
+                    u, v = (plats[i], plats[i + 1]) if direction == 1 else (plats[i + 1], plats[i])
+                    e = g.edge(u, v); m = g.minutes[e] if e is not None else INF
+                    mins.append(mins[-1] + (m if m < INF else 0.0)); removed.append(removed[-1] + (m == INF))
+                out.append((mins, removed))
+            seen = set()
+            for pos, s in enumerate(stops):
+                if s not in seen: seen.add(s); self.at.setdefault(s, []).append((k, pos))
+
+    def ride(self, origin: int, dest: int) -> Optional[Tuple[int, int, int, float]]:
+        """Quickest single-line ride as (line, from position, to position, minutes), or None."""
+        best = None
+        dest_at = dict(self.at.get(dest, ()))
+        for k, i in self.at.get(origin, ()):
+            j = dest_at.get(k)
+            if j is None or j == i: continue
+            lo, hi = min(i, j), max(i, j)
+            mins, removed = self.fwd[k] if j > i else self.bwd[k]
+            if removed[hi] - removed[lo]: continue
+            m = mins[hi] - mins[lo]
+            if best is None or m < best[3]: best = (k, i, j, m)
+        return best
+
+    def segment(self, k: int, i: int, j: int) -> List[int]:
+        """Stop ids from position i to position j of line k, inclusive, in riding order."""
+        s = self.stops[k]
+        return s[i:j + 1] if j >= i else s[j:i + 1][::-1]
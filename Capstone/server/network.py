@@ -0,0 +1,224 @@
+# Capstone/server/network.py
+"""
+Versioned snapshot of the network data in Capstone/data.
+
+Aliases, transfers, lines, the CSR graph, the precomputed routing tables,
+the fuzzy stop resolver, the autocomplete index and the nearest-stop grid are
+loaded together into one immutable NetworkSnapshot. Readers grab the current
+snapshot once per request; a reload builds a complete new snapshot off to the
+side and the caller swaps a single reference, so requests that are already
+running finish on the snapshot they started with.
+
+Parsing the JSON sources and building the graph and name indexes costs a few
+hundred milliseconds on a bus-sized network, so the result is also kept as a
+compiled .npz (sources, CSR columns, index arrays) keyed by a hash of the
+source files and guarded by a checksum. Agents load that at startup and fall
+back to the sources when it is missing, stale or damaged. With a GTFS
+timetable the lines and walking transfers are built from the feed instead of
+data/lines (see gtfsnet.py):
+
+    python -m Capstone.server.network       # or: python -m server.network
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import zipfile
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .routing import Graph, WALK, DEFAULT_TRANSFER_PENALTY, DEFAULT_WALK_PENALTY, DEFAULT_RIDE_MINUTES
+from .tables import RoutingTables
+from .resolver import StopResolver
+from .suggest import PrefixIndex
+from .geo import StopGrid
+from .gtfs import Timetable
+from .gtfsnet import network_from_timetable, network_sha
+
+SNAPSHOT_FORMAT = 1
+log = logging.getLogger("network")
+
+# all-pairs tables grow as vertices x stops; past this the planner falls back to Dijkstra
+TABLES_MAX_STOPS = int(os.getenv("PLANNER_TABLES_MAX_STOPS", "2000"))
+
+
+def _sources(data_dir: Path):
+    return sorted((data_dir / "lines").glob("*.json")) + [data_dir / "transfers.json", data_dir / "aliases.json",
+                                                          data_dir / "stops.json"]
+
+
+def _read_sources(data_dir: Path) -> Dict[Path, bytes]:
+    out = {}
+    for p in _sources(data_dir):
+        try: out[p] = p.read_bytes()
+        except FileNotFoundError: pass
+    return out
+
+
+def source_sha(raw: Dict[Path, bytes], timetable: Optional[Timetable] = None) -> str:
+    """Hash of every source file (and the GTFS feed, when the network is built from it) and the
+    default weights; a compiled snapshot is valid only for it."""
+    h = hashlib.sha256(f"{DEFAULT_RIDE_MINUTES}|{DEFAULT_TRANSFER_PENALTY}|{DEFAULT_WALK_PENALTY}".encode())
+    if timetable is not None: h.update(f"gtfs|{network_sha(timetable)}".encode())
+    for p, b in raw.items(): h.update(p.name.encode()); h.update(len(b).to_bytes(8, "little")); h.update(b)
+    return h.hexdigest()
+
+
+def _checksum(arrays: Dict[str, np.ndarray]) -> str:
+    h = hashlib.sha256()
+    for k in sorted(arrays):
+        a = np.ascontiguousarray(arrays[k]); h.update(k.encode()); h.update(str(a.dtype).encode()); h.update(a.tobytes())
+    return h.hexdigest()
+
+
+def _fingerprint(h) -> str:
+    """The fingerprint keys the routing tables: a hash of the network sources and default weights."""
+    h.update(f"{DEFAULT_RIDE_MINUTES}|{DEFAULT_TRANSFER_PENALTY}|{DEFAULT_WALK_PENALTY}".encode())
+    return h.hexdigest()
+
+
+def data_stamp(data_dir: Path) -> Tuple:
+    """Cheap change detector for the watcher: (name, mtime, size) of every source file."""
+    out = []
+    for p in _sources(data_dir):
+        try:
+            st = p.stat(); out.append((p.name, st.st_mtime_ns, st.st_size))
+        except OSError:
+            pass
+    return tuple(out)
+
+
+class NetworkSnapshot:
+    """Everything derived from the data directory, built together and swapped as one object."""
+
+    def __init__(self, aliases: Dict[str, str], transfers: Dict, lines: Dict[str, Dict],
+                 fingerprint: str, version: str, tables_dir: Path,
+                 coords: Optional[Dict[str, Tuple[float, float]]] = None, graph: Optional[Graph] = None,
+                 resolver: Optional[StopResolver] = None, suggest: Optional[PrefixIndex] = None):
+        self.aliases, self.transfers, self.lines, self.coords = aliases, transfers, lines, coords or {}
+        self.fingerprint, self.version = fingerprint, version
+        self.graph = graph or Graph.from_network(lines, transfers)
+        self.tables = RoutingTables.load(tables_dir, fingerprint)
+        self.resolver = resolver or StopResolver(self.graph.stop_names, aliases)
+        self.suggest = suggest or PrefixIndex(self.graph.stop_names, aliases, self.popularity())
+        # only stops the planner knows, so every nearby stop is routable
+        self.grid = StopGrid({n: tuple(c) for n, c in self.coords.items() if self.graph.lookup(n) is not None})
+
+    def popularity(self) -> Dict[str, float]:
+        """Lines serving each stop plus its walking transfers."""
+        g = self.graph
+        return {g.stop_names[s]: len(g.platforms.get(s, ())) +
+                sum(1 for e in range(g.indptr[s], g.indptr[s + 1]) if g.kinds[e] == WALK)
+                for s in range(g.n_stops)}
+
+    @classmethod
+    def load(cls, data_dir: Path, tables_dir: Path, compiled: Optional[Path] = None,
+             timetable: Optional[Timetable] = None) -> "NetworkSnapshot":
+        """The compiled snapshot when it matches the sources, otherwise parse them (and refresh it)."""
+        raw = _read_sources(data_dir); sha = source_sha(raw, timetable)
+        snap = cls.load_compiled(compiled, sha, tables_dir) if compiled else None
+        if snap is None:
+            snap = cls.from_sources(raw, tables_dir, timetable)
+            if compiled:
+                try: snap.save_compiled(compiled, sha)
+                except OSError as e: log.warning("could not write %s: %s", compiled, e)
+        return snap
+
+    @classmethod
+    def from_sources(cls, raw: Dict[Path, bytes], tables_dir: Path,
+                     timetable: Optional[Timetable] = None) -> "NetworkSnapshot":
+        """Parse the sources; with a timetable, lines and transfers come from the GTFS feed and
+        data/lines is ignored (aliases and stops.json coordinates still apply on top)."""
+        by_name = {p.name: b for p, b in raw.items() if p.parent.name != "lines"}
+        aliases = {k.lower(): v for k, v in json.loads(by_name.get("aliases.json", b"{}")).items()}
+        coords = json.loads(by_name.get("stops.json", b"{}"))
+        if timetable is not None:
+            lines, transfers, feed_coords = network_from_timetable(timetable)
+            fingerprint = _fingerprint(hashlib.sha256(network_sha(timetable).encode()))
+            return cls.from_network(aliases, lines, transfers, {**feed_coords, **coords}, fingerprint, tables_dir)
+        transfers = (json.loads(by_name["transfers.json"]) if "transfers.json" in by_name
+                     else {"default_walk_minutes": 3, "pairs": []})
+        lines: Dict[str, Dict] = {}
+        for p, b in raw.items():
+            if p.parent.name == "lines": obj = json.loads(b); lines[obj["route_id"]] = obj
+        h = hashlib.sha256()
+        for p, b in raw.items():
+            if p.parent.name == "lines" or p.name == "transfers.json": h.update(p.name.encode()); h.update(b)
+        return cls.from_network(aliases, lines, transfers, coords, _fingerprint(h), tables_dir)
+
+    @classmethod
+    def from_network(cls, aliases: Dict[str, str], lines: Dict[str, Dict], transfers: Dict,
+                     coords: Dict[str, Tuple[float, float]], fingerprint: str, tables_dir: Path) -> "NetworkSnapshot":
+        extra = json.dumps([aliases, coords], sort_keys=True)
+        version = hashlib.sha256((fingerprint + extra).encode()).hexdigest()[:12]
+        return cls(aliases, transfers, lines, fingerprint, version, tables_dir, coords)
+
+    # -- compiled snapshot ---------------------------------------------------
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        sources = json.dumps({"aliases": self.aliases, "transfers": self.transfers, "lines": self.lines,
+                              "coords": self.coords}).encode()
+        out = {"_sources": np.frombuffer(sources, dtype=np.uint8),
+               "_version": np.array(self.version), "_fingerprint": np.array(self.fingerprint)}
+        for part, obj in (("graph", self.graph), ("resolver", self.resolver), ("suggest", self.suggest)):
+            out.update({f"{part}.{k}": v for k, v in obj.to_arrays().items()})
+        return out
+
+    def save_compiled(self, path: Path, sha: str) -> None:
+        arrays = self._arrays()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                np.savez(f, _format=np.array(SNAPSHOT_FORMAT), _source_sha=np.array(sha),
+                         _checksum=np.array(_checksum(arrays)), **arrays)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    @classmethod
+    def load_compiled(cls, path: Path, sha: str, tables_dir: Path) -> Optional["NetworkSnapshot"]:
+        """None when the file is missing, from another format or other sources, or corrupt."""
+        try:
+            with np.load(path) as z:
+                if int(z["_format"]) != SNAPSHOT_FORMAT or str(z["_source_sha"]) != sha: return None
+                arrays = {k: z[k] for k in z.files if k not in ("_format", "_source_sha", "_checksum")}
+                if _checksum(arrays) != str(z["_checksum"]):
+                    log.warning("%s fails its checksum; rebuilding from sources", path); return None
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            return None
+        src = json.loads(arrays["_sources"].tobytes())
+        part = lambda p: {k[len(p) + 1:]: v for k, v in arrays.items() if k.startswith(p + ".")}
+        return cls(src["aliases"], src["transfers"], src["lines"], str(arrays["_fingerprint"]),
+                   str(arrays["_version"]), tables_dir, src["coords"],
+                   graph=Graph.from_arrays(part("graph")), resolver=StopResolver.from_arrays(part("resolver")),
+                   suggest=PrefixIndex.from_arrays(part("suggest")))
+
+    def ensure_tables(self, tables_dir: Path) -> Optional[RoutingTables]:
+        """Build and save routing tables when none match this snapshot (small networks only)."""
+        if self.tables is None and self.graph.n_stops <= TABLES_MAX_STOPS:
+            tables = RoutingTables.build(self.graph, fingerprint=self.fingerprint)
+            tables.save(tables_dir)
+            self.tables = RoutingTables.load(tables_dir, self.fingerprint)
+        return self.tables
+
+
+def main():
+    import time
+    from .app import DATA_DIR, TABLES_DIR, SNAPSHOT_PATH, NETWORK_SOURCE, load_timetable
+    tt = load_timetable() if NETWORK_SOURCE == "gtfs" else None
+    t0 = time.perf_counter()
+    raw = _read_sources(DATA_DIR); snap = NetworkSnapshot.from_sources(raw, TABLES_DIR, tt)
+    snap.save_compiled(SNAPSHOT_PATH, source_sha(raw, tt))
+    t1 = time.perf_counter()
+    NetworkSnapshot.load_compiled(SNAPSHOT_PATH, source_sha(raw, tt), TABLES_DIR)
+    print(f"compiled {snap.graph.n_stops} stops / {len(snap.graph.indices)} edges into {SNAPSHOT_PATH} "
+          f"(version {snap.version}, {(t1 - t0) * 1e3:.0f} ms); loads in {(time.perf_counter() - t1) * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
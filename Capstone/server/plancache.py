@@ -0,0 +1,65 @@
+# Capstone/server/plancache.py
+"""
+Memo of planner responses.
+
+Entries live in the overlay's cache dict, so every network reload or change
+of the active disruptions starts from an empty store without any explicit
+invalidation, and a request still running on the previous overlay can only
+write into the store nobody reads any more. Within one overlay the store is
+an LRU capped at `maxsize` entries whose entries also expire after `ttl`
+seconds. Counters are kept across overlays for the stats endpoint.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+PLAN_CACHE_SIZE = int(os.getenv("PLANNER_PLAN_CACHE_SIZE", "4096"))
+PLAN_CACHE_TTL = float(os.getenv("PLANNER_PLAN_CACHE_TTL", "300"))
+
+
+class PlanCache:
+    """LRU + TTL cache of responses, one store per network overlay."""
+
+    def __init__(self, maxsize: int = PLAN_CACHE_SIZE, ttl: float = PLAN_CACHE_TTL):
+        self.maxsize, self.ttl = maxsize, ttl
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expired = self.stores = 0
+
+    def _store(self, ov) -> OrderedDict:
+        store = ov.cache.get("plans")
+        if store is None:
+            store = ov.cache["plans"] = OrderedDict(); self.stores += 1
+        return store
+
+    def get(self, ov, key: Hashable) -> Optional[Any]:
+        if self.maxsize <= 0: return None
+        now = time.monotonic()
+        with self.lock:
+            store = self._store(ov); entry = store.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    store.move_to_end(key); self.hits += 1
+                    return entry[1]
+                del store[key]; self.expired += 1
+            self.misses += 1
+            return None
+
+    def put(self, ov, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0: return
+        with self.lock:
+            store = self._store(ov)
+            store[key] = (time.monotonic() + self.ttl, value); store.move_to_end(key)
+            while len(store) > self.maxsize:
+                store.popitem(last=False); self.evictions += 1
+
+    def stats(self, ov) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"size": len(ov.cache.get("plans") or ()), "maxsize": self.maxsize, "ttl_s": self.ttl,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "expired": self.expired, "invalidations": max(0, self.stores - 1),
+                    "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
@@ -0,0 +1,186 @@
+# Capstone/server/raptor.py
+"""
+Round-based (RAPTOR-style) multi-criteria planner.
+
+Works directly on the route-ordered stop lists in data/lines: every line is
+scanned once per round in each direction, instead of relaxing edge by edge.
+Round k allows k vehicles (k-1 transfers); the label of a stop is the
+fewest stops that reach it within that many vehicles. Walking transfers from
+transfers.json are relaxed after each round without using up a vehicle and
+count as one stop. A target label that improves in round k is a
+Pareto-optimal (transfers, stops) itinerary, so the rounds yield the full
+Pareto set from "fewest transfers" to "fewest stops".
+
+On a disruption overlay graph, lines are split at suspended segments and
+closed stations are passed through without boarding or alighting.
+"""
+from __future__ import annotations
+
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .routing import Graph
+
+MAX_ROUNDS = int(os.getenv("PLANNER_RAPTOR_ROUNDS", "5"))
+MATRIX_ROUNDS = int(os.getenv("PLANNER_MATRIX_ROUNDS", "8"))
+WALK_STOPS = 1  # a walking transfer counts like riding one stop
+INF = float("inf")
+
+# parent labels: ("ride", pattern, board_pos, alight_pos) or ("walk", from_stop)
+Label = Tuple
+
+
+class Raptor:
+    def __init__(self, g: Graph, lines: Dict[str, Dict], transfers: Dict):
+        self.g = g
+        self.patterns: List[Tuple[int, List[int]]] = []   # (interned route, stops)
+        for line in lines.values():
+            stops = [g.lookup(s) for s in line["stops"]]
+            for seq in (stops, stops[::-1]):
+                self.patterns.extend((g.route_index[line["route_id"]], run)
+                                     for run in self._runs(line["route_id"], seq))
+        # stop -> [(pattern, position)]
+        self.serving: List[List[Tuple[int, int]]] = [[] for _ in range(g.n_stops)]
+        # (pattern, position) pairs where the vehicle passes without boarding or alighting
+        self.closed = set()
+        for pi, (route, stops) in enumerate(self.patterns):
+            for pos, s in enumerate(stops):
+                self.serving[s].append((pi, pos))
+                e = g.edge(s, g.platform(s, g.route_ids[route]))
+                if e is not None and g.minutes[e] == INF: self.closed.add((pi, pos))
+        self.footpaths: List[List[int]] = [[] for _ in range(g.n_stops)]
+        for pair in transfers.get("pairs", []):
+            a, b = g.lookup(pair[0]), g.lookup(pair[1])
+            self.footpaths[a].append(b); self.footpaths[b].append(a)
+
+    def _runs(self, route: str, stops: List[int]) -> List[List[int]]:
+        """Split a stop sequence where the ride edge is gone (suspended segments)."""
+        g = self.g; runs = [[stops[0]]]
+        for a, b in zip(stops, stops[1:]):
+            e = g.edge(g.platform(a, route), g.platform(b, route))
+            if e is None or g.minutes[e] == INF: runs.append([])
+            runs[-1].append(b)
+        return [r for r in runs if len(r) > 1]
+
+    def _walk(self, tau: List[float], parent: List[Optional[Label]], marked: set) -> None:
+        # one footpath hop per round, relaxed from the pre-walk labels
+        for p, val in [(p, tau[p]) for p in marked]:
+            for q in self.footpaths[p]:
+                if val + WALK_STOPS < tau[q]:
+                    tau[q] = val + WALK_STOPS; parent[q] = ("walk", p); marked.add(q)
+
+    def run(self, origin: int, target: Optional[int] = None, max_rounds: int = MAX_ROUNDS,
+            max_stops: float = INF):
+        """Run the rounds; returns (tau, parents) with one label list per round.
+        Rides are pruned past `max_stops` (walk hops are not; filter those afterwards)."""
+        n = self.g.n_stops
+        tau = [[INF] * n]; parents: List[List[Optional[Label]]] = [[None] * n]
+        tau[0][origin] = 0; marked = {origin}
+        self._walk(tau[0], parents[0], marked)
+        best = tau[0][:]
+        for k in range(1, max_rounds + 1):
+            prev = tau[k - 1]; cur = prev[:]; par: List[Optional[Label]] = [None] * n
+            queue: Dict[int, int] = {}
+            for p in marked:
+                for pi, pos in self.serving[p]:
+                    if pos < queue.get(pi, 1 << 30): queue[pi] = pos
+            marked = set()
+            for pi, start in queue.items():
+                stops = self.patterns[pi][1]
+                board, board_val = -1, INF
+                for pos in range(start, len(stops)):
+                    s = stops[pos]
+                    if (pi, pos) in self.closed: continue
+                    if board >= 0:
+                        val = board_val + (pos - board)
+                        bound = min(best[s], best[target] if target is not None else INF)
+                        if val < bound and val <= max_stops:
+                            cur[s] = best[s] = val; par[s] = ("ride", pi, board, pos); marked.add(s)
+                    if prev[s] < INF and (board < 0 or prev[s] < board_val + (pos - board)):
+                        board, board_val = pos, prev[s]
+            self._walk(cur, par, marked)
+            for s in marked: best[s] = min(best[s], cur[s])
+            tau.append(cur); parents.append(par)
+            if not marked: break
+        return tau, parents
+
+    def _journey(self, parents, k: int, stop: int) -> Tuple[List[str], List[str]]:
+        stops_rev: List[int] = []; routes_rev: List[int] = []   # route -1 = walk
+        while k >= 0:
+            label = parents[k][stop]
+            if label is None:
+                if k == 0: break
+                k -= 1; continue
+            if label[0] == "walk":
+                stops_rev.append(stop); routes_rev.append(-1)
+                stop = label[1]; continue
+            _, pi, board, alight = label
+            route, stops = self.patterns[pi]
+            for pos in range(alight, board, -1):
+                stops_rev.append(stops[pos]); routes_rev.append(route)
+            stop = stops[board]; k -= 1
+        stops_rev.append(stop)
+        g = self.g
+        return ([g.stop_names[s] for s in reversed(stops_rev)],
+                [g.route_ids[r] if r >= 0 else "walk" for r in reversed(routes_rev)])
+
+    def pareto(self, origin: int, dest: int, max_rounds: int = MAX_ROUNDS) -> List[Dict]:
+        """Pareto set ordered from fewest transfers to fewest stops."""
+        tau, parents = self.run(origin, dest, max_rounds)
+        out, best = [], INF
+        for k in range(len(tau)):
+            if tau[k][dest] < best:
+                best = tau[k][dest]
+                names, routes = self._journey(parents, k, dest)
+                out.append({"transfers": max(0, k - 1), "stops": int(best),
+                            "names": names, "routes": routes})
+        return out
+
+    def reachable(self, origin: int, max_stops: int, max_transfers: int) -> List[Tuple[int, int, int]]:
+        """(stop, stops, transfers) for every stop within both bounds; transfers is the fewest
+        any journey of at most `max_stops` stops needs, stops the fewest within `max_transfers`."""
+        tau, _ = self.run(origin, max_rounds=max_transfers + 1, max_stops=max_stops)
+        out = []
+        for s in range(self.g.n_stops):
+            k = next((k for k in range(len(tau)) if tau[k][s] <= max_stops), None)
+            if k is not None and s != origin:
+                out.append((s, int(tau[-1][s]), max(0, k - 1)))
+        return out
+
+    def matrix(self, origins: Sequence[int], max_rounds: int = MATRIX_ROUNDS) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fewest-stops and fewest-transfers matrices (origins x all stops, -1 = unreachable).
+
+        All origins run at once as rows of one label array. Along a pattern the best
+        label reachable at position j is min over boarding positions b <= j of
+        prev[b] + (j - b), i.e. a running minimum of prev - pos shifted back by pos,
+        so a whole round is one np.minimum.accumulate per pattern.
+        """
+        n = self.g.n_stops; rows = np.arange(len(origins))
+        tau = np.full((len(origins), n), np.inf); tau[rows, list(origins)] = 0
+        tau = self._walk_all(tau, tau)
+        first = np.where(np.isfinite(tau), 0, -1).astype(np.int16)
+        for k in range(1, max_rounds + 1):
+            cur = tau.copy()
+            for pi, (_, stops) in enumerate(self.patterns):
+                pos = np.arange(len(stops)); open_ = np.array([(pi, j) not in self.closed for j in pos])
+                board = np.where(open_, tau[:, stops] - pos, np.inf)
+                ride = np.minimum.accumulate(board, axis=1) + pos
+                cols = np.array(stops)[open_]
+                cur[:, cols] = np.minimum(cur[:, cols], ride[:, open_])
+            # like _walk, only stops a ride improved this round start a footpath
+            cur = self._walk_all(cur, np.where(cur < tau, cur, np.inf))
+            first[(first < 0) & np.isfinite(cur)] = k - 1
+            if np.array_equal(cur, tau): break
+            tau = cur
+        stops = np.where(np.isfinite(tau), tau, -1).astype(np.int16)
+        return stops, first
+
+    def _walk_all(self, tau: np.ndarray, marked: np.ndarray) -> np.ndarray:
+        """One footpath hop from the pre-walk labels of `marked` (inf where unmarked)."""
+        out = tau.copy()
+        for p, qs in enumerate(self.footpaths):
+            for q in qs: np.minimum(out[:, q], marked[:, p] + WALK_STOPS, out=out[:, q])
+        return out
@@ -0,0 +1,143 @@
+# Capstone/server/resolver.py
+"""
+Fuzzy stop-name resolution.
+
+Every stop name and alias key is normalized (case, punctuation, "@",
+parentheses, St/Street-style abbreviations) and indexed by character
+trigrams. A query collects candidates through the inverted index, keeps the
+best few by trigram overlap and re-ranks them with a banded edit distance and
+a token-prefix rule, so "Park St", "kendall" and "Hynes" land on
+"Park Street", "Kendall/MIT" and "Hynes Convention Center".
+"""
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+MIN_SCORE = 0.7
+SHORTLIST = 8
+MAX_EDITS = 3
+AMBIGUOUS = 0.02   # top two closer than this: ask instead of guessing
+
+_ABBREV = {
+    "st": "street", "sq": "square", "ctr": "center", "cntr": "center", "ave": "avenue", "av": "avenue",
+    "rd": "road", "univ": "university", "u": "university", "stn": "station", "sta": "station",
+    "mt": "mount", "hosp": "hospital", "govt": "government", "gov": "government", "med": "medical",
+    "conv": "convention", "pl": "place", "blvd": "boulevard", "xing": "crossing", "&": "and", "at": "and",
+}
+_PUNCT = re.compile(r"[^a-z0-9& ]+")
+
+
+def _tokens(text: str) -> List[str]:
+    t = text.lower().replace("@", " at ").replace("(", " ").replace(")", " ")
+    return _PUNCT.sub(" ", t.replace("'", "")).split()
+
+
+def normalize(text: str) -> str:
+    """Lowercase, '@' -> 'at', drop parentheses/punctuation, expand common abbreviations."""
+    return " ".join(_ABBREV.get(tok, tok) for tok in _tokens(text))
+
+
+def trigrams(text: str) -> Set[str]:
+    t = f" {text} "
+    return {t[i:i + 3] for i in range(len(t) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int = MAX_EDITS) -> int:
+    """Edit distance with adjacent transpositions ("Copely"), computed in a band of width
+    `limit`; returns limit + 1 as soon as the distance must exceed it."""
+    if abs(len(a) - len(b)) > limit: return limit + 1
+    over = limit + 1
+    pp: List[int] = []; prev = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        lo, hi = max(1, i - limit), min(len(b), i + limit)
+        cur = [over] * (len(b) + 1); cur[0] = i if i <= limit else over
+        for j in range(lo, hi + 1):
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d = min(d, pp[j - 2] + 1)
+            cur[j] = d
+        if min(cur[lo - 1:hi + 1]) > limit: return over
+        pp, prev = prev, cur
+    return min(prev[len(b)], over)
+
+
+class StopResolver:
+    """Trigram index over stop names and alias keys; built once per network snapshot."""
+
+    def __init__(self, stop_names: List[str], aliases: Dict[str, str]):
+        keys: Dict[str, Tuple[str, str]] = {}
+        for name in stop_names: keys.setdefault(normalize(name), (name, name))
+        canonical = {n.lower(): n for n in stop_names}
+        for alias, target in aliases.items():
+            keys.setdefault(normalize(alias), (alias, canonical.get(target.lower(), target)))
+        self.keys: List[str] = list(keys)
+        self.targets: List[str] = [keys[k][1] for k in self.keys]
+        # unexpanded spelling too, so a typo inside "St" is one edit, not a "street" rewrite
+        self.raw: List[str] = [" ".join(_tokens(keys[k][0])) for k in self.keys]
+        self.grams: List[int] = []
+        self.index: Dict[str, List[int]] = {}
+        for i, k in enumerate(self.keys):
+            g = trigrams(k); self.grams.append(len(g))
+            for t in g: self.index.setdefault(t, []).append(i)
+        self.exact = {k: i for i, k in enumerate(self.keys)}
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        grams = list(self.index)
+        return {"keys": np.array(self.keys, dtype=str), "targets": np.array(self.targets, dtype=str),
+                "raw": np.array(self.raw, dtype=str), "n_grams": np.array(self.grams, dtype=np.int32),
+                "grams": np.array(grams, dtype=str),
+                "gram_ptr": np.cumsum([0] + [len(self.index[t]) for t in grams], dtype=np.int64),
+                "gram_ids": np.array([i for t in grams for i in self.index[t]], dtype=np.int32)}
+
+    @classmethod
+    def from_arrays(cls, z) -> "StopResolver":
+        r = cls.__new__(cls)
+        r.keys, r.targets, r.raw, r.grams = (z[k].tolist() for k in ("keys", "targets", "raw", "n_grams"))
+        ptr, ids = z["gram_ptr"].tolist(), z["gram_ids"].tolist()
+        r.index = {t: ids[ptr[j]:ptr[j + 1]] for j, t in enumerate(z["grams"].tolist())}
+        r.exact = {k: i for i, k in enumerate(r.keys)}
+        return r
+
+    def _score(self, q: str, q_raw: str, i: int, shared: int, n_q: int) -> float:
+        k, k_raw = self.keys[i], self.raw[i]
+        dice = 2.0 * shared / (n_q + self.grams[i])
+        sim = 0.0
+        for a, b in ((q, k), (q_raw, k_raw)):
+            ed = edit_distance(a, b)
+            if ed <= MAX_EDITS: sim = max(sim, 1.0 - ed / max(len(a), len(b)))
+        # a typo or two in a short name barely shares trigrams, so lean on the edit distance
+        score = max(0.5 * dice + 0.5 * sim, sim - 0.05)
+        q_toks, k_toks = q.split(), k.split()
+        # every typed word starts a word of the name, in order: "hynes", "park st", "kendall"
+        it = iter(k_toks)
+        if all(any(kt.startswith(qt) for kt in it) for qt in q_toks):
+            score = max(score, 0.8 + 0.2 * len(q) / len(k))
+        # the whole name plus qualifiers: "Harvard Sq", "Haymarket (Orange)"
+        elif all(kt in q_toks for kt in k_toks):
+            score = max(score, 0.7 + 0.2 * len(k) / len(q))
+        return min(score, 0.99)
+
+    def candidates(self, text: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """Ranked (stop name, score in 0..1) candidates; 1.0 only for an exact normalized match."""
+        q = normalize(text); q_raw = " ".join(_tokens(text))
+        if not q: return []
+        if q in self.exact: return [(self.targets[self.exact[q]], 1.0)]
+        qg = trigrams(q); counts: Dict[int, int] = {}
+        for t in qg:
+            for i in self.index.get(t, ()): counts[i] = counts.get(i, 0) + 1
+        short = sorted(counts.items(), key=lambda kv: -2.0 * kv[1] / (len(qg) + self.grams[kv[0]]))[:SHORTLIST]
+        best: Dict[str, float] = {}
+        for i, shared in short:
+            s = self._score(q, q_raw, i, shared, len(qg)); name = self.targets[i]
+            if s > best.get(name, 0.0): best[name] = s
+        return sorted(best.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+
+    def resolve(self, text: str, min_score: float = MIN_SCORE) -> Optional[str]:
+        """Best stop name, or None when nothing scores `min_score` or two stops tie ("st")."""
+        c = self.candidates(text, 2)
+        if not c or c[0][1] < min_score: return None
+        if len(c) > 1 and c[0][1] < 1.0 and c[0][1] - c[1][1] < AMBIGUOUS: return None
+        return c[0][0]
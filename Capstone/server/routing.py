@@ -0,0 +1,396 @@
+# Capstone/server/routing.py
+"""
+Weighted shortest-path engine used by the orchestrator and the planner agents.
+
+The subway network is expanded into a CSR graph with two kinds of vertices:
+  - one *hub* vertex per stop (ids 0 .. n_stops-1)
+  - one *platform* vertex per (stop, route) pair
+
+Edges:
+  - ride:   platform -> next platform on the same line (line minutes; one way only
+            for a "directed" line)
+  - board:  hub -> platform (transfer penalty, charged per query)
+  - alight: platform -> hub (free)
+  - walk:   hub -> hub for transfers.json pairs (walk minutes + walk penalty)
+
+Splitting boarding from riding lets a plain Dijkstra charge the transfer
+penalty exactly once per line change, while the penalties stay per-query.
+"""
+from __future__ import annotations
+
+import copy
+import heapq
+import math
+import os
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+RIDE, BOARD, ALIGHT, WALK = 0, 1, 2, 3
+
+DEFAULT_RIDE_MINUTES = float(os.getenv("PLANNER_RIDE_MINUTES", "2"))
+DEFAULT_TRANSFER_PENALTY = float(os.getenv("PLANNER_TRANSFER_PENALTY", "5"))
+DEFAULT_WALK_PENALTY = float(os.getenv("PLANNER_WALK_PENALTY", "2"))
+
+
+@dataclass(frozen=True)
+class Weights:
+    """Per-query cost knobs (minutes) added on top of the edge minutes."""
+    transfer_penalty: float = DEFAULT_TRANSFER_PENALTY
+    walk_penalty: float = DEFAULT_WALK_PENALTY
+
+    def extra(self) -> Tuple[float, float, float, float]:
+        """Penalty per edge kind, indexed by RIDE/BOARD/ALIGHT/WALK."""
+        return (0.0, self.transfer_penalty, 0.0, self.walk_penalty)
+
+
+class Graph:
+    """
+    Integer-indexed CSR adjacency over hub and platform vertices.
+
+    Stop names and route ids are interned once at build time; the search only
+    ever touches the typed arrays below, and display names are looked up when
+    a path is turned into legs.
+    """
+
+    def __init__(self, stop_names: List[str], route_ids: List[str], vertex_stop: array,
+                 vertex_route: array, indptr: array, indices: array, minutes: array, kinds: array):
+        self.stop_names = stop_names
+        self.stop_index: Dict[str, int] = {n.lower(): i for i, n in enumerate(stop_names)}
+        self.n_stops = len(stop_names)
+        self.route_ids = route_ids
+        self.route_index: Dict[str, int] = {r: i for i, r in enumerate(route_ids)}
+        self.vertex_stop = vertex_stop      # array("i"): stop id of every vertex
+        self.vertex_route = vertex_route    # array("h"): interned route of a platform, -1 on hubs
+        self.indptr, self.indices, self.minutes, self.kinds = indptr, indices, minutes, kinds
+        self._reverse: Optional[Tuple[array, array, array]] = None
+        self._costs: Dict[Tuple[float, ...], array] = {}
+        self.platforms: Dict[int, List[int]] = {}
+        for v in range(self.n_stops, len(vertex_stop)):
+            self.platforms.setdefault(vertex_stop[v], []).append(v)
+
+    @property
+    def n_vertices(self) -> int:
+        return len(self.vertex_stop)
+
+    @classmethod
+    def from_network(cls, lines: Dict[str, Dict], transfers: Dict) -> "Graph":
+        stop_names: List[str] = []; stop_ids: Dict[str, int] = {}
+
+        def stop_id(name: str) -> int:
+            key = name.strip().lower()
+            if key not in stop_ids:
+                stop_ids[key] = len(stop_names); stop_names.append(name.strip())
+            return stop_ids[key]
+
+        for line in lines.values():
+            for s in line["stops"]: stop_id(s)
+        for pair in transfers.get("pairs", []):
+            stop_id(pair[0]); stop_id(pair[1])
+
+        route_ids = list(dict.fromkeys(line["route_id"] for line in lines.values()))
+        route_idx = {r: i for i, r in enumerate(route_ids)}
+        vertex_stop = array("i", range(len(stop_names))); vertex_route = array("h", [-1] * len(stop_names))
+        platform_ids: Dict[Tuple[int, int], int] = {}
+
+        def platform(stop: int, route: int) -> int:
+            if (stop, route) not in platform_ids:
+                platform_ids[(stop, route)] = len(vertex_stop)
+                vertex_stop.append(stop); vertex_route.append(route)
+            return platform_ids[(stop, route)]
+
+        # edge columns in typed arrays and one stable sort by source: a few bytes per
+        # edge instead of a tuple, which matters once bus routes are in
+        src, dst, mins, kinds = array("i"), array("i"), array("d"), array("b")
+
+        def add(u: int, v: int, m: float, kind: int):
+            src.append(u); dst.append(v); mins.append(m); kinds.append(kind)
+
+        for line in lines.values():
+            route = route_idx[line["route_id"]]
+            stops = [stop_id(s) for s in line["stops"]]
+            seg = line.get("minutes") or [DEFAULT_RIDE_MINUTES] * (len(stops) - 1)
+            for i in range(len(stops) - 1):
+                a, b = platform(stops[i], route), platform(stops[i + 1], route)
+                add(a, b, float(seg[i]), RIDE)
+                if not line.get("directed"): add(b, a, float(seg[i]), RIDE)
+        for (stop, _), v in platform_ids.items():
+            add(stop, v, 0.0, BOARD); add(v, stop, 0.0, ALIGHT)
+        walk_default = float(transfers.get("default_walk_minutes", 3))
+        for pair in transfers.get("pairs", []):
+            a, b = stop_id(pair[0]), stop_id(pair[1])
+            m = float(pair[2]) if len(pair) > 2 else walk_default
+            add(a, b, m, WALK); add(b, a, m, WALK)
+
+        order = np.argsort(np.frombuffer(src, dtype=np.int32), kind="stable")
+        counts = np.bincount(np.frombuffer(src, dtype=np.int32), minlength=len(vertex_stop))
+        indptr = np.zeros(len(vertex_stop) + 1, dtype=np.int32); np.cumsum(counts, out=indptr[1:])
+        col = lambda a, code, dt: array(code, np.frombuffer(a, dtype=dt)[order].tobytes())
+        return cls(stop_names, route_ids, vertex_stop, vertex_route, array("i", indptr.tobytes()),
+                   col(dst, "i", np.int32), col(mins, "d", np.float64), col(kinds, "b", np.int8))
+
+    # (attribute, array typecode, dtype) of the CSR columns written to a compiled snapshot
+    COLUMNS = (("vertex_stop", "i", np.int32), ("vertex_route", "h", np.int16), ("indptr", "i", np.int32),
+               ("indices", "i", np.int32), ("minutes", "d", np.float64), ("kinds", "b", np.int8))
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        out = {name: np.array(getattr(self, name), dtype=dt) for name, _, dt in self.COLUMNS}
+        out["stop_names"] = np.array(self.stop_names, dtype=str)
+        out["route_ids"] = np.array(self.route_ids, dtype=str)
+        return out
+
+    @classmethod
+    def from_arrays(cls, z) -> "Graph":
+        cols = {name: array(code, np.ascontiguousarray(z[name], dtype=dt).tobytes()) for name, code, dt in cls.COLUMNS}
+        return cls(z["stop_names"].tolist(), z["route_ids"].tolist(), **cols)
+
+    def lookup(self, name: str) -> Optional[int]:
+        return self.stop_index.get(name.strip().lower()) if name else None
+
+    def route_name(self, v: int) -> str:
+        r = self.vertex_route[v]
+        return self.route_ids[r] if r >= 0 else "walk"
+
+    def edge(self, u: int, v: int) -> Optional[int]:
+        """Index of the edge u -> v in the CSR arrays, or None."""
+        for e in range(self.indptr[u], self.indptr[u + 1]):
+            if self.indices[e] == v: return e
+        return None
+
+    def platform(self, stop: int, route: str) -> Optional[int]:
+        r = self.route_index.get(route)
+        return next((v for v in self.platforms.get(stop, ()) if self.vertex_route[v] == r), None)
+
+    def boardable(self, stop: int) -> List[int]:
+        """Platforms of `stop` whose BOARD edge is open (a closure overlays it with inf)."""
+        out = []
+        for v in self.platforms.get(stop, ()):
+            e = self.edge(stop, v)
+            if e is not None and math.isfinite(self.minutes[e]): out.append(v)
+        return out
+
+    def with_minutes(self, changes: Dict[int, float]) -> "Graph":
+        """Copy sharing the topology, with edge minutes replaced per `changes` (inf removes an edge)."""
+        g = copy.copy(self)
+        g.minutes = array("d", self.minutes)
+        for e, mins in changes.items(): g.minutes[e] = mins
+        g._costs = {}
+        self.reverse(); g._reverse = self._reverse   # reverse CSR holds edge ids, so it is shared
+        return g
+
+    def costs(self, extra: Tuple[float, ...]) -> array:
+        """Per-edge minutes plus the per-kind penalties, memoized for the last few weightings."""
+        c = self._costs.get(extra)
+        if c is None:
+            if len(self._costs) >= 8: self._costs.clear()
+            c = self._costs[extra] = array("d", (m + extra[k] for m, k in zip(self.minutes, self.kinds)))
+        return c
+
+    def reverse(self) -> Tuple[array, array, array]:
+        """Reverse CSR (indptr, source vertex, forward edge id) of incoming edges; built once."""
+        if self._reverse is None:
+            n = self.n_vertices; indices = np.frombuffer(self.indices, dtype=np.int32)
+            eid = np.argsort(indices, kind="stable").astype(np.int32)   # by target, then edge id
+            src = np.repeat(np.arange(n, dtype=np.int32), np.diff(np.frombuffer(self.indptr, dtype=np.int32)))
+            rptr = np.zeros(n + 1, dtype=np.int32); np.cumsum(np.bincount(indices, minlength=n), out=rptr[1:])
+            self._reverse = (array("i", rptr.tobytes()), array("i", src[eid].tobytes()), array("i", eid.tobytes()))
+        return self._reverse
+
+
+def _dijkstra(g: Graph, starts: List[Tuple[int, float, int]], dest: int, extra,
+              banned_v=(), banned_e=(), h=None,
+              targets: Optional[Dict[int, float]] = None) -> Tuple[Dict[int, float], Dict[int, int]]:
+    """Dijkstra (A* when `h` is given) from `starts` = [(vertex, cost, parent)]; settles
+    everything reachable when `dest` is -1. With `targets` = {vertex: exit cost} it stops
+    once no target can still beat the best dist + exit cost. Returns the (dist, parent) labels."""
+    indptr, indices, cost = g.indptr, g.indices, g.costs(extra)
+    dist: Dict[int, float] = {}; parent: Dict[int, int] = {}; astar = h is not None; inf = float("inf")
+    best = inf
+    for v, c, p in starts:
+        if v not in banned_v and c < dist.get(v, inf):
+            dist[v] = c; parent[v] = p
+    heap = [(c + (h[v] if astar else 0.0), v) for v, c in dist.items()]; heapq.heapify(heap)
+    done = set()
+    while heap:
+        key, u = heapq.heappop(heap)
+        if u in done: continue
+        if u == dest or key >= best: break
+        done.add(u); d = dist[u]
+        if targets and u in targets: best = min(best, d + targets[u])
+        for e in range(indptr[u], indptr[u + 1]):
+            v = indices[e]
+            if v in banned_v or (banned_e and (u, v) in banned_e): continue
+            nd = d + cost[e]
+            if nd < dist.get(v, inf):
+                dist[v] = nd; parent[v] = u
+                heapq.heappush(heap, (nd + (h[v] if astar else 0.0), v))
+    return dist, parent
+
+
+def tree_path(parent: Dict[int, int], dest: int) -> List[int]:
+    path, cur = [], dest
+    while cur != -1:
+        path.append(cur); cur = parent[cur]
+    path.reverse()
+    return path
+
+
+def _search(g: Graph, starts: List[Tuple[int, float, int]], dest: int, extra,
+            banned_v=(), banned_e=(), h=None) -> Optional[Tuple[List[int], float]]:
+    dist, parent = _dijkstra(g, starts, dest, extra, banned_v, banned_e, h)
+    if dest not in dist: return None
+    return tree_path(parent, dest), dist[dest]
+
+
+def _origin_starts(g: Graph, origin: int, cost: float = 0.0) -> List[Tuple[int, float, int]]:
+    # the first boarding at the origin is free, but not at a closed platform
+    return [(origin, cost, -1)] + [(v, cost, origin) for v in g.boardable(origin)]
+
+
+def shortest_path(g: Graph, origin: int, dest: int,
+                  weights: Weights = Weights()) -> Optional[Tuple[List[int], float]]:
+    """Dijkstra from stop `origin` to stop `dest`; returns (vertex path, minutes)."""
+    return _search(g, _origin_starts(g, origin), dest, weights.extra())
+
+
+def shortest_tree(g: Graph, origin: int,
+                  weights: Weights = Weights()) -> Tuple[Dict[int, float], Dict[int, int]]:
+    """One-to-all Dijkstra from stop `origin`; read paths out with tree_path."""
+    return _dijkstra(g, _origin_starts(g, origin), -1, weights.extra())
+
+
+def shortest_path_between(g: Graph, origins: Dict[int, float], dests: Dict[int, float],
+                          weights: Weights = Weights()) -> Optional[Tuple[List[int], float]]:
+    """One search from several origin stops to several destination stops, each with an
+    access/egress cost ({stop: minutes}); returns the (vertex path, minutes) of the cheapest
+    origin + ride + destination combination, costs at both ends included."""
+    starts = [s for o, c in origins.items() for s in _origin_starts(g, o, c)]
+    dist, parent = _dijkstra(g, starts, -1, weights.extra(), targets=dests)
+    reached = [(dist[t] + c, t) for t, c in dests.items() if t in dist]
+    if not reached: return None
+    minutes, t = min(reached)
+    return tree_path(parent, t), minutes
+
+
+def distances_to(g: Graph, dest: int, weights: Weights = Weights()) -> Tuple[List[float], List[int]]:
+    """Reverse Dijkstra: minutes from every vertex to `dest` and the next vertex towards it."""
+    rptr, src, eid = g.reverse(); cost = g.costs(weights.extra())
+    d = [float("inf")] * g.n_vertices; nxt = [-1] * g.n_vertices
+    d[dest] = 0.0; heap = [(0.0, dest)]
+    while heap:
+        du, u = heapq.heappop(heap)
+        if du > d[u]: continue
+        for i in range(rptr[u], rptr[u + 1]):
+            v = src[i]; w = cost[eid[i]]
+            if du + w < d[v]:
+                d[v] = du + w; nxt[v] = u
+                heapq.heappush(heap, (d[v], v))
+    return d, nxt
+
+
+def _path_cost(g: Graph, path: List[int], extra) -> List[float]:
+    """Cumulative minutes along a vertex path (free first boarding at the origin)."""
+    acc = [0.0]
+    for i, (u, v) in enumerate(zip(path, path[1:])):
+        e = g.edge(u, v)
+        free = i == 0 and g.kinds[e] == BOARD
+        acc.append(acc[-1] + (0.0 if free else g.minutes[e] + extra[g.kinds[e]]))
+    return acc
+
+
+def _stop_sequence(g: Graph, path: List[int]) -> List[int]:
+    seq: List[int] = []
+    for v in path:
+        s = g.vertex_stop[v]
+        if not seq or seq[-1] != s: seq.append(s)
+    return seq
+
+
+def _ride_next(g: Graph, p: int) -> set:
+    """Stops a platform rides to directly."""
+    return {g.vertex_stop[g.indices[e]] for e in range(g.indptr[p], g.indptr[p + 1]) if g.kinds[e] == RIDE}
+
+
+def _same_segment_boards(g: Graph, p: int) -> set:
+    """Board edges at p's stop onto another route that rides on to a stop p rides to: switching
+    there only swaps the line name for the same ride (Green-E -> Green-B at Copley)."""
+    s = g.vertex_stop[p]; nxt = _ride_next(g, p)
+    return {(s, q) for q in g.platforms.get(s, ()) if q != p and _ride_next(g, q) & nxt}
+
+
+def _itinerary_key(g: Graph, path: List[int]) -> Tuple[Tuple[int, ...], Tuple[Tuple[int, bool], ...]]:
+    """(stop sequence, where each leg starts and whether it walks). Paths that agree on both
+    make the same trip to a rider: rides over the same stops with the same changes differ
+    only in which branch's name is on the train (Green-B/C/D from Kenmore)."""
+    stops, hops = path_to_stops(g, path); legs: List[Tuple[int, bool]] = []; last = None
+    for i, v in enumerate(hops):
+        r = g.route_name(v)
+        if r != last: legs.append((i, r == "walk")); last = r
+    return tuple(stops), tuple(legs)
+
+
+def k_shortest_paths(g: Graph, origin: int, dest: int, k: int, weights: Weights = Weights(),
+                     h: Optional[List[float]] = None) -> List[Tuple[List[int], float]]:
+    """
+    Yen's algorithm: up to k loop-free itineraries ranked by minutes, each with a
+    different stop sequence or different legs (see _itinerary_key).
+
+    Spur searches run on the shared CSR with banned vertex/edge sets instead of
+    a copied graph, and use the distance-to-`dest` labels of the full graph as
+    an A* heuristic; removing edges only lengthens paths, so those labels stay
+    admissible and the spur searches expand little beyond the answer. A spur
+    that leaves a ride may not board a route riding the same next segment, so
+    trunk branches (Green-B/C/D/E) don't come back as alternatives.
+    """
+    extra = weights.extra()
+    if h is None: h = distances_to(g, dest, weights)[0]
+    first = _search(g, _origin_starts(g, origin), dest, extra, h=h)
+    if not first: return []
+    accepted = [first]; seen = {tuple(first[0])}; candidates: List[Tuple[float, List[int]]] = []
+    keys = {_itinerary_key(g, first[0])}
+    while len(accepted) < k:
+        prev = accepted[-1][0]; acc = _path_cost(g, prev, extra)
+        for i in range(len(prev) - 1):
+            spur, root = prev[i], prev[:i + 1]
+            banned_e = {(p[i], p[i + 1]) for p, _ in accepted if len(p) > i + 1 and p[:i + 1] == root}
+            # riding into the spur (on a platform, or just alighted at its hub)
+            riding = spur if spur >= g.n_stops else (root[-2] if i and root[-2] >= g.n_stops else -1)
+            if riding != -1: banned_e |= _same_segment_boards(g, riding)
+            root_stops = {g.vertex_stop[v] for v in root[:-1]} - {g.vertex_stop[spur]}
+            banned_v = set(root[:-1])
+            for s in root_stops:
+                banned_v.add(s); banned_v.update(g.platforms.get(s, ()))
+            starts = _origin_starts(g, spur) if i == 0 else [(spur, acc[i], -1)]
+            if i == 0: starts = [(v, c, p) for v, c, p in starts if (spur, v) not in banned_e or p == -1]
+            res = _search(g, starts, dest, extra, banned_v, banned_e, h)
+            if not res: continue
+            path = root[:-1] + res[0]
+            if tuple(path) in seen: continue
+            stops = _stop_sequence(g, path)
+            if len(stops) != len(set(stops)): continue
+            seen.add(tuple(path)); heapq.heappush(candidates, (res[1], path))
+        while candidates:
+            cost, path = heapq.heappop(candidates)
+            key = _itinerary_key(g, path)
+            if key not in keys: break
+        else:
+            break
+        keys.add(key); accepted.append((path, cost))
+    return accepted
+
+
+def path_to_stops(g: Graph, path: List[int]) -> Tuple[List[int], List[int]]:
+    """Collapse a vertex path into stop ids and the vertex carrying each hop (a hub for walks)."""
+    stops = [g.vertex_stop[path[0]]]; hops: List[int] = []
+    for u, v in zip(path, path[1:]):
+        u_hub, v_hub = u < g.n_stops, v < g.n_stops
+        if u_hub == v_hub:   # hub -> hub is a walk, platform -> platform a ride
+            stops.append(g.vertex_stop[v]); hops.append(v)
+    return stops, hops
+
+
+def display(g: Graph, stops: List[int], hops: List[int]) -> Tuple[List[str], List[str]]:
+    """Resolve a path_to_stops result into the (names, routes) `_compress_into_legs` renders."""
+    return [g.stop_names[s] for s in stops], [g.route_name(v) for v in hops]
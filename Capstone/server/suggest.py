@@ -0,0 +1,87 @@
+# Capstone/server/suggest.py
+"""
+Prefix autocomplete over stop names and aliases.
+
+Every word-start of every stop name ("kendall mit", "mit") and every alias
+key goes into one sorted array; a prefix is a contiguous range found with two
+bisects. Matches are ranked by popularity (lines serving the stop plus its
+walking transfers, a stand-in until ridership data lands) with name-start
+matches ahead of mid-name ones. One- and two-character prefixes, whose ranges
+are the widest, are answered from a table filled at build time, so a
+keystroke never scans more than a bounded slice.
+"""
+from __future__ import annotations
+
+import heapq
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .resolver import _tokens
+
+SHORT_PREFIX = 2
+MAX_SCAN = 4096
+TOP_K = 20
+
+
+def fold(text: str) -> str:
+    return " ".join(_tokens(text))
+
+
+class PrefixIndex:
+    """Sorted-array prefix index; built once per network snapshot."""
+
+    def __init__(self, stop_names: List[str], aliases: Dict[str, str], popularity: Dict[str, float]):
+        canonical = {n.lower(): n for n in stop_names}
+        rows: Dict[Tuple[str, str], int] = {}   # (key, stop) -> 0 name start, 1 mid-name or alias
+        for name in stop_names:
+            toks = fold(name).split()
+            for i in range(len(toks)):
+                key = " ".join(toks[i:]); rows[(key, name)] = min(rows.get((key, name), 1), 0 if i == 0 else 1)
+        for alias, target in aliases.items():
+            stop = canonical.get(target.lower())
+            if stop: rows.setdefault((fold(alias), stop), 1)
+        entries = sorted(rows.items())
+        self.keys: List[str] = [k for (k, _), _ in entries]
+        self.stops: List[str] = [s for (_, s), _ in entries]
+        # smaller ranks first: name start, then popularity, then name
+        self.rank: List[Tuple[int, float, str]] = [(mid, -popularity.get(s, 0.0), s) for (_, s), mid in entries]
+        self.short: Dict[str, List[str]] = {}
+        for key in self.keys:
+            for n in range(1, SHORT_PREFIX + 1):
+                p = key[:n]
+                if len(p) == n and p not in self.short: self.short[p] = self._scan(p, TOP_K)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        short = list(self.short)
+        return {"keys": np.array(self.keys, dtype=str), "stops": np.array(self.stops, dtype=str),
+                "mid": np.array([r[0] for r in self.rank], dtype=np.int8),
+                "neg_pop": np.array([r[1] for r in self.rank], dtype=np.float64),
+                "short": np.array(short, dtype=str),
+                "short_ptr": np.cumsum([0] + [len(self.short[p]) for p in short], dtype=np.int64),
+                "short_names": np.array([n for p in short for n in self.short[p]], dtype=str)}
+
+    @classmethod
+    def from_arrays(cls, z) -> "PrefixIndex":
+        ix = cls.__new__(cls)
+        ix.keys, ix.stops = z["keys"].tolist(), z["stops"].tolist()
+        ix.rank = list(zip(z["mid"].tolist(), z["neg_pop"].tolist(), ix.stops))
+        ptr, names = z["short_ptr"].tolist(), z["short_names"].tolist()
+        ix.short = {p: names[ptr[j]:ptr[j + 1]] for j, p in enumerate(z["short"].tolist())}
+        return ix
+
+    def _scan(self, prefix: str, limit: int) -> List[str]:
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + "\uffff", lo, min(len(self.keys), lo + MAX_SCAN))
+        best: Dict[str, Tuple[int, float, str]] = {}
+        for i in range(lo, hi):
+            s = self.stops[i]
+            if s not in best or self.rank[i] < best[s]: best[s] = self.rank[i]
+        return [r[2] for r in heapq.nsmallest(limit, best.values())]
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[str]:
+        p = fold(prefix)
+        if not p: return []
+        if len(p) <= SHORT_PREFIX and limit <= TOP_K: return self.short.get(p, [])[:limit]
+        return self._scan(p, limit)
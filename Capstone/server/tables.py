@@ -0,0 +1,147 @@
+# Capstone/server/tables.py
+"""
+Precomputed all-pairs routing tables for the default planner weights.
+
+For every target stop the builder runs one reverse Dijkstra over the CSR graph
+and records, for every vertex, the minutes to the target and the next vertex
+on the cheapest path. The two matrices (n_vertices x n_stops) are written as
+plain .npy files so every uvicorn worker can np.load them with mmap_mode="r"
+and share one copy of the pages through the OS page cache.
+
+Each build lives in its own directory named by the network fingerprint
+(tables/<fingerprint>/{dist,next_hop}.npy + meta.json). A writer fills a
+private temp directory and renames it into place in one step, so readers
+never mix files from two builds and processes saving at once don't collide;
+a directory, once there, is never modified.
+
+Build offline after changing data/lines or transfers.json:
+
+    python -m Capstone.server.tables        # or: python -m server.tables
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .routing import Graph, Weights, distances_to
+
+TABLES_FORMAT = 2
+# fingerprint directories kept after a save, newest first; older ones are pruned
+TABLES_KEEP = int(os.getenv("PLANNER_TABLES_KEEP", "3"))
+
+
+class RoutingTables:
+    """Distance / next-hop matrices indexed by [vertex, target stop]."""
+
+    def __init__(self, dist: np.ndarray, next_hop: np.ndarray, fingerprint: str,
+                 patch: Optional[Dict[int, Tuple[np.ndarray, np.ndarray]]] = None):
+        self.dist, self.next_hop, self.fingerprint = dist, next_hop, fingerprint
+        # target -> (dist, next_hop) columns recomputed for a disruption overlay
+        self.patch = patch or {}
+
+    def column(self, t: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self.patch.get(t) or (self.dist[:, t], self.next_hop[:, t])
+
+    def patched(self, columns: Dict[int, Tuple[np.ndarray, np.ndarray]]) -> "RoutingTables":
+        """Tables sharing the mapped matrices with `columns` replacing whole target columns."""
+        return RoutingTables(self.dist, self.next_hop, self.fingerprint, columns)
+
+    @staticmethod
+    def solve_column(g: Graph, t: int, weights: Weights = Weights(),
+                     hop_dtype=np.int32) -> Tuple[np.ndarray, np.ndarray]:
+        d, nxt = distances_to(g, t, weights)
+        return np.array(d, dtype=np.float32), np.array(nxt, dtype=hop_dtype)
+
+    @classmethod
+    def build(cls, g: Graph, weights: Weights = Weights(), fingerprint: str = "") -> "RoutingTables":
+        n_v, n_s = g.n_vertices, g.n_stops
+        dist = np.full((n_v, n_s), np.inf, dtype=np.float32)
+        next_hop = np.full((n_v, n_s), -1, dtype=np.int16 if n_v < 2 ** 15 else np.int32)
+        for t in range(n_s):
+            dist[:, t], next_hop[:, t] = cls.solve_column(g, t, weights, next_hop.dtype)
+        return cls(dist, next_hop, fingerprint)
+
+    def save(self, out_dir: Path) -> Path:
+        """Write to out_dir/<fingerprint>/ and return it. Files are written to a directory of
+        this writer's own and renamed into place together; if another process got there first
+        its identical build is kept. Mapped tables keep their inodes when old builds are pruned."""
+        out_dir.mkdir(parents=True, exist_ok=True)
+        final = out_dir / self.fingerprint
+        tmp = out_dir / f".tmp-{os.getpid()}-{uuid.uuid4().hex}"
+        try:
+            tmp.mkdir()
+            for name, arr in (("dist.npy", self.dist), ("next_hop.npy", self.next_hop)):
+                with open(tmp / name, "wb") as f: np.save(f, arr)
+            meta = {"format": TABLES_FORMAT, "fingerprint": self.fingerprint,
+                    "shape": list(self.dist.shape)}
+            (tmp / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+            for attempt in range(3):
+                try:
+                    os.rename(tmp, final); break
+                except OSError:
+                    if final.is_dir(): break   # a concurrent save of the same build won
+                    if attempt == 2: raise     # ... and was pruned since: try again
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        _prune(out_dir, keep=final)
+        return final
+
+    @classmethod
+    def load(cls, out_dir: Path, fingerprint: str) -> Optional["RoutingTables"]:
+        """Memory-map saved tables; None when missing, built from other data or inconsistent."""
+        d = out_dir / fingerprint
+        try:
+            meta = json.loads((d / "meta.json").read_text(encoding="utf-8"))
+            if meta.get("format") != TABLES_FORMAT or meta.get("fingerprint") != fingerprint:
+                return None
+            dist, next_hop = np.load(d / "dist.npy", mmap_mode="r"), np.load(d / "next_hop.npy", mmap_mode="r")
+            if list(dist.shape) != meta.get("shape") or next_hop.shape != dist.shape:
+                return None
+            return cls(dist, next_hop, fingerprint)
+        except (OSError, ValueError):
+            return None
+
+    def route(self, g: Graph, origin: int, dest: int) -> Optional[Tuple[List[int], float]]:
+        """Walk the next-hop column for `dest`; same contract as routing.shortest_path."""
+        col_d, col_n = self.column(dest)
+        # the first boarding at the origin is free, so start from the best open platform
+        start = min([origin] + g.boardable(origin), key=lambda v: col_d[v])
+        if not np.isfinite(col_d[start]): return None
+        path = [start]
+        while path[-1] != dest:
+            if len(path) > g.n_vertices: return None
+            path.append(int(col_n[path[-1]]))
+        return path, float(col_d[start])
+
+
+def _prune(out_dir: Path, keep: Path) -> None:
+    """Drop all but the TABLES_KEEP newest builds, temp directories older than an hour and
+    the files of the old single-build layout."""
+    import time
+    try:   # other processes prune the same directory
+        builds = sorted((p for p in out_dir.iterdir() if p.is_dir() and not p.name.startswith(".")),
+                        key=lambda p: p.stat().st_mtime, reverse=True)
+        stale = [p for p in builds[TABLES_KEEP:] if p != keep]
+        stale += [p for p in out_dir.glob(".tmp-*") if p.stat().st_mtime < time.time() - 3600]
+    except OSError:
+        return
+    for p in stale: shutil.rmtree(p, ignore_errors=True)
+    for name in ("dist.npy", "next_hop.npy", "meta.json"):   # format 1 kept one build at the top
+        (out_dir / name).unlink(missing_ok=True)
+
+
+def main():
+    from .app import build_graph, network_fingerprint, TABLES_DIR
+    tables = RoutingTables.build(build_graph(), fingerprint=network_fingerprint())
+    out = tables.save(TABLES_DIR)
+    print(f"wrote {tables.dist.shape[0]}x{tables.dist.shape[1]} routing tables to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Capstone/tests/test_batch.py
+import importlib
+import io
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from Capstone.server import app as A
+from Capstone.server.disruptions import Overlay
+from Capstone.server.network import NetworkSnapshot
+from Capstone.server.raptor import Raptor
+from Capstone.server.routing import Graph, Weights, shortest_path
+from Capstone.server.tables import RoutingTables
+
+LINES = {r: {"route_id": r, "stops": s} for r, s in {
+    "Green-D": ["Riverside", "Kenmore", "Copley", "Arlington", "Park"],
+    "Orange": ["Back Bay", "Tufts", "Downtown", "State"],
+    "Blue": ["State", "Aquarium"],
+}.items()}
+TRANSFERS = {"pairs": [["Copley", "Back Bay", 4], ["Park", "Downtown", 3]]}
+
+
+@pytest.fixture
+def planner(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(Path(__file__).resolve().parents[1]))   # agents import shared.*
+    RoutingTables.build(Graph.from_network(LINES, TRANSFERS), fingerprint="fp").save(tmp_path)
+    ov = Overlay(NetworkSnapshot({}, TRANSFERS, LINES, "fp", "v1", tmp_path))
+    monkeypatch.setattr(A, "_overlay", ov)
+    return ov, TestClient(importlib.import_module("Capstone.agents.planner.main").app)
+
+
+def test_batch_rows_match_single_searches(planner):
+    ov, c = planner; g = ov.graph
+    pairs = [("Riverside", "Aquarium"), ("Nowhere", "Park"), ("Riverside", "Tufts"), ("State", "Kenmore"),
+             ("Riverside", "Riverside")]
+    for penalty in (None, 1.0):   # the tables, then one Dijkstra tree per origin
+        body = {"pairs": [{"origin": o, "destination": d} for o, d in pairs]}
+        if penalty is not None: body["transfer_penalty"] = penalty
+        r = c.post("/plan/batch", json=body)
+        assert r.status_code == 200
+        rows = [json.loads(line) for line in r.text.splitlines()]
+        assert rows[-1]["done"] and rows[-1]["pairs"] == 5 and rows[-1]["origins"] == 2
+        by_i = {row["i"]: row for row in rows[:-1]}
+        assert sorted(by_i) == list(range(5)) and not by_i[1]["ok"]
+        w = Weights() if penalty is None else Weights(transfer_penalty=penalty)
+        for i in (0, 2, 3):
+            o, d = pairs[i]
+            assert by_i[i]["ok"] and by_i[i]["legs"][-1]["to"] == d
+            assert by_i[i]["minutes"] == pytest.approx(shortest_path(g, g.lookup(o), g.lookup(d), w)[1], abs=0.05)
+
+
+def test_matrix_json_and_npy_follow_the_request_order(planner):
+    ov, c = planner; g = ov.graph
+    origins, dests = ["Aquarium", "Riverside"], ["Park", "State", "Riverside"]
+    r = c.get("/matrix", params={"origins": origins, "destinations": dests})
+    assert r.status_code == 200
+    out = r.json()
+    assert out["origins"] == origins and out["destinations"] == dests
+    raptor = Raptor(g, LINES, TRANSFERS)
+    for a, o in enumerate(origins):
+        for b, d in enumerate(dests):
+            front = raptor.pareto(g.lookup(o), g.lookup(d))
+            want = (front[0]["transfers"], front[-1]["stops"]) if front and o != d else (0, 0)
+            assert (out["transfers"][a][b], out["stops"][a][b]) == want, (o, d)
+    npy = np.load(io.BytesIO(c.post("/matrix", json={"origins": origins, "destinations": dests,
+                                                       "format": "npy"}).content))
+    assert npy.shape == (2, 2, 3) and npy[0].tolist() == out["stops"] and npy[1].tolist() == out["transfers"]
+    assert c.get("/matrix", params={"origins": ["Nowhere"]}).status_code == 404
@@ -0,0 +1,64 @@
+# Capstone/tests/test_chat.py
+import asyncio
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from Capstone.server import app as A
+
+
+def test_alternatives_bounded_and_rendered_with_one_separator():
+    for n in (0, 11):
+        with pytest.raises(ValidationError): A.ChatRequest(messages=[], alternatives=n)
+    alts = [{"minutes": 12, "text": A.render_legs_human([{"route_id": "Red", "from": "A", "to": "B", "stops_count": 2},
+                                                         {"route_id": "Orange", "from": "B", "to": "C", "stops_count": 3}])},
+            {"minutes": 15, "text": "Take **Blue**: A → C (~4 stops)"}]
+    text = A._plan_text({"alternatives": alts})
+    assert "\n" not in text
+    assert text.split("\\n") == ["Option 1 (~12 min):", "Take **Red**: A → B (~2 stops)",
+                                 "Take **Orange**: B → C (~3 stops)", "", "Option 2 (~15 min):",
+                                 "Take **Blue**: A → C (~4 stops)"]
+
+
+def _stream(monkeypatch, text, normalize_delay):
+    async def ask_plan(origin, destination, alternatives=1):
+        ok = origin == "Kenmore"   # only the planner's own resolution of "kenmore sq" finds a route
+        return {"ok": ok, "origin": "Kenmore", "destination": "Park Street",
+                "legs": [{"route_id": "Green-D", "from": "Kenmore", "to": "Park Street", "stops_count": 4}] if ok else [],
+                "text": "Take **Green-D**: Kenmore → Park Street (~4 stops)" if ok else ""}
+
+    async def ask_normalize(name):
+        await asyncio.sleep(normalize_delay)
+        return {"normalized": {"kenmore sq": "Kenmore"}.get(name, name)}
+
+    async def ask_alerts(route):
+        return {"count": 0, "text": "No alerts."}
+
+    matcher = A.IntentMatcher(["Kenmore", "Park Street", "Green-D"], {})
+    for k, v in (("ask_plan", ask_plan), ("ask_normalize", ask_normalize), ("ask_alerts", ask_alerts),
+                 ("intent_matcher", lambda: matcher), ("CHAT_SPECULATIVE_PLAN", True)):
+        monkeypatch.setattr(A, k, v)
+
+    async def collect():
+        req = A.ChatRequest(messages=[A.ChatMessage(role="user", content=text)])
+        return [(e.split("\n")[0][7:], json.loads(e.split("\n")[1][6:])) async for e in A._chat_events(req)]
+    return asyncio.run(collect())
+
+
+def test_stream_reports_both_stops_when_the_speculative_plan_wins(monkeypatch):
+    # "Kenmore" resolves to itself, so the speculative plan is the plan and wins long before normalization
+    events = _stream(monkeypatch, "directions from Kenmore to Park Street", normalize_delay=5)
+    assert [n for n, _ in events] == ["intent", "stop", "stop", "plan", "alerts", "done"]
+    assert [(d["end"], d["normalized"]) for n, d in events if n == "stop"] == [("origin", "Kenmore"),
+                                                                            ("destination", "Park Street")]
+    assert events[-1][1]["timings"]["winner"] == "speculative"
+
+
+def test_stream_reports_normalized_stops_before_the_plan(monkeypatch):
+    events = _stream(monkeypatch, "directions from kenmore sq to Park Street", normalize_delay=0)
+    names = [n for n, _ in events]
+    assert names == ["intent", "stop", "stop", "plan", "alerts", "done"]
+    assert {d["end"]: (d["input"], d["normalized"]) for n, d in events if n == "stop"} == {
+        "origin": ("kenmore sq", "Kenmore"), "destination": ("Park Street", "Park Street")}
+    assert events[-1][1]["timings"]["winner"] == "normalized"
@@ -0,0 +1,104 @@
+# Capstone/tests/test_csa.py
+import random
+import zipfile
+
+import numpy as np
+
+from Capstone.server import csa
+from Capstone.server.gtfs import Timetable
+
+WEEKDAY, SATURDAY = 20251014, 20251018   # a Tuesday and a Saturday
+
+
+def _hhmmss(secs: int) -> str:
+    return f"{secs // 3600:02d}:{secs % 3600 // 60:02d}:{secs % 60:02d}"
+
+
+def _feed(path, seed=7, n_stops=14):
+    """Small random feed: a few lines, two service patterns, a holiday exception and some footpaths."""
+    rnd = random.Random(seed)
+    files = {"stops.txt": ["stop_id,stop_name,parent_station,stop_lat,stop_lon"],
+             "trips.txt": ["route_id,service_id,trip_id"],
+             "stop_times.txt": ["trip_id,arrival_time,departure_time,stop_id,stop_sequence"],
+             "transfers.txt": ["from_stop_id,to_stop_id,transfer_type,min_transfer_time"],
+             "calendar.txt": ["service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,start_date,end_date",
+                              "WK,1,1,1,1,1,0,0,20250101,20251231", "WE,0,0,0,0,0,1,1,20250101,20251231"],
+             "calendar_dates.txt": ["service_id,date,exception_type", f"WE,{WEEKDAY},1"]}
+    files["stops.txt"] += [f"S{i},Stop {i},,42.{i:02d},-71.{i:02d}" for i in range(n_stops)]
+    for r in range(5):
+        line = rnd.sample(range(n_stops), rnd.randint(3, 6))
+        hops = [rnd.randint(1, 6) * 60 for _ in line[1:]]
+        for k in range(rnd.randint(6, 12)):
+            service = "WK" if k % 3 else "WE"
+            t = 7 * 3600 + rnd.randint(0, 90) * 60
+            trip = f"R{r}-{k}"
+            files["trips.txt"].append(f"R{r},{service},{trip}")
+            for seq, stop in enumerate(line):
+                dwell = 60 if seq and rnd.random() < 0.3 else 0
+                files["stop_times.txt"].append(f"{trip},{_hhmmss(t)},{_hhmmss(t + dwell)},S{stop},{seq + 1}")
+                t += dwell + (hops[seq] if seq < len(hops) else 0)
+    for _ in range(6):
+        a, b = rnd.sample(range(n_stops), 2)
+        files["transfers.txt"].append(f"S{a},S{b},2,{rnd.randint(1, 4) * 60}")
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, lines in files.items(): zf.writestr(name, "\n".join(lines) + "\n")
+    return path
+
+
+def _naive(tt: Timetable, origin: int, depart: int, date=None) -> np.ndarray:
+    """Textbook CSA, one connection at a time, footpaths closed transitively."""
+    earliest = np.full(tt.n_stops, csa.UNREACHED, dtype=np.int64)
+    active = tt.active_trips(date) if date is not None else np.ones(len(tt.trip_ids), bool)
+
+    def walk(s):
+        todo = [s]
+        while todo:
+            u = todo.pop()
+            for f in np.nonzero(tt.fp_from == u)[0]:
+                v, t = int(tt.fp_to[f]), int(earliest[u] + tt.fp_secs[f])
+                if t < earliest[v]: earliest[v] = t; todo.append(v)
+
+    earliest[origin] = depart; walk(origin)
+    on_trip = set()
+    for c in range(tt.n_connections):
+        dep, trip = int(tt.conn_dep[c]), int(tt.conn_trip[c])
+        if dep < depart or dep >= depart + csa.HORIZON_SECS or not active[trip]: continue
+        if trip in on_trip or earliest[tt.conn_dep_stop[c]] <= dep:
+            on_trip.add(trip)
+            a = int(tt.conn_arr_stop[c])
+            if tt.conn_arr[c] < earliest[a]: earliest[a] = tt.conn_arr[c]; walk(a)
+    return earliest
+
+
+def test_chunked_scan_matches_naive_scan(tmp_path, monkeypatch):
+    tt = Timetable.from_zip(_feed(tmp_path / "feed.zip"))
+    assert tt.n_connections > 50 and len(tt.fp_from) > 0
+    monkeypatch.setattr(csa, "CHUNK", 16)   # many blocks, several passes within some of them
+    checked = 0
+    for date in (None, WEEKDAY, SATURDAY):
+        for depart in (6 * 3600, 7 * 3600 + 1200, 8 * 3600):
+            for o in range(tt.n_stops):
+                want = _naive(tt, o, depart, date)
+                for d in range(tt.n_stops):
+                    if d == o: continue
+                    got = csa.earliest_arrival(tt, np.array([o]), np.array([d]), depart, date)
+                    if want[d] == csa.UNREACHED:
+                        assert got is None, (date, depart, o, d)
+                        continue
+                    assert got["duration_minutes"] == (want[d] - depart) // 60, (date, depart, o, d)
+                    assert got["legs"][0]["from"] == f"Stop {o}" and got["legs"][-1]["to"] == f"Stop {d}"
+                    checked += 1
+    assert checked > 100
+
+
+def test_calendar_exception_and_cache_roundtrip(tmp_path):
+    feed, cache = _feed(tmp_path / "feed.zip"), tmp_path / "cache" / "feed.npz"
+    tt = Timetable.load(feed, cache)
+    again = Timetable.load_cached(cache, tt.source_sha)
+    assert again is not None and np.array_equal(again.conn_dep, tt.conn_dep)
+    assert Timetable.load_cached(cache, "other") is None
+    weekend = tt.service_ids[tt.trip_service] == "WE"
+    assert tt.active_trips(SATURDAY)[weekend].all()
+    assert tt.active_trips(WEEKDAY).all()          # calendar_dates adds the weekend service
+    assert not tt.active_trips(20251015)[weekend].any()
+    assert list(tt.stops_named("stop 3")) == [3]
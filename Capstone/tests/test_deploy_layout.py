@@ -0,0 +1,45 @@
+# Capstone/tests/test_deploy_layout.py
+"""linode_deploy_mbta_only.sh ships the contents of Capstone/ as the import root and
+rewrites `from Capstone.` imports with sed; the services must import from that tree."""
+import os
+import re
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+CAPSTONE = Path(__file__).resolve().parent.parent
+SCRIPT = CAPSTONE / "linode_deploy_mbta_only.sh"
+ROOT = "/home/ubuntu/mbta-agent"
+
+
+def _deploy_tree(dest: Path) -> Path:
+    shutil.copytree(CAPSTONE, dest, ignore=shutil.ignore_patterns("__pycache__", "*.pyc", ".env", "compiled", "tests"))
+    # replay the script's import rewrites on the copy
+    for expr, paths in re.findall(r"^sed -i '(s/.+?/g)' (.+)$", SCRIPT.read_text(encoding="utf-8"), re.M):
+        _, pat, repl, _ = expr.split("/")
+        for glob in paths.split():
+            if not glob.startswith(ROOT): continue
+            for f in dest.glob(glob[len(ROOT) + 1:]):
+                f.write_text(re.sub(pat, repl, f.read_text(encoding="utf-8")), encoding="utf-8")
+    return dest
+
+
+def test_services_import_in_the_deploy_layout(tmp_path):
+    tree = _deploy_tree(tmp_path / "mbta-agent")
+    mods = ["server.app", "server.tables", "agents.planner.main", "agents.stopfinder.main", "agents.alerts.main"]
+    env = {**os.environ, "PYTHONPATH": str(tree), "MBTA_API_KEY": "smoke"}
+    r = subprocess.run([sys.executable, "-c", "import " + ", ".join(mods)], cwd=tree, env=env,
+                       capture_output=True, text=True, timeout=120)
+    assert r.returncode == 0, r.stderr
+
+
+def test_local_agents_resolve_in_the_deploy_layout(tmp_path):
+    tree = _deploy_tree(tmp_path / "mbta-agent")
+    env = {**os.environ, "PYTHONPATH": str(tree), "MBTA_API_KEY": "smoke", "A2A_MODE": "local"}
+    code = ("import importlib, server.app as a\n"
+            "mods = [x.module for x in a.AGENTS.local.values()]\n"
+            "assert mods == ['agents.alerts.main', 'agents.planner.main', 'agents.stopfinder.main'], mods\n"
+            "for m in mods: importlib.import_module(m)")
+    r = subprocess.run([sys.executable, "-c", code], cwd=tree, env=env, capture_output=True, text=True, timeout=120)
+    assert r.returncode == 0, r.stderr
@@ -0,0 +1,25 @@
+# Capstone/tests/test_direct.py
+from Capstone.server import app as A
+from Capstone.server.disruptions import Overlay
+from Capstone.server.network import NetworkSnapshot
+
+LINES = {r: {"route_id": r, "stops": s} for r, s in {
+    "Green-D": ["Riverside", "Kenmore", "Copley", "Arlington", "Park"],
+    "Orange": ["Downtown", "State", "Haymarket", "North"],
+}.items()}
+TRANSFERS = {"pairs": [["Park", "Downtown", 3]]}
+# stops about 1 km apart heading east, then north along Orange
+COORDS = {"Riverside": (42.35, -71.12), "Kenmore": (42.35, -71.108), "Copley": (42.35, -71.096),
+          "Arlington": (42.35, -71.084), "Park": (42.35, -71.072), "Downtown": (42.351, -71.070),
+          "State": (42.36, -71.070), "Haymarket": (42.369, -71.070), "North": (42.378, -71.070)}
+
+
+def test_direct_plan_reports_travel_minutes_without_penalties(tmp_path):
+    ov = Overlay(NetworkSnapshot({}, TRANSFERS, LINES, "fp", "v1", tmp_path, coords=COORDS))
+    out = A.plan_direct(42.35, -71.1205, 42.3785, -71.0705, radius_m=300, overlay=ov)
+    assert out["mode"] == "transit", out
+    legs = out["legs"]
+    assert [l["mode"] for l in legs] == ["walk", "Green-D", "walk", "Orange", "walk"]
+    # 2 min a stop and the 3 min transfer walk; no boarding or walking penalty in any of them
+    assert [l["est_minutes"] for l in legs[1:-1]] == [8, 3, 6]
+    assert out["metrics"]["minutes"] == sum(l["est_minutes"] for l in legs)
@@ -0,0 +1,60 @@
+# Capstone/tests/test_disruptions.py
+import numpy as np
+
+from Capstone.server.disruptions import Overlay, parse_alerts
+from Capstone.server.network import NetworkSnapshot
+from Capstone.server.routing import Graph, shortest_path
+from Capstone.server.tables import RoutingTables
+
+# keyed by route id, as data/lines is
+LINES = {r: {"route_id": r, "stops": s} for r, s in {
+    "Green-B": ["Kenmore", "Copley", "Arlington", "Park", "Gov"],
+    "Green-D": ["Riverside", "Kenmore", "Copley", "Arlington", "Park", "Gov"],
+    "Orange": ["Back Bay", "Tufts", "Downtown", "State"],
+    "Blue": ["Gov", "State", "Aquarium"],
+}.items()}
+TRANSFERS = {"pairs": [["Copley", "Back Bay", 4], ["Park", "Downtown", 3]]}
+
+
+def _overlay(tmp_path) -> Overlay:
+    RoutingTables.build(Graph.from_network(LINES, TRANSFERS), fingerprint="fp").save(tmp_path)
+    return Overlay(NetworkSnapshot({}, TRANSFERS, LINES, "fp", "v1", tmp_path))
+
+
+def _alerts(ov, *items):
+    g = ov.base
+    return parse_alerts(items, g, LINES, g.lookup)
+
+
+def test_origin_closure_is_respected_by_search_and_tables(tmp_path):
+    ov = _overlay(tmp_path); g = ov.base
+    o, d = g.lookup("Back Bay"), g.lookup("State")
+    assert {g.route_name(v) for v in shortest_path(g, o, d)[0]} >= {"Orange"}
+    closed = ov.apply(_alerts(ov, {"id": "1", "effect": "STATION_CLOSURE", "route": "Orange", "stops": ["Back Bay"]}))
+    path, minutes = shortest_path(closed.graph, o, d)
+    assert g.platform(o, "Orange") not in path and "walk" in {g.route_name(v) for v in path}
+    assert closed.tables.route(closed.graph, o, d)[1] == minutes
+
+
+def test_apply_then_revert_restores_the_base(tmp_path):
+    ov = _overlay(tmp_path)
+    down = ov.apply(_alerts(ov, {"id": "1", "effect": "SUSPENSION", "route": "Orange", "stops": ["Tufts", "State"]}))
+    assert down.version == 1 and down.changes and down.tables.patch
+    back = down.apply([])
+    assert back.version == 2 and back.graph is ov.base and not back.tables.patch
+    assert back.apply([]) is back
+
+
+def test_incremental_patch_equals_full_recompute(tmp_path):
+    ov = _overlay(tmp_path)
+    steps = [[{"id": "1", "effect": "SUSPENSION", "route": "Orange", "stops": ["Tufts", "State"]}],
+             [{"id": "2", "effect": "STATION_CLOSURE", "route": "Green-B", "stops": ["Park"]}],
+             [{"id": "2", "effect": "STATION_CLOSURE", "route": "Green-B", "stops": ["Park"]},
+              {"id": "3", "effect": "SHUTTLE", "route": "Green-D", "stops": ["Kenmore", "Arlington"]}],
+             [{"id": "3", "effect": "SHUTTLE", "route": "Green-D", "stops": ["Kenmore", "Arlington"]}],
+             []]
+    for items in steps:
+        ov = ov.apply(_alerts(ov, *items))
+        full = RoutingTables.build(ov.graph)
+        for t in range(ov.base.n_stops):
+            assert np.allclose(ov.tables.column(t)[0], full.dist[:, t], atol=1e-4), (items, t)
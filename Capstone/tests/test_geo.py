@@ -0,0 +1,42 @@
+# Capstone/tests/test_geo.py
+import numpy as np
+
+from Capstone.packages.mbta.geodist import Points, haversine_km, many_to_many, one_to_many
+from Capstone.server.geo import StopGrid
+
+
+def _points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return 42.2 + rng.random(n) * 0.25, -71.25 + rng.random(n) * 0.3
+
+
+def test_kernels_match_the_scalar_haversine():
+    lat, lng = _points(60)
+    a, b = Points(lat[:25], lng[:25]), Points(lat[25:], lng[25:])
+    want = np.array([[haversine_km(x, y, u, v) for u, v in zip(lat[25:], lng[25:])] for x, y in zip(lat[:25], lng[:25])])
+    got = many_to_many(a, b)
+    assert got.shape == (25, 35) and np.abs(got - want).max() < 2e-3   # float32: ~a metre
+    assert np.array_equal(got[3], one_to_many(float(a.lat[3]), float(a.lng[3]), b))
+
+
+def test_candidates_outside_the_grid_are_empty():
+    lat, lng = _points(100)
+    grid = StopGrid({f"s{i}": (float(a), float(b)) for i, (a, b) in enumerate(zip(lat, lng))})
+    east = float(lng.max()) + 0.1   # about 8 km past the last column, level with the grid
+    pos = grid._candidates(float(lat.mean()), east, 600)
+    assert pos.dtype == np.intp and len(pos) == 0
+    assert grid.nearest(float(lat.mean()), east, 600) == []
+
+
+def test_nearest_matches_a_brute_force_scan():
+    lat, lng = _points(400, seed=3)
+    coords = {f"s{i}": (float(a), float(b)) for i, (a, b) in enumerate(zip(lat, lng))}
+    grid = StopGrid(coords)
+    rng = np.random.default_rng(4)
+    for qlat, qlng in zip(42.2 + rng.random(50) * 0.25, -71.25 + rng.random(50) * 0.3):
+        for radius, k in ((600, 5), (2000, 10), (5000, 50)):
+            got = grid.nearest(float(qlat), float(qlng), radius, k)
+            want = sorted(haversine_km(qlat, qlng, *c) * 1000 for c in coords.values())
+            want = [m for m in want if m <= radius][:k]
+            assert len(got) == len(want) and np.allclose([m for _, m in got], want, atol=1.0)   # float32 kernel
+            assert all(abs(haversine_km(qlat, qlng, *coords[n]) * 1000 - m) < 1.0 for n, m in got)
@@ -0,0 +1,13 @@
+# Capstone/tests/test_intents.py
+from Capstone.server import intents
+from Capstone.server.app import DATA_DIR
+from Capstone.server.intents import IntentMatcher
+from Capstone.server.network import NetworkSnapshot
+
+
+def test_labelled_corpus_matches(tmp_path, monkeypatch, capsys):
+    snap = NetworkSnapshot.load(DATA_DIR, tmp_path / "tables")   # data/lines, as the corpus was labelled
+    matcher = IntentMatcher(snap.graph.stop_names, snap.aliases)
+    monkeypatch.setattr(intents, "_matcher", lambda: matcher)
+    bad = intents.check()
+    assert bad == 0, capsys.readouterr().out   # one JSON line per disagreement
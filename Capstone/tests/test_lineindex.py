@@ -0,0 +1,41 @@
+# Capstone/tests/test_lineindex.py
+from Capstone.server import app as A
+from Capstone.server.disruptions import Overlay, parse_alerts
+from Capstone.server.network import NetworkSnapshot
+from Capstone.server.routing import Graph, shortest_path
+from Capstone.server.tables import RoutingTables
+
+LINES = {r: {"route_id": r, "stops": s} for r, s in {
+    "Green-D": ["Riverside", "Kenmore", "Copley", "Arlington", "Park"],
+    "Orange": ["Back Bay", "Tufts", "Downtown", "State"],
+}.items()}
+TRANSFERS = {"pairs": [["Arlington", "Park", 5], ["Copley", "Back Bay", 4]]}
+
+
+def _overlay(tmp_path, *alerts) -> Overlay:
+    RoutingTables.build(Graph.from_network(LINES, TRANSFERS), fingerprint="fp").save(tmp_path)
+    ov = Overlay(NetworkSnapshot({}, TRANSFERS, LINES, "fp", "v1", tmp_path))
+    return ov.apply(parse_alerts(alerts, ov.base, LINES, ov.base.lookup)) if alerts else ov
+
+
+def test_same_line_answer_matches_the_search(tmp_path):
+    ov = _overlay(tmp_path); g = ov.graph
+    for o, d in (("Riverside", "Park"), ("Park", "Kenmore"), ("State", "Back Bay")):
+        fast = A._same_line(ov, ov.tables, g.lookup(o), g.lookup(d))
+        assert fast is not None and fast[0][0] == o and fast[0][-1] == d
+        assert fast[2] == round(shortest_path(g, g.lookup(o), g.lookup(d))[1], 1)
+    assert A._same_line(ov, ov.tables, g.lookup("Kenmore"), g.lookup("State")) is None
+
+
+def test_same_line_skips_closed_ends(tmp_path):
+    ov = _overlay(tmp_path, {"id": "1", "effect": "STATION_CLOSURE", "route": "Green-D", "stops": ["Park"]},
+                  {"id": "2", "effect": "STATION_CLOSURE", "route": "Orange", "stops": ["State"]})
+    g = ov.graph
+    assert A._same_line(ov, ov.tables, g.lookup("Kenmore"), g.lookup("Park")) is None
+    names, routes, minutes = A._find_route("Kenmore", "Park", overlay=ov)
+    assert names[-2:] == ["Arlington", "Park"] and routes[-1] == "walk"
+    assert minutes == round(shortest_path(g, g.lookup("Kenmore"), g.lookup("Park"))[1], 1)
+    # State is only on Orange, so with it closed there is no way in at all
+    assert A._find_route("Back Bay", "State", overlay=ov) is None
+    # ... and no way out
+    assert A._find_route("State", "Back Bay", overlay=ov) is None
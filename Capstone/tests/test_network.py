@@ -0,0 +1,90 @@
+# Capstone/tests/test_network.py
+import json
+
+import numpy as np
+import pytest
+
+from Capstone.server import app as A
+from Capstone.server import network
+from Capstone.server.network import NetworkSnapshot
+
+from .test_csa import _feed
+
+LINES = {r: {"route_id": r, "stops": s} for r, s in {
+    "Green-D": ["Riverside", "Kenmore", "Copley", "Park"],
+    "Orange": ["Back Bay", "Downtown", "State"],
+}.items()}
+TRANSFERS = {"pairs": [["Copley", "Back Bay", 4], ["Park", "Downtown", 3]]}
+
+
+def test_failed_compiled_save_leaves_no_temp_file(tmp_path, monkeypatch):
+    snap = NetworkSnapshot({}, TRANSFERS, LINES, "fp", "v1", tmp_path)
+
+    def boom(*a, **k): raise OSError("disk full")
+    monkeypatch.setattr(network.np, "savez", boom)
+    with pytest.raises(OSError): snap.save_compiled(tmp_path / "c" / "network.npz", "sha")
+    assert list((tmp_path / "c").iterdir()) == []
+
+
+def test_reload_forgets_gtfs_station_names(tmp_path, monkeypatch):
+    for k, v in (("NETWORK_SOURCE", "gtfs"), ("DATA_DIR", tmp_path / "data"), ("TABLES_DIR", tmp_path / "tables"),
+                 ("SNAPSHOT_PATH", tmp_path / "network.npz"), ("GTFS_PATH", tmp_path / "feed.zip"),
+                 ("GTFS_CACHE", tmp_path / "gtfs.npz"), ("_overlay", None)):
+        monkeypatch.setattr(A, k, v)
+    A.load_timetable.cache_clear(); A._gtfs_station_names.cache_clear()
+    try:
+        _feed(A.GTFS_PATH, seed=1)
+        first = A._gtfs_station_names(); A.current_overlay()
+        _feed(A.GTFS_PATH, seed=1, n_stops=16)
+        assert A.reload_network()[1]
+        assert len(A._gtfs_station_names()) == len(first) + 2
+    finally:
+        A.load_timetable.cache_clear(); A._gtfs_station_names.cache_clear()
+
+
+def _data_dir(root, lines=LINES):
+    (root / "lines").mkdir(parents=True, exist_ok=True)
+    for r, line in lines.items(): (root / "lines" / f"{r}.json").write_text(json.dumps(line))
+    (root / "transfers.json").write_text(json.dumps(TRANSFERS))
+    (root / "aliases.json").write_text(json.dumps({"gov center": "Park"}))
+    (root / "stops.json").write_text(json.dumps({"Park": [42.356, -71.062], "Kenmore": [42.349, -71.095]}))
+    return root
+
+
+def test_compiled_snapshot_is_reused_checked_and_rebuilt(tmp_path, monkeypatch):
+    data, tables, compiled = _data_dir(tmp_path / "data"), tmp_path / "tables", tmp_path / "network.npz"
+    built = NetworkSnapshot.load(data, tables, compiled)
+    assert compiled.exists()
+
+    calls = []
+    from_sources = NetworkSnapshot.from_sources.__func__
+    monkeypatch.setattr(NetworkSnapshot, "from_sources",
+                        classmethod(lambda cls, *a, **k: calls.append(1) or from_sources(cls, *a, **k)))
+    snap = NetworkSnapshot.load(data, tables, compiled)
+    assert not calls and snap.version == built.version
+    assert snap.graph.lookup("Park") == built.graph.lookup("Park") and list(snap.graph.minutes) == list(built.graph.minutes)
+    assert snap.resolver.resolve("gov center") == "Park" and snap.grid.nearest(42.356, -71.062)[0][0] == "Park"
+
+    # one flipped value under an intact source hash: the checksum catches it and the sources win
+    with np.load(compiled) as z: arrays = {k: z[k] for k in z.files}
+    arrays["graph.minutes"] = arrays["graph.minutes"].copy(); arrays["graph.minutes"][0] += 1
+    with open(compiled, "wb") as f: np.savez(f, **arrays)
+    assert NetworkSnapshot.load(data, tables, compiled).version == built.version and len(calls) == 1
+
+    # a changed source is a new version, and the compiled file is refreshed for it
+    _data_dir(data, {**LINES, "Blue": {"route_id": "Blue", "stops": ["State", "Aquarium"]}})
+    changed = NetworkSnapshot.load(data, tables, compiled)
+    assert changed.version != built.version and changed.graph.lookup("Aquarium") is not None and len(calls) == 2
+    assert NetworkSnapshot.load(data, tables, compiled).version == changed.version and len(calls) == 2
+
+
+def test_reload_swaps_the_snapshot_only_when_sources_change(tmp_path, monkeypatch):
+    for k, v in (("NETWORK_SOURCE", "lines"), ("DATA_DIR", _data_dir(tmp_path / "data")),
+                 ("TABLES_DIR", tmp_path / "tables"), ("SNAPSHOT_PATH", tmp_path / "network.npz"), ("_overlay", None)):
+        monkeypatch.setattr(A, k, v)
+    before = A.current_overlay()
+    assert A.reload_network() == (before, False)
+    _data_dir(A.DATA_DIR, {**LINES, "Blue": {"route_id": "Blue", "stops": ["State", "Aquarium"]}})
+    after, changed = A.reload_network()
+    assert changed and after is A.current_overlay() and after.snapshot.version != before.snapshot.version
+    assert A._find_route("Riverside", "Aquarium") is not None and A._find_route("Riverside", "Aquarium", overlay=before) is None
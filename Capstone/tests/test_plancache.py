@@ -0,0 +1,28 @@
+# Capstone/tests/test_plancache.py
+import types
+
+from Capstone.server import plancache
+from Capstone.server.plancache import PlanCache
+
+
+def _overlay():
+    return types.SimpleNamespace(cache={})
+
+
+def test_lru_ttl_and_a_fresh_store_per_overlay(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(plancache.time, "monotonic", lambda: now[0])
+    c, ov = PlanCache(maxsize=2, ttl=10), _overlay()
+    c.put(ov, "a", 1); c.put(ov, "b", 2)
+    assert c.get(ov, "a") == 1            # "a" is now the most recent
+    c.put(ov, "c", 3)                     # ... so "b" goes
+    assert c.get(ov, "b") is None and c.get(ov, "c") == 3
+    now[0] += 11
+    assert c.get(ov, "a") is None         # expired
+    c.put(ov, "a", 4)
+    nxt = _overlay()                      # a reload or new disruption set
+    assert c.get(nxt, "a") is None and c.get(ov, "a") == 4
+    assert c.stats(nxt) == {"size": 0, "maxsize": 2, "ttl_s": 10, "hits": 3, "misses": 3, "evictions": 1,
+                            "expired": 1, "invalidations": 1, "hit_rate": 0.5}
+    off = PlanCache(maxsize=0); off.put(ov, "z", 1)
+    assert off.get(ov, "z") is None and "z" not in ov.cache["plans"]
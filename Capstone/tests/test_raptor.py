@@ -0,0 +1,40 @@
+# Capstone/tests/test_raptor.py
+from Capstone.server.raptor import Raptor
+from Capstone.server.routing import Graph
+
+# a slow local from O to D, a two-vehicle shortcut through M, and a walk onto a third line
+LINES = {r: {"route_id": r, "stops": s} for r, s in {
+    "Local": ["O", "a1", "a2", "a3", "a4", "a5", "D"],
+    "Hop": ["O", "M"],
+    "Skip": ["M", "D"],
+    "Cross": ["a2", "x1", "x2"],
+    "Far": ["W", "x2", "D", "Z"],
+}.items()}
+TRANSFERS = {"pairs": [["O", "W", 3]]}
+
+
+def _raptor():
+    g = Graph.from_network(LINES, TRANSFERS)
+    return g, Raptor(g, LINES, TRANSFERS)
+
+
+def test_pareto_set_trades_transfers_for_stops():
+    g, r = _raptor()
+    got = [(p["transfers"], p["stops"], p["routes"]) for p in r.pareto(g.lookup("O"), g.lookup("D"))]
+    # the walk to W counts as a stop but not a vehicle, so Far is a zero-transfer option too
+    assert got == [(0, 3, ["walk", "Far", "Far"]), (1, 2, ["Hop", "Skip"])]
+    # back one stop to walk onto Far, or three short hops; the 5-stop ride through Cross needs two changes
+    got = [(p["transfers"], p["stops"], p["routes"]) for p in r.pareto(g.lookup("a1"), g.lookup("Z"))]
+    assert got == [(1, 5, ["Local", "walk", "Far", "Far", "Far"]), (3, 4, ["Local", "Hop", "Skip", "Far"])]
+    assert r.pareto(g.lookup("a1"), g.lookup("Z"))[1]["names"] == ["a1", "O", "M", "D", "Z"]
+
+def test_matrix_agrees_with_the_pareto_ends():
+    g, r = _raptor()
+    stops, transfers = r.matrix(range(g.n_stops))
+    for o in range(g.n_stops):
+        for d in range(g.n_stops):
+            if o == d: continue
+            front = r.pareto(o, d)
+            if not front:
+                assert stops[o, d] == transfers[o, d] == -1; continue
+            assert (transfers[o, d], stops[o, d]) == (front[0]["transfers"], front[-1]["stops"]), (o, d)
@@ -0,0 +1,21 @@
+# Capstone/tests/test_resolver.py
+from Capstone.server.resolver import StopResolver
+
+NAMES = ["Park Street", "Kendall/MIT", "Hynes Convention Center", "Harvard", "Haymarket", "Government Center",
+         "Downtown Crossing", "State", "Malden Center", "Central", "Kenmore"]
+ALIASES = {"gov center": "government center", "dtx": "Downtown Crossing"}
+
+
+def test_abbreviations_typos_prefixes_and_aliases_resolve():
+    r = StopResolver(NAMES, ALIASES)
+    cases = {"Park St": "Park Street", "kendall": "Kendall/MIT", "Hynes": "Hynes Convention Center",
+             "Goverment Centre": "Government Center", "gov center": "Government Center", "DTX": "Downtown Crossing",
+             "harvard sq": "Harvard", "Cental": "Central", "Haymarket (Orange)": "Haymarket"}
+    for text, want in cases.items():
+        assert r.resolve(text) == want, text
+    assert r.candidates("park street") == [("Park Street", 1.0)]
+    assert r.resolve("xyz") is None and r.candidates("  ") == []
+    # compiled snapshots rebuild the index from arrays; answers must not change
+    again = StopResolver.from_arrays(r.to_arrays())
+    for text in list(cases) + ["center", "ken"]:
+        assert again.candidates(text) == r.candidates(text), text
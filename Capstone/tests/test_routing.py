@@ -0,0 +1,42 @@
+# Capstone/tests/test_routing.py
+from Capstone.server.routing import Graph, k_shortest_paths, path_to_stops, display
+
+# a trunk (Kenmore .. Park) shared by three branches, a parallel line and a walk
+LINES = {
+    "B": {"route_id": "Green-B", "stops": ["Kenmore", "Copley", "Arlington", "Park", "Gov"]},
+    "C": {"route_id": "Green-C", "stops": ["Kenmore", "Copley", "Arlington", "Park", "Gov"]},
+    "D": {"route_id": "Green-D", "stops": ["Riverside", "Kenmore", "Copley", "Arlington", "Park", "Gov"]},
+    "O": {"route_id": "Orange", "stops": ["Back Bay", "Tufts", "Downtown", "State"]},
+    "BL": {"route_id": "Blue", "stops": ["Gov", "State", "Aquarium"]},
+}
+TRANSFERS = {"pairs": [["Copley", "Back Bay", 4], ["Park", "Downtown", 3]]}
+
+
+def _alternatives(origin, dest, k=6):
+    g = Graph.from_network(LINES, TRANSFERS)
+    out = []
+    for path, minutes in k_shortest_paths(g, g.lookup(origin), g.lookup(dest), k):
+        names, routes = display(g, *path_to_stops(g, path))
+        legs = []
+        for name, route in zip(names[1:], routes):
+            if not legs or legs[-1][0] != route: legs.append([route, name])
+            else: legs[-1][1] = name
+        out.append((tuple(names), legs, minutes))
+    return out
+
+
+def test_alternatives_differ_in_stops_or_legs():
+    alts = _alternatives("Kenmore", "Aquarium")
+    assert len(alts) > 1
+    keys = [(names, tuple((r == "walk", end) for r, end in legs)) for names, legs, _ in alts]
+    assert len(set(keys)) == len(keys)
+    assert [m for *_, m in alts] == sorted(m for *_, m in alts)
+
+
+def test_no_branch_hopping_on_a_shared_trunk():
+    for names, legs, _ in _alternatives("Kenmore", "Gov"):
+        rides = [r for r, _ in legs if r != "walk"]
+        # never change from one Green branch to another on the trunk they share
+        assert not any(a.startswith("Green") and b.startswith("Green") for a, b in zip(rides, rides[1:])), legs
+    # and the three branches from Kenmore count as one ride
+    assert sum(1 for _, legs, _ in _alternatives("Kenmore", "Gov") if len(legs) == 1) == 1
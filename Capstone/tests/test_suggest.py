@@ -0,0 +1,21 @@
+# Capstone/tests/test_suggest.py
+from Capstone.server.suggest import PrefixIndex
+
+NAMES = ["Park Street", "Kendall/MIT", "Hynes Convention Center", "Government Center", "Downtown Crossing",
+         "Malden Center", "Central", "Charles/MGH", "Copley", "Kenmore"]
+POPULARITY = {**{n: 1.0 for n in NAMES}, "Central": 5.0, "Charles/MGH": 3.0}
+
+
+def test_prefixes_rank_name_starts_then_popularity():
+    ix = PrefixIndex(NAMES, {"dtx": "downtown crossing"}, POPULARITY)
+    # name starts by popularity, then names with a later word starting "c"
+    assert ix.suggest("c") == ["Central", "Charles/MGH", "Copley", "Downtown Crossing", "Government Center",
+                               "Hynes Convention Center", "Malden Center"]
+    assert ix.suggest("C", limit=2) == ["Central", "Charles/MGH"]
+    assert ix.suggest("center") == ["Government Center", "Hynes Convention Center", "Malden Center"]
+    assert ix.suggest("ken") == ["Kendall/MIT", "Kenmore"]
+    assert ix.suggest("mit") == ["Kendall/MIT"] and ix.suggest("dt") == ["Downtown Crossing"]
+    assert ix.suggest("Park St.") == ["Park Street"] and ix.suggest("zz") == [] and ix.suggest(" ") == []
+    again = PrefixIndex.from_arrays(ix.to_arrays())
+    for p in ("c", "ce", "center", "ken", "dt"):
+        assert again.suggest(p) == ix.suggest(p), p
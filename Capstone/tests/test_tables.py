@@ -0,0 +1,38 @@
+# Capstone/tests/test_tables.py
+import threading
+
+import numpy as np
+
+from Capstone.server.tables import RoutingTables
+
+
+def _tables(i: int) -> RoutingTables:
+    return RoutingTables(np.full((30, 10), i, np.float32), np.full((30, 10), i, np.int16), f"fp{i}")
+
+
+def test_concurrent_saves_and_loads(tmp_path):
+    tables, errors, mixed = [_tables(i) for i in range(4)], [], []
+
+    def save(k):
+        for j in range(50):
+            try: tables[(j + k) % 4].save(tmp_path)
+            except Exception as e: errors.append(e)
+
+    def load():
+        for j in range(400):
+            t = RoutingTables.load(tmp_path, f"fp{j % 4}")
+            if t is not None and not (t.dist[0, 0] == t.next_hop[0, 0] == j % 4): mixed.append(j)
+
+    threads = [threading.Thread(target=save, args=(k,)) for k in range(4)] + [threading.Thread(target=load)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert not errors and not mixed
+    assert not list(tmp_path.glob(".tmp-*"))
+
+
+def test_load_rejects_other_fingerprint_and_short_arrays(tmp_path):
+    out = _tables(1).save(tmp_path)
+    assert RoutingTables.load(tmp_path, "fp1") is not None
+    assert RoutingTables.load(tmp_path, "fp2") is None
+    np.save(out / "next_hop.npy", np.zeros((3, 10), np.int16))
+    assert RoutingTables.load(tmp_path, "fp1") is None